@@ -0,0 +1,198 @@
+import argparse
+import time
+from glob import glob
+from os.path import exists
+
+import numpy as np
+
+from data_structures import SimpleAIData
+from game_tree import OPENER, DEALER, DECISIONS, nested_tree
+from strategy_table import StrategyTable, ACTIONS, ACTION_CODES, LEGAL_ACTIONS
+
+
+# Betting tree as played by Game.player_choices, compiled from the rules in game_tree
+GAME_TREE = nested_tree()
+
+# Best responses prefer passive actions when several are equally good
+tie_break_order = [ACTION_CODES["c"], ACTION_CODES["b"], ACTION_CODES["f"]]
+
+
+def terminal_values(terminal, seat, reach):
+    # Sums the seat's payoff for every own card over all opponent cards, weighted by the opponent's reach.
+    # Showdowns only depend on how many opponent cards are below or above, so prefix sums keep this O(deck size)
+    _, folder, opener_paid, dealer_paid = terminal
+    own_paid, other_paid = (opener_paid, dealer_paid) if seat == OPENER else (dealer_paid, opener_paid)
+
+    if folder is not None:
+        others = reach.sum(axis=-1, keepdims=True) - reach
+        return (other_paid if folder != seat else -own_paid) * others
+
+    below = np.cumsum(reach, axis=-1) - reach
+    above = reach.sum(axis=-1, keepdims=True) - below - reach
+    return other_paid * below - own_paid * above
+
+
+def tree_values(tree, seat, own, opponent, reach, best_response=None, cache=None, path=()):
+    # own is None when the seat plays a best response, its choices are then written into best_response.
+    # With a cache, the values of every decision are stored under their action path from the root
+    if cache is not None and path in cache:
+        return cache[path]
+
+    if tree[0] == "terminal":
+        return terminal_values(tree, seat, reach)
+
+    _, node, acting_seat, children = tree
+    if acting_seat != seat:
+        values = sum(tree_values(child, seat, own, opponent, reach * opponent[..., node, :, ACTION_CODES[action]],
+                                 best_response, cache, path + (action,))
+                     for action, child in children.items())
+    else:
+        child_values = [np.zeros(reach.shape)] * len(ACTIONS)
+        for action, child in children.items():
+            child_values[ACTION_CODES[action]] = tree_values(child, seat, own, opponent, reach, best_response,
+                                                             cache, path + (action,))
+        values = np.stack(np.broadcast_arrays(*child_values), axis=-1)
+
+        if own is not None:
+            values = (values * own[..., node, :, :]).sum(axis=-1)
+        else:
+            # Only the actions the node allows can be chosen
+            order = [code for code in tie_break_order if ACTIONS[code] in children]
+            best = np.take(order, np.argmax(values[..., order], axis=-1))
+            if best_response is not None:
+                best_response[..., node, :, :] = 0.0
+                np.put_along_axis(best_response[..., node, :, :], best[..., None], 1.0, axis=-1)
+            values = np.take_along_axis(values, best[..., None], axis=-1)[..., 0]
+
+    if cache is not None:
+        cache[path] = values
+    return values
+
+
+def decision_paths():
+    # Action path from the root to the decision of every strategy node
+    return {node: path for path, (node, _, _) in DECISIONS.items()}
+
+
+def deals(deck_size):
+    return deck_size * (deck_size - 1)
+
+
+def expected_value(opener, dealer):
+    # Exact value per game for the opener, opener and dealer are probability arrays shaped (node, card, action)
+    opener, dealer = np.asarray(opener), np.asarray(dealer)
+    deck_size = opener.shape[-2]
+    values = tree_values(GAME_TREE, OPENER, opener, dealer, np.ones(deck_size))
+    return values.sum(axis=-1) / deals(deck_size)
+
+
+def best_response(opponent):
+    # Returns the value per game of the best response in each seat and the best response strategy as one table
+    opponent = np.asarray(opponent)
+    deck_size = opponent.shape[-2]
+    # Rows the tree never asks keep the first legal action in tie break order
+    first_legal = np.take(tie_break_order, np.argmax(LEGAL_ACTIONS[:, tie_break_order], axis=-1))
+    strategy = np.zeros_like(opponent, dtype=float)
+    strategy[...] = np.eye(len(ACTIONS))[first_legal][:, None, :]
+
+    values = []
+    for seat in (OPENER, DEALER):
+        seat_values = tree_values(GAME_TREE, seat, None, opponent, np.ones(deck_size), strategy)
+        values.append(seat_values.sum(axis=-1) / deals(deck_size))
+    return values, strategy
+
+
+def exploitability(strategy):
+    # How much a perfect counter strategy wins per game, averaged over both seats
+    values, _ = best_response(strategy)
+    return (values[OPENER] + values[DEALER]) / 2
+
+
+def load_strategy(path):
+    if not exists(path):
+        raise FileNotFoundError(path)
+    return StrategyTable.from_data(SimpleAIData(path).data)
+
+
+def export_best_response(strategy, path):
+    _, response = best_response(strategy)
+    data = SimpleAIData(path)
+    data.data = StrategyTable(response).to_data()
+    data.save()
+    return data
+
+
+class IncrementalEvaluator:
+    # Exact values of one editable strategy against a fixed opponent. Every decision's values are cached, an edit
+    # only recomputes the decisions above the edited node, and for the best responses against the edited strategy
+    # also the decisions below it, because the strategy's choices there change what reaches them
+    paths = decision_paths()
+
+    def __init__(self, weights, opponent=None):
+        self.weights = np.array(weights, dtype=float)
+        self.deck_size = self.weights.shape[1]
+        self.probabilities = StrategyTable(self.weights).probabilities
+        self.opponent = None if opponent is None else np.asarray(opponent)[:, :self.deck_size]
+
+        self.best_responses = np.zeros_like(self.probabilities)
+        self.caches = {"opener": {}, "dealer": {}, "best_opener": {}, "best_dealer": {}}
+
+    def update(self, node, card, action, weight):
+        self.weights[node, card - 1, ACTION_CODES[action]] = weight
+        row = self.weights[node, card - 1]
+        total = row.sum()
+        self.probabilities[node, card - 1] = row / total if total > 0 else 0.0
+
+        path = self.paths.get(node)
+        if path is None:
+            return
+        for name, cache in self.caches.items():
+            below = name.startswith("best")
+            for key in list(cache):
+                if path[:len(key)] == key or (below and key[:len(path)] == path):
+                    del cache[key]
+
+    def values(self, name, seat, own, opponent):
+        values = tree_values(GAME_TREE, seat, own, opponent, np.ones(self.deck_size), self.best_responses,
+                             self.caches[name])
+        return values.sum(axis=-1) / deals(self.deck_size)
+
+    def expected_values(self):
+        # Value per game of the edited strategy as opener and as dealer, None without a known opponent
+        if self.opponent is None:
+            return None
+        return (self.values("opener", OPENER, self.probabilities, self.opponent),
+                self.values("dealer", DEALER, self.probabilities, self.opponent))
+
+    def exploitability(self):
+        return (self.values("best_opener", OPENER, None, self.probabilities) +
+                self.values("best_dealer", DEALER, None, self.probabilities)) / 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact best response and exploitability of strategy files")
+    parser.add_argument("paths", nargs="*", help="strategy files, defaults to every simple/bluffing AI file")
+    parser.add_argument("--export", action="store_true",
+                        help="write the best response of each file next to it as <name>_best_response.txt")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob("simple_ai_data_*.txt") + glob("bluffing_ai_data_*.txt"))
+    for path in paths:
+        if path.endswith("_best_response.txt"):
+            continue
+        strategy = load_strategy(path).probabilities
+
+        start = time.perf_counter()
+        values, response = best_response(strategy)
+        elapsed = (time.perf_counter() - start) * 1e6
+
+        print(f"{path}: exploitability {(values[OPENER] + values[DEALER]) / 2:.4f} "
+              f"(as opener {values[OPENER]:.4f}, as dealer {values[DEALER]:.4f}) in {elapsed:.0f}µs")
+        if args.export:
+            export_path = f"{path.rsplit('.', 1)[0]}_best_response.txt"
+            export_best_response(strategy, export_path)
+            print(f"\tbest response saved to {export_path}")
+
+
+if __name__ == "__main__":
+    main()
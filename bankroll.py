@@ -0,0 +1,149 @@
+import argparse
+
+import numpy as np
+
+from batch_engine import UNIFORMS_PER_GAME, cumulative, deal_cards, play_batch, game_openers
+from game_tree import PAID
+from playable import load_player
+
+
+class BankrollResult:
+    def __init__(self, sessions, games, initial_balances, final_balances, ruin_game, ruined_player):
+        self.sessions = sessions
+        self.games = games
+        self.initial_balances = initial_balances
+        self.final_balances = final_balances
+        # Index of the game that could not be started and the player that could not cover the bet, -1 if never
+        self.ruin_game = ruin_game
+        self.ruined_player = ruined_player
+
+    def ruin_probability(self, player=None):
+        if player is None:
+            return float((self.ruin_game >= 0).mean())
+        return float((self.ruined_player == player).mean())
+
+    def time_to_ruin(self):
+        return self.ruin_game[self.ruin_game >= 0]
+
+    def time_to_ruin_quantiles(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        times = self.time_to_ruin()
+        if len(times) == 0:
+            return {}
+        return dict(zip(quantiles, np.quantile(times, quantiles)))
+
+    def final_balance_quantiles(self, player=0, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        return dict(zip(quantiles, np.quantile(self.final_balances[:, player], quantiles)))
+
+    def __str__(self):
+        lines = [f"Sessions: {self.sessions} x {self.games} games, starting balances "
+                 f"{self.initial_balances[0]} / {self.initial_balances[1]}",
+                 f"Ruin probability: {self.ruin_probability():.2%} (player 1 {self.ruin_probability(0):.2%}, "
+                 f"player 2 {self.ruin_probability(1):.2%})"]
+
+        times = self.time_to_ruin_quantiles()
+        if times:
+            lines.append("Games until ruin: " + ", ".join(f"{q:.0%} {value:.0f}" for q, value in times.items()))
+
+        for player in range(2):
+            quantiles = self.final_balance_quantiles(player)
+            lines.append(f"Player {player + 1} final balance: "
+                         + ", ".join(f"{q:.0%} {value:.0f}" for q, value in quantiles.items())
+                         + f", mean {self.final_balances[:, player].mean():.1f}")
+        return "\n".join(lines)
+
+
+def simulate_bankrolls(p1, p2, initial_balances, betting_amount=1, sessions=10000, games=10000,
+                       same_opener_and_dealer=False, seed=None, chunk_size=256):
+    # Plays sessions independent runs at once as a (sessions, games) array, chunk_size games at a time.
+    # A session ends like Game.play_games in fixed balance mode: before the first game either player can't ante.
+    # Like Playable.bet, a bet a player can't cover pays nothing, which can only happen once a balance is below
+    # the most a player can put in during one game
+    deck_size = np.asarray(p1).shape[-2]
+    cum = cumulative(np.stack([np.asarray(p1), np.asarray(p2)]))
+    rng = np.random.default_rng(seed)
+
+    initial_balances = np.asarray(initial_balances, dtype=np.int64)
+    total = int(initial_balances.sum())
+    tight = int(PAID.max()) * betting_amount
+    p1_balance = np.full(sessions, initial_balances[0], dtype=np.int64)
+    ruin_game = np.full(sessions, -1, dtype=np.int64)
+    active = np.ones(sessions, dtype=bool)
+
+    for start in range(0, games, chunk_size):
+        if not active.any():
+            break
+        size = min(chunk_size, games - start)
+        running = np.flatnonzero(active)
+
+        uniforms = rng.random((len(running), size, UNIFORMS_PER_GAME))
+        p1_cards, p2_cards = deal_cards(uniforms[..., 0], deck_size)
+        p1_opener = game_openers(start, size, same_opener_and_dealer)[None, :]
+
+        opener = np.where(p1_opener, 0, 1)
+        opener_cards = np.where(p1_opener, p1_cards, p2_cards)
+        dealer_cards = np.where(p1_opener, p2_cards, p1_cards)
+        opener_payoff, _ = play_batch(cum, opener, 1 - opener, opener_cards, dealer_cards, uniforms)
+        # Player 1's result in units, what the loser put in
+        units = np.where(p1_opener, opener_payoff, -opener_payoff)
+        payoff = units * betting_amount
+
+        # Every session is played up to its first game where a balance is too low to cover every bet. That game
+        # ends the session when a player can't ante, otherwise it is paid by what each player can cover and the
+        # session goes on from the next game
+        played = np.zeros(len(running), dtype=np.int64)
+        balance = p1_balance[running]
+        pending = np.arange(len(running))
+        while len(pending):
+            later = np.arange(size) >= played[pending, None]
+            chunk_payoff = np.where(later, payoff[pending], 0)
+            before = balance[pending, None] + np.cumsum(chunk_payoff, axis=1) - chunk_payoff
+            low = later & ((before < tight) | (total - before < tight))
+            stopped = low.any(axis=1)
+            balance[pending[~stopped]] = before[~stopped, -1] + chunk_payoff[~stopped, -1]
+
+            pending, game = pending[stopped], np.argmax(low[stopped], axis=1)
+            before = before[stopped, game]
+            broke = (before < betting_amount) | (total - before < betting_amount)
+            balance[pending] = before
+            ruin_game[running[pending[broke]]] = start + game[broke]
+            active[running[pending[broke]]] = False
+
+            pending, game, before = pending[~broke], game[~broke], before[~broke]
+            won = units[pending, game]
+            covered = np.where(won > 0, total - before, before) // betting_amount
+            balance[pending] = before + np.sign(won) * np.minimum(np.abs(won), covered) * betting_amount
+            played[pending] = game + 1
+            pending = pending[played[pending] < size]
+
+        p1_balance[running] = balance
+
+    # Sessions still running after the last game are ruined if the next game could not be started
+    broke_at_end = active & ((p1_balance < betting_amount) | (total - p1_balance < betting_amount))
+    ruin_game[broke_at_end] = games
+
+    ruined_player = np.where(ruin_game >= 0, np.where(p1_balance < betting_amount, 0, 1), -1)
+    final_balances = np.stack([p1_balance, total - p1_balance], axis=1)
+    return BankrollResult(sessions, games, initial_balances, final_balances, ruin_game, ruined_player)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Risk of ruin of two strategies playing with fixed balances")
+    parser.add_argument("p1", help="strategy file of player 1 or 'random'")
+    parser.add_argument("p2", help="strategy file of player 2 or 'random'")
+    parser.add_argument("--initial-balance", type=int, nargs="+", default=[100],
+                        help="starting balance of both players, or of player 1 and player 2")
+    parser.add_argument("--betting-amount", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--same-opener-and-dealer", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    initial_balances = args.initial_balance * 2 if len(args.initial_balance) == 1 else args.initial_balance[:2]
+    result = simulate_bankrolls(load_player(args.p1), load_player(args.p2), initial_balances, args.betting_amount,
+                                args.sessions, args.games, args.same_opener_and_dealer, args.seed)
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
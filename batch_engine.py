@@ -0,0 +1,180 @@
+import numpy as np
+
+from card import Card
+from game_tree import OPENER, ROOT, MAX_DEPTH, IS_TERMINAL, STATE_NODE, STATE_SEAT, NEXT_STATE, PLAY_METHODS, \
+    opener_payoff
+from rng import game_uniforms
+from strategy_table import ACTIONS, ACTION_CODES
+
+
+# Uniform draws per game: one for the deal and one for each of the three decision stages
+UNIFORMS_PER_GAME = 4
+FOLD, CHECK, BET = ACTION_CODES["f"], ACTION_CODES["c"], ACTION_CODES["b"]
+
+
+def cumulative(probabilities):
+    cum = np.cumsum(probabilities, axis=-1)
+    cum[..., -1] = 1.0
+    return cum
+
+
+def deal_cards(uniforms, deck_size):
+    # Maps one uniform onto one of the deck_size * (deck_size - 1) ordered deals of two different cards
+    deal = np.minimum((uniforms * (deck_size * (deck_size - 1))).astype(np.int64), deck_size * (deck_size - 1) - 1)
+    first = deal // (deck_size - 1)
+    second = deal % (deck_size - 1)
+    second += second >= first
+    return first + 1, second + 1
+
+
+def player_cards(uniforms, deck_size, p1_opener, duplicate=False):
+    # Cards of player 1 and player 2. In duplicate mode the opener always holds the first card, so the two games
+    # of a pair deal the same cards to the same seats and the players swap both
+    first, second = deal_cards(uniforms, deck_size)
+    if duplicate:
+        return np.where(p1_opener, first, second), np.where(p1_opener, second, first)
+    return first, second
+
+
+def sample_actions(cum, player, node, cards, uniforms):
+    # cum is shaped (player, node, card, action), the other arguments are per game arrays (or broadcast to them)
+    rows = cum[player, node, cards - 1]
+    return ((uniforms >= rows[..., 0]).astype(np.int8) + (uniforms >= rows[..., 1])).astype(np.int8)
+
+
+def play_batch(cum, opener, dealer, opener_cards, dealer_cards, uniforms):
+    # Steps every game through the game_tree state table at once, returns the opener's payoff in betting units
+    # and the actions of each stage
+    shape = np.broadcast(opener, dealer, opener_cards).shape
+    actions = np.full(shape + (MAX_DEPTH,), -1, dtype=np.int8)
+    state = np.full(shape, ROOT, dtype=np.int64)
+
+    for stage in range(MAX_DEPTH):
+        deciding = ~IS_TERMINAL[state]
+        opener_acts = STATE_SEAT[state] == OPENER
+        player = np.where(opener_acts, opener, dealer)
+        cards = np.where(opener_acts, opener_cards, dealer_cards)
+        action = sample_actions(cum, player, np.maximum(STATE_NODE[state], 0), cards, uniforms[..., stage + 1])
+        actions[..., stage] = np.where(deciding, action, -1)
+        state = np.where(deciding, NEXT_STATE[state, action], state)
+
+    return opener_payoff(state, opener_cards, dealer_cards).astype(np.int64), actions
+
+
+def game_openers(first_game, games, same_opener_and_dealer):
+    # True where player 1 opens, matching Game.choose_opener_and_dealer
+    if same_opener_and_dealer:
+        return np.ones(games, dtype=bool)
+    return (np.arange(first_game, first_game + games) % 2) == 0
+
+
+# Playable methods asked at the decision states, per state index into PLAY_METHOD_NAMES (-1 on terminals)
+PLAY_METHOD_NAMES = sorted({method for method in PLAY_METHODS if method is not None})
+STATE_METHOD = np.array([-1 if method is None else PLAY_METHOD_NAMES.index(method) for method in PLAY_METHODS])
+
+
+def decide(player, method, cards, opponent_actions, uniforms):
+    # Players without batch methods are asked one game at a time through the usual Playable methods
+    if player.batch_capable:
+        return getattr(player, method + "_batch")(cards, opponent_actions, uniforms)
+
+    actions = np.empty(len(cards), dtype=np.int8)
+    for k, (card, opponent_action, uniform) in enumerate(zip(cards.tolist(), opponent_actions.tolist(),
+                                                             uniforms.tolist())):
+        player.card = Card(card)
+        player.uniform = uniform
+        choice = getattr(player, method)(ACTIONS[opponent_action] if opponent_action >= 0 else None)
+        actions[k] = ACTION_CODES[choice]
+    return actions
+
+
+def play_players_batch(players, opener, opener_cards, dealer_cards, uniforms):
+    # Same stepping as play_batch, with the decisions asked from the Playable objects. opener holds the index
+    # into players of every game's opener, the dealer is the other one
+    games = len(opener)
+    actions = np.full((games, MAX_DEPTH), -1, dtype=np.int8)
+    state = np.full(games, ROOT, dtype=np.int64)
+    previous = np.full(games, -1, dtype=np.int8)
+
+    for stage in range(MAX_DEPTH):
+        deciding = ~IS_TERMINAL[state]
+        opener_acts = STATE_SEAT[state] == OPENER
+        acting = np.where(opener_acts, opener, 1 - opener)
+        cards = np.where(opener_acts, opener_cards, dealer_cards)
+        methods = STATE_METHOD[state]
+
+        for method_index, method in enumerate(PLAY_METHOD_NAMES):
+            for index, player in enumerate(players):
+                mask = deciding & (methods == method_index) & (acting == index)
+                if mask.any():
+                    actions[mask, stage] = decide(player, method, cards[mask], previous[mask],
+                                                  uniforms[mask, stage + 1])
+
+        state = np.where(deciding, NEXT_STATE[state, np.maximum(actions[:, stage], 0)], state)
+        previous = np.where(deciding, actions[:, stage], previous)
+
+    return opener_payoff(state, opener_cards, dealer_cards).astype(np.int64), actions
+
+
+def can_play(game):
+    # Only relative balances, a fixed balance can stop the run or skip a bet in the middle of a batch
+    return (any(p.batch_capable for p in game.players) and all(p.use_relative_balance for p in game.players)
+            and not game.display_text and not game.create_log and not any(p.observes_games for p in game.players))
+
+
+def play_games_batch(game, telemetry, chunk_size=1 << 14):
+    deck_size = len(game.cards)
+    betting_amounts = [p.betting_amount for p in game.players]
+    balances = np.array([p.get_balance() for p in game.players], dtype=np.int64)
+
+    # Streamed and exported runs fill one record chunk at a time, like jit_engine
+    chunked = game.record_chunked
+    if chunked:
+        chunk_size = game.record.size
+    histories = None if game.summary is not None else np.zeros((2, game.games), dtype=np.int64)
+    record = game.record
+
+    games_played = 0
+    while games_played < game.games and not game.break_loop:
+        end = min(games_played + chunk_size, game.games)
+        size = end - games_played
+
+        uniforms = game_uniforms(game.run_seed, games_played, size, game.duplicate_deals)
+        p1_opener = game_openers(games_played, size, game.fixed_seats)
+        p1_cards, p2_cards = player_cards(uniforms[:, 0], deck_size, p1_opener, game.duplicate_deals)
+        opener_cards = np.where(p1_opener, p1_cards, p2_cards)
+        dealer_cards = np.where(p1_opener, p2_cards, p1_cards)
+
+        payoff, actions = play_players_batch(game.players, np.where(p1_opener, 0, 1), opener_cards, dealer_cards,
+                                             uniforms)
+        p1_units = np.where(p1_opener, payoff, -payoff)
+        p1_payoff = p1_units * np.where(p1_units > 0, betting_amounts[1], betting_amounts[0])
+
+        if histories is not None:
+            p1_balances = balances[0] + np.cumsum(p1_payoff)
+            histories[0, games_played:end] = p1_balances
+            histories[1, games_played:end] = balances[0] + balances[1] - p1_balances
+        balances += [p1_payoff.sum(), -p1_payoff.sum()]
+
+        if record is not None:
+            record.add_batch(p1_opener, opener_cards, dealer_cards, actions, p1_payoff)
+            if chunked:
+                game.flush_record()
+        if game.statistics is not None and not chunked:
+            game.statistics.add_games(p1_opener, opener_cards, dealer_cards, actions, p1_payoff)
+
+        games_played = end
+        store_balances(game, balances, histories, games_played)
+        telemetry.check(games_played)
+
+    return games_played
+
+
+def store_balances(game, balances, histories, games_played):
+    for p, balance, history in zip(game.players, balances, histories if histories is not None else [None] * 2):
+        if p.use_relative_balance:
+            p.relative_balance = int(balance)
+        else:
+            p.balance = int(balance)
+        if history is not None:
+            p.balance_history = history[:games_played]
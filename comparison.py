@@ -0,0 +1,113 @@
+import argparse
+import math
+
+import numpy as np
+
+from analysis import expected_value, load_strategy
+from batch_engine import cumulative, deal_cards, play_batch, game_openers
+from playable import load_player
+from rng import game_uniforms, new_seed
+
+
+class ComparisonResult:
+    def __init__(self, names, games, payoff_sums, payoff_squares, difference_sums, difference_squares, z=1.96):
+        self.names = names
+        self.games = games
+        self.z = z
+        self.ev = payoff_sums / games
+        self.ev_variance = payoff_squares / games - self.ev ** 2
+        # Differences are against the first candidate, which is the baseline
+        self.difference = difference_sums / games
+        self.difference_variance = difference_squares / games - self.difference ** 2
+
+    def ev_interval(self, k):
+        return self.z * math.sqrt(max(self.ev_variance[k], 0.0) / self.games)
+
+    def difference_interval(self, k):
+        return self.z * math.sqrt(max(self.difference_variance[k], 0.0) / self.games)
+
+    def variance_reduction(self, k):
+        # How many times more games two independent runs would need for the same interval on the difference
+        independent = self.ev_variance[k] + self.ev_variance[0]
+        return independent / self.difference_variance[k] if self.difference_variance[k] > 0 else math.inf
+
+    def __str__(self):
+        lines = []
+        for k, name in enumerate(self.names):
+            line = f"{name}: EV {self.ev[k]:+.4f} ± {self.ev_interval(k):.4f}"
+            if k > 0:
+                line += f", vs {self.names[0]} {self.difference[k]:+.4f} ± {self.difference_interval(k):.4f}"
+                reduction = self.variance_reduction(k)
+                if math.isinf(reduction):
+                    line += " (played identically)"
+                else:
+                    line += f" ({reduction:.1f}x fewer games than independent runs)"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def compare_strategies(candidates, opponent, games, seed=None, same_opener_and_dealer=False, names=None,
+                       chunk_size=1 << 16):
+    # Every candidate plays the opponent over the same deals and the same uniform draws, so the differences
+    # between them only come from the strategies. candidates are probability tables shaped (node, card, action)
+    candidates = [np.asarray(candidate) for candidate in candidates]
+    names = names or [f"Candidate {k + 1}" for k in range(len(candidates))]
+    deck_size = np.asarray(opponent).shape[-2]
+    count = len(candidates)
+
+    # Index 0 .. count - 1 are the candidates, the opponent sits last
+    cum = cumulative(np.stack(candidates + [np.asarray(opponent)]))
+    candidate_index = np.arange(count)[:, None]
+    opponent_index = count
+
+    seed = new_seed() if seed is None else seed
+    payoff_sums, payoff_squares = np.zeros(count), np.zeros(count)
+    difference_sums, difference_squares = np.zeros(count), np.zeros(count)
+
+    for start in range(0, games, chunk_size):
+        size = min(chunk_size, games - start)
+        uniforms = game_uniforms(seed, start, size)
+        p1_cards, p2_cards = deal_cards(uniforms[:, 0], deck_size)
+        p1_opener = game_openers(start, size, same_opener_and_dealer)
+
+        opener = np.where(p1_opener, candidate_index, opponent_index)
+        dealer = np.where(p1_opener, opponent_index, candidate_index)
+        opener_cards = np.where(p1_opener, p1_cards, p2_cards)
+        dealer_cards = np.where(p1_opener, p2_cards, p1_cards)
+
+        opener_payoff, _ = play_batch(cum, opener, dealer, opener_cards, dealer_cards, uniforms)
+        payoff = np.where(p1_opener, opener_payoff, -opener_payoff)
+
+        difference = payoff - payoff[0]
+        payoff_sums += payoff.sum(axis=1)
+        payoff_squares += (payoff.astype(float) ** 2).sum(axis=1)
+        difference_sums += difference.sum(axis=1)
+        difference_squares += (difference.astype(float) ** 2).sum(axis=1)
+
+    return ComparisonResult(names, games, payoff_sums, payoff_squares, difference_sums, difference_squares)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare strategy files against one opponent on shared deals")
+    parser.add_argument("candidates", nargs="+", help="strategy files, the first one is the baseline")
+    parser.add_argument("--opponent", required=True, help="strategy file of the opponent or 'random'")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--same-opener-and-dealer", action="store_true")
+    args = parser.parse_args()
+
+    candidates = [load_strategy(path).probabilities for path in args.candidates]
+    opponent = load_player(args.opponent, candidates[0].shape[-2])
+    result = compare_strategies(candidates, opponent, args.games, args.seed, args.same_opener_and_dealer,
+                                names=args.candidates)
+    print(result)
+
+    for name, candidate in zip(args.candidates, candidates):
+        exact = expected_value(candidate, opponent)
+        if not args.same_opener_and_dealer:
+            exact = (exact - expected_value(opponent, candidate)) / 2
+        print(f"\t{name} exact EV: {exact:+.4f}")
+
+
+if __name__ == "__main__":
+    main()
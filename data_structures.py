@@ -1,6 +1,11 @@
 import json
 from os.path import exists
 
+import numpy as np
+
+from strategy_table import StrategyTable, ACTIONS, ACTION_CODES, NODES, OPENER_FIRST, DEALER_ON_CHECK, \
+    DEALER_ON_BET, OPENER_ON_CHECK, OPENER_ON_BET
+
 
 class DataHolder:
     default_data = dict()
@@ -60,213 +65,55 @@ class GameSettings(DataHolder):
         "create_log": False,
         "use_game_separator": True,
         "print_elapsed_time": True,
-        "print_portions": 100,
+        "progress_interval": 0.1,
         "print_progress": True,
         "display_matplotlib_results": True,
         "same_opener_and_dealer": True,
+        "deck_size": 3,
+        "record_statistics": True,
+        "stream_history": False,
+        "export_hand_history": False,
+        "memory_report": False,
+        "duplicate_deals": False,
     }
 
     def __init__(self, path="game_settings.txt"):
         super().__init__(path)
 
 
+def strategy_default_data(deck_size=3, bluffing=False):
+    # Bet and call with the top card, check or fold with everything else. The bluffing variant also bets
+    # the lowest card and calls with the second highest card a third of the time as the dealer
+    table = np.zeros((len(NODES), deck_size, len(ACTIONS)))
+    top = deck_size - 1
+    f, c, b = (ACTION_CODES[action] for action in ACTIONS)
+
+    table[[OPENER_FIRST, DEALER_ON_CHECK, OPENER_ON_CHECK], :top, c] = 1.0
+    table[[DEALER_ON_BET, OPENER_ON_BET], :top, f] = 1.0
+    table[:, top, b] = 1.0
+
+    if bluffing:
+        table[DEALER_ON_CHECK, 0] = 0.0
+        table[DEALER_ON_CHECK, 0, [f, b]] = [2.0, 1.0]
+        if deck_size > 2:
+            table[DEALER_ON_BET, top - 1, [f, b]] = [2.0, 1.0]
+
+    return StrategyTable(table).to_data()
+
+
 class SimpleAIData(DataHolder):
-    default_data = {
-        "opener_first_move": {
-            "one": {
-                "f": 0.0,
-                "c": 1.0,
-                "b": 0.0,
-            },
-            "two": {
-                "f": 0.0,
-                "c": 1.0,
-                "b": 0.0,
-            },
-            "three": {
-                "f": 0.0,
-                "c": 0.0,
-                "b": 1.0,
-            }
-        },
-        "dealer_first_move": {
-            "one": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 1.0,
-                    "b": 0.0,
-                },
-                "opponent_b": {
-                    "f": 1.0,
-                    "c": 0.0,
-                    "b": 0.0,
-                }
-            },
-            "two": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 1.0,
-                    "b": 0.0,
-                },
-                "opponent_b": {
-                    "f": 1.0,
-                    "c": 0.0,
-                    "b": 0.0,
-                }
-            },
-            "three": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 0.0,
-                    "b": 1.0,
-                },
-                "opponent_b": {
-                    "f": 0.0,
-                    "c": 0.0,
-                    "b": 1.0,
-                }
-            }
-        },
-        "opener_second_move": {
-            "one": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 1.0,
-                    "b": 0.0,
-                },
-                "opponent_b": {
-                    "f": 1.0,
-                    "c": 0.0,
-                    "b": 0.0,
-                }
-            },
-            "two": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 1.0,
-                    "b": 0.0,
-                },
-                "opponent_b": {
-                    "f": 1.0,
-                    "c": 0.0,
-                    "b": 0.0,
-                }
-            },
-            "three": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 0.0,
-                    "b": 1.0,
-                },
-                "opponent_b": {
-                    "f": 0.0,
-                    "c": 0.0,
-                    "b": 1.0,
-                }
-            }
-        }
-    }
+    default_data = strategy_default_data()
 
-    def __init__(self, path="simple_ai_data.txt"):
+    def __init__(self, path="simple_ai_data.txt", deck_size=None):
+        if deck_size is not None:
+            self.default_data = strategy_default_data(deck_size)
         super().__init__(path)
 
 
 class BluffingAIData(DataHolder):
-    default_data = {
-        "opener_first_move": {
-            "one": {
-                "f": 0.0,
-                "c": 1.0,
-                "b": 0.0,
-            },
-            "two": {
-                "f": 0.0,
-                "c": 1.0,
-                "b": 0.0,
-            },
-            "three": {
-                "f": 0.0,
-                "c": 0.0,
-                "b": 1.0,
-            }
-        },
-        "dealer_first_move": {
-            "one": {
-                "opponent_c": {
-                    "f": 2,
-                    "c": 0.0,
-                    "b": 1,
-                },
-                "opponent_b": {
-                    "f": 1.0,
-                    "c": 0.0,
-                    "b": 0.0,
-                }
-            },
-            "two": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 1.0,
-                    "b": 0.0,
-                },
-                "opponent_b": {
-                    "f": 2,
-                    "c": 0.0,
-                    "b": 1,
-                }
-            },
-            "three": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 0.0,
-                    "b": 1.0,
-                },
-                "opponent_b": {
-                    "f": 0.0,
-                    "c": 0.0,
-                    "b": 1.0,
-                }
-            }
-        },
-        "opener_second_move": {
-            "one": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 1.0,
-                    "b": 0.0,
-                },
-                "opponent_b": {
-                    "f": 1.0,
-                    "c": 0.0,
-                    "b": 0.0,
-                }
-            },
-            "two": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 1.0,
-                    "b": 0.0,
-                },
-                "opponent_b": {
-                    "f": 1.0,
-                    "c": 0.0,
-                    "b": 0.0,
-                }
-            },
-            "three": {
-                "opponent_c": {
-                    "f": 0.0,
-                    "c": 0.0,
-                    "b": 1.0,
-                },
-                "opponent_b": {
-                    "f": 0.0,
-                    "c": 0.0,
-                    "b": 1.0,
-                }
-            }
-        }
-    }
+    default_data = strategy_default_data(bluffing=True)
 
-    def __init__(self, path="bluffing_ai_data.txt"):
+    def __init__(self, path="bluffing_ai_data.txt", deck_size=None):
+        if deck_size is not None:
+            self.default_data = strategy_default_data(deck_size, bluffing=True)
         super().__init__(path)
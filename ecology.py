@@ -0,0 +1,158 @@
+import argparse
+import time
+from glob import glob
+
+import numpy as np
+
+from batch_engine import cumulative, deal_cards, play_batch
+from data_structures import SimpleAIData
+from playable import load_player
+from rng import game_uniforms
+from strategy_table import LEGAL_ACTIONS, StrategyTable
+
+
+class Ecology:
+    # A population of agents kept as arrays: one strategy table, one bankroll and the founding strategy each agent
+    # descends from. Every round pairs all agents at random and plays the pairings as one play_batch call, with the
+    # agent indices as the player indices into the stacked strategy tables
+    def __init__(self, founders, agents=10000, initial_bankroll=100, games_per_round=1, mutation_probability=0.1,
+                 mutation_rate=0.1, seed=None, names=None):
+        founders = [np.asarray(founder, dtype=float) for founder in founders]
+        self.names = names or [f"Founder {k + 1}" for k in range(len(founders))]
+        self.deck_size = founders[0].shape[-2]
+        self.agents = agents
+        self.initial_bankroll = initial_bankroll
+        self.games_per_round = games_per_round
+        self.mutation_probability = mutation_probability
+        self.mutation_rate = mutation_rate
+
+        self.rng = np.random.default_rng(seed)
+        # Deals and decisions come from rng.game_uniforms, numbered across the whole run
+        self.seed = int(self.rng.integers(1 << 62))
+
+        self.lineage = np.arange(agents) % len(founders)
+        self.probabilities = np.stack(founders)[self.lineage]
+        self.cum = cumulative(self.probabilities)
+        self.bankroll = np.full(agents, initial_bankroll, dtype=np.int64)
+        self.generation = np.zeros(agents, dtype=np.int64)
+
+        self.rounds = 0
+        self.games_played = 0
+        self.births = 0
+
+    def play_round(self):
+        # Agents are paired by a random permutation, each pair plays games_per_round games with alternating seats
+        order = self.rng.permutation(self.agents)
+        first, second = order[0:self.agents - 1:2], order[1::2]
+        games = np.arange(self.games_per_round)[:, None] % 2 == 0
+        opener = np.where(games, first, second).ravel()
+        dealer = np.where(games, second, first).ravel()
+
+        uniforms = game_uniforms(self.seed, self.games_played, len(opener))
+        opener_cards, dealer_cards = deal_cards(uniforms[:, 0], self.deck_size)
+        payoff, _ = play_batch(self.cum, opener, dealer, opener_cards, dealer_cards, uniforms)
+
+        self.bankroll += (np.bincount(opener, payoff, minlength=self.agents) -
+                          np.bincount(dealer, payoff, minlength=self.agents)).astype(np.int64)
+        self.games_played += len(opener)
+        self.rounds += 1
+
+    def reproduce(self):
+        # Agents that went broke leave and are replaced by children of the others, picked in proportion to their
+        # bankroll. A child copies the parent's table, mutated children mix every row with a random distribution
+        broke = np.flatnonzero(self.bankroll <= 0)
+        weights = np.maximum(self.bankroll, 0).astype(float)
+        if len(broke) == 0 or weights.sum() == 0:
+            return 0
+
+        parents = self.rng.choice(self.agents, size=len(broke), p=weights / weights.sum())
+        self.probabilities[broke] = self.probabilities[parents]
+        self.lineage[broke] = self.lineage[parents]
+        self.generation[broke] = self.generation[parents] + 1
+
+        mutated = broke[self.rng.random(len(broke)) < self.mutation_probability]
+        noise = self.rng.dirichlet(np.ones(self.probabilities.shape[-1]), size=(len(mutated),) +
+                                   self.probabilities.shape[1:-1])
+        # The noise is masked to the actions the rules allow and renormalized, so a bet is never checked to
+        noise = noise * LEGAL_ACTIONS[:, None, :]
+        noise /= noise.sum(axis=-1, keepdims=True)
+        self.probabilities[mutated] = (1 - self.mutation_rate) * self.probabilities[mutated] + \
+            self.mutation_rate * noise
+
+        self.cum[broke] = cumulative(self.probabilities[broke])
+        self.bankroll[broke] = self.initial_bankroll
+        self.births += len(broke)
+        return len(broke)
+
+    def run(self, rounds, reproduce_every=1, callback=None):
+        for _ in range(rounds):
+            self.play_round()
+            if self.rounds % reproduce_every == 0:
+                self.reproduce()
+            if callback is not None:
+                callback(self)
+        return self
+
+    def shares(self):
+        # Share of the population descending from each founder
+        return np.bincount(self.lineage, minlength=len(self.names)) / self.agents
+
+    def mean_strategy(self, founder=None):
+        members = self.probabilities if founder is None else self.probabilities[self.lineage == founder]
+        return members.mean(axis=0) if len(members) else None
+
+    def richest(self, count=1):
+        return np.argsort(-self.bankroll)[:count]
+
+    def save_agent(self, agent, path):
+        data = SimpleAIData(path, self.deck_size)
+        data.data = StrategyTable(self.probabilities[agent]).to_data()
+        data.save()
+        return data
+
+    def summary(self):
+        lines = [f"Round {self.rounds}: {self.games_played} games, {self.births} births"]
+        for founder, (name, share) in enumerate(zip(self.names, self.shares())):
+            members = self.lineage == founder
+            bankroll = self.bankroll[members].mean() if members.any() else 0.0
+            lines.append(f"\t{name}: {share:.1%} of the population, mean bankroll {bankroll:.1f}")
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strategies spreading through a population of agents")
+    parser.add_argument("founders", nargs="*", help="strategy files or 'random', defaults to every simple/bluffing "
+                                                    "AI file and random")
+    parser.add_argument("--agents", type=int, default=100000)
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--games-per-round", type=int, default=1)
+    parser.add_argument("--initial-bankroll", type=int, default=20)
+    parser.add_argument("--reproduce-every", type=int, default=1)
+    parser.add_argument("--mutation-probability", type=float, default=0.1)
+    parser.add_argument("--mutation-rate", type=float, default=0.1)
+    parser.add_argument("--report-every", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--save-richest", default=None, help="path the richest agent's strategy is saved to")
+    args = parser.parse_args()
+
+    paths = args.founders or sorted(glob("simple_ai_data_*.txt") + glob("bluffing_ai_data_*.txt")) + ["random"]
+    founders = [load_player(path) for path in paths]
+    ecology = Ecology(founders, args.agents, args.initial_bankroll, args.games_per_round, args.mutation_probability,
+                      args.mutation_rate, args.seed, paths)
+
+    def report(current):
+        if current.rounds % args.report_every == 0:
+            print(current.summary())
+
+    start = time.perf_counter()
+    ecology.run(args.rounds, args.reproduce_every, report)
+    elapsed = time.perf_counter() - start
+    print(f"{ecology.games_played} games in {elapsed:.2f}s ({ecology.games_played / elapsed:.0f} games/s)")
+
+    if args.save_richest:
+        ecology.save_agent(ecology.richest()[0], args.save_richest)
+        print(f"Richest agent saved to {args.save_richest}")
+
+
+if __name__ == "__main__":
+    main()
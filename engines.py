@@ -0,0 +1,119 @@
+import os
+import platform
+import time
+from multiprocessing import parent_process
+
+import batch_engine
+import jit_engine
+import sharding
+from data_structures import DataHolder
+from playable import Player, RandomAI
+
+
+# Fastest first when there is no calibration to go by
+ENGINE_ORDER = ["jit", "parallel", "batch", "python"]
+
+# Game counts each engine is timed at, the difference between the two runs gives the time per game
+CALIBRATION_GAMES = {
+    "python": (2000, 10000),
+    "batch": (20000, 200000),
+    "jit": (100000, 1000000),
+    "parallel": (1 << 18, 1 << 21),
+}
+
+
+def machine_key():
+    return f"{platform.node()}-{platform.machine()}-{os.cpu_count()}"
+
+
+class EngineCalibration(DataHolder):
+    # Startup time and time per game of every engine, stored per machine
+    def __init__(self, path="engine_calibration.txt"):
+        super().__init__(path)
+        self.data = dict(self.data)
+        self.machine = machine_key()
+
+    def timings(self):
+        return self.data.get(self.machine, dict())
+
+    def calibrate(self, engines=None):
+        from game import Game
+
+        timings = dict(self.timings())
+        for engine in engines or ENGINE_ORDER:
+            durations = []
+            # The first (untimed) run pays for imports and numba's compile or cache load
+            for games in (1000,) + CALIBRATION_GAMES[engine]:
+                game = Game(RandomAI("Calibration 1"), RandomAI("Calibration 2"), games=games, seed=0,
+                            engine=engine)
+                start = time.perf_counter()
+                game.play_games()
+                durations.append(time.perf_counter() - start)
+                if game.engine != engine:
+                    break
+            else:
+                small, large = CALIBRATION_GAMES[engine]
+                per_game = max((durations[2] - durations[1]) / (large - small), 0.0)
+                timings[engine] = {"startup": max(durations[1] - small * per_game, 0.0), "per_game": per_game}
+
+        self.data[self.machine] = timings
+        self.save()
+
+    def predict(self, engine, games):
+        timing = self.timings()[engine]
+        return timing["startup"] + games * timing["per_game"]
+
+
+ENGINE_RUNNERS = {
+    "jit": jit_engine.play_games_jit,
+    "parallel": sharding.play_games_parallel,
+    "batch": batch_engine.play_games_batch,
+    "python": lambda game, telemetry: game.play_games_python(telemetry),
+}
+
+
+def playable_engines(game):
+    engines = {
+        "jit": game.use_jit and jit_engine.can_play(game),
+        "parallel": sharding.can_play(game),
+        "batch": game.use_batch and batch_engine.can_play(game),
+        "python": True,
+    }
+    return [engine for engine in ENGINE_ORDER if engines[engine]]
+
+
+def select_engine(game, calibration=None):
+    # Returns the engine to run and why it was picked
+    if any(isinstance(p, Player) for p in game.players):
+        return "python", "a human player plays interactively"
+    if game.display_text or game.create_log:
+        return "python", "text output and logs are written game by game"
+    if any(p.observes_games for p in game.players):
+        return "python", "a player learns from every game"
+
+    engines = playable_engines(game)
+    in_worker = parent_process() is not None
+    if in_worker:
+        # Pool workers don't start a pool of their own
+        engines = [engine for engine in engines if engine != "parallel"]
+    if game.engine_preference in engines:
+        return game.engine_preference, "requested"
+    if len(engines) == 1:
+        return engines[0], "no faster engine can play these players"
+    if in_worker:
+        # Nor do they calibrate, several workers at once would race on the calibration file
+        return engines[0], "fastest first in a worker process"
+
+    calibration = calibration or EngineCalibration()
+    missing = [engine for engine in engines if engine not in calibration.timings()]
+    if missing:
+        calibration.calibrate(missing)
+    engines = [engine for engine in engines if engine in calibration.timings()]
+
+    predictions = {engine: calibration.predict(engine, game.games) for engine in engines}
+    best = min(predictions, key=predictions.get)
+    estimates = ", ".join(f"{engine} {seconds:.3g}s" for engine, seconds in predictions.items())
+    reason = f"fastest for {game.games} games ({estimates})"
+    if game.engine_preference not in ("auto", best):
+        reason = f"{game.engine_preference} can't play this run, {reason}"
+    return best, reason
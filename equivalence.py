@@ -0,0 +1,172 @@
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from analysis import expected_value
+from engines import ENGINE_ORDER
+from game import Game
+from playable import RandomAI, SimpleAI, BluffingAI
+
+
+REFERENCE = "python"
+
+# Fresh players for every run, the strategy files are the ones the GUI plays by default
+MATCHUPS = {
+    "random vs simple": lambda: (RandomAI("Random"), SimpleAI("Simple", data_path="simple_ai_data_1.txt")),
+    "simple vs bluffing": lambda: (SimpleAI("Simple", data_path="simple_ai_data_1.txt"),
+                                   BluffingAI("Bluffing", data_path="bluffing_ai_data_2.txt")),
+}
+
+
+def chi_square_p_value(statistic, df):
+    # Upper tail of the chi-square distribution by the Wilson-Hilferty cube root approximation, which is
+    # accurate to well below the significance levels used here once df is a few
+    if df <= 0:
+        return 1.0
+    z = ((statistic / df) ** (1 / 3) - (1 - 2 / (9 * df))) / math.sqrt(2 / (9 * df))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def normal_p_value(z):
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def goodness_of_fit(observed, probabilities):
+    # Rows along the last axis are separate multinomials, rows never visited add nothing. A count in a cell
+    # with probability 0 can't happen in the same game and fails the test outright
+    probabilities = np.broadcast_to(probabilities, observed.shape).reshape(-1, observed.shape[-1])
+    observed = observed.reshape(-1, observed.shape[-1]).astype(float)
+    expected = observed.sum(axis=-1, keepdims=True) * probabilities
+    if (observed[expected == 0] > 0).any():
+        return math.inf, 1
+    cells = expected > 0
+    statistic = ((observed - expected)[cells] ** 2 / expected[cells]).sum()
+    visited = observed.sum(axis=-1) > 0
+    df = int((cells[visited].sum(axis=-1) - 1).sum())
+    return statistic, df
+
+
+def homogeneity(first, second):
+    # Two sample chi-square per row: both count arrays are drawn from the same distribution
+    first = first.reshape(-1, first.shape[-1]).astype(float)
+    second = second.reshape(-1, second.shape[-1]).astype(float)
+    statistic, df = 0.0, 0
+    for a, b in zip(first, second):
+        cells = (a + b) > 0
+        if a.sum() == 0 or b.sum() == 0 or cells.sum() < 2:
+            continue
+        table = np.stack([a[cells], b[cells]])
+        expected = table.sum(axis=1, keepdims=True) * table.sum(axis=0) / table.sum()
+        statistic += ((table - expected) ** 2 / expected).sum()
+        df += cells.sum() - 1
+    return statistic, df
+
+
+class Check:
+    def __init__(self, matchup, engine, name, statistic, p_value):
+        self.matchup = matchup
+        self.engine = engine
+        self.name = name
+        self.statistic = statistic
+        self.p_value = p_value
+
+    def __str__(self):
+        return f"{self.matchup}, {self.engine}: {self.name} {self.statistic:.2f} (p = {self.p_value:.4f})"
+
+
+class EngineRun:
+    # One seeded run with a record, and everything the checks need from it
+    def __init__(self, matchup, engine, games, seed, deck_size=3):
+        p1, p2 = MATCHUPS[matchup]()
+        game = Game(p1, p2, games, deck_size=deck_size, record_statistics=True, seed=seed, engine=engine,
+                    keep_record=True)
+        game.play_games()
+        self.engine = game.engine
+        self.statistics = game.statistics
+        self.tables = [p.get_strategy_table(deck_size).probabilities[:, :deck_size] for p in game.players]
+        p1_opener, _, _, _, p1_payoff = game.record.arrays()
+        self.p1_opener = p1_opener.copy()
+        self.p1_payoff = p1_payoff.astype(float)
+
+    def deal_counts(self):
+        # Ordered deals of two different cards, both seats together
+        return self.statistics.deal_games.sum(axis=0)
+
+    def exact_mean_payoff(self):
+        # Player 1's exact value per game given the seats the run played, every betting amount is one unit
+        p1, p2 = self.tables
+        opener_share = self.p1_opener.mean()
+        return opener_share * expected_value(p1, p2) - (1 - opener_share) * expected_value(p2, p1)
+
+
+def check_run(matchup, run, reference, deck_size):
+    checks = []
+
+    deals = np.ones((deck_size, deck_size)) - np.eye(deck_size)
+    statistic, df = goodness_of_fit(run.deal_counts(), (deals / deals.sum()).ravel())
+    checks.append(Check(matchup, run.engine, "deal frequencies", statistic, chi_square_p_value(statistic, df)))
+
+    statistic, df = goodness_of_fit(run.statistics.action_counts, np.stack(run.tables))
+    checks.append(Check(matchup, run.engine, "action frequencies vs strategies", statistic,
+                        chi_square_p_value(statistic, df)))
+
+    payoff = run.p1_payoff
+    z = (payoff.mean() - run.exact_mean_payoff()) / (payoff.std() / math.sqrt(len(payoff)))
+    checks.append(Check(matchup, run.engine, "mean payoff vs exact EV (z)", z, normal_p_value(z)))
+
+    if reference is not None and run is not reference:
+        statistic, df = homogeneity(run.statistics.action_counts, reference.statistics.action_counts)
+        checks.append(Check(matchup, run.engine, "action frequencies vs reference", statistic,
+                            chi_square_p_value(statistic, df)))
+
+        other = reference.p1_payoff
+        z = (payoff.mean() - other.mean()) / math.sqrt(payoff.var() / len(payoff) + other.var() / len(other))
+        checks.append(Check(matchup, run.engine, "mean payoff vs reference (z)", z, normal_p_value(z)))
+    return checks
+
+
+def run_checks(engines=None, matchups=None, games=50000, seed=20240101, deck_size=3):
+    # Every engine plays with its own seed so the runs are independent samples, a fixed base seed keeps the
+    # harness deterministic from one commit to the next
+    checks = []
+    skipped = []
+    for matchup in matchups or MATCHUPS:
+        reference = EngineRun(matchup, REFERENCE, games, seed, deck_size)
+        checks += check_run(matchup, reference, None, deck_size)
+        for k, engine in enumerate(engines or ENGINE_ORDER, start=1):
+            if engine == REFERENCE:
+                continue
+            run = EngineRun(matchup, engine, games, seed + k, deck_size)
+            if run.engine != engine:
+                skipped.append(f"{matchup}, {engine}: ran on {run.engine} instead")
+                continue
+            checks += check_run(matchup, run, reference, deck_size)
+    return checks, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that every fast engine plays the same game as the "
+                                                 "reference Game.play_game loop")
+    parser.add_argument("--engines", nargs="+", choices=ENGINE_ORDER, default=None)
+    parser.add_argument("--games", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=20240101)
+    parser.add_argument("--deck-size", type=int, default=3)
+    parser.add_argument("--alpha", type=float, default=0.001, help="family wise significance level")
+    args = parser.parse_args()
+
+    checks, skipped = run_checks(args.engines, None, args.games, args.seed, args.deck_size)
+    # Bonferroni, so the whole harness fails on a correct engine with probability alpha at most
+    threshold = args.alpha / len(checks)
+    failed = [check for check in checks if check.p_value < threshold]
+    for check in checks:
+        print(f"{'FAIL' if check in failed else 'ok  '} {check}")
+    for line in skipped:
+        print(f"skip {line}")
+    print(f"{len(checks) - len(failed)}/{len(checks)} checks passed at p >= {threshold:.2e}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+
+import numpy as np
+
+from analysis import expected_value, exploitability
+from comparison import compare_strategies
+from data_structures import BluffingAIData
+from playable import load_player
+from strategy_table import LEGAL_ACTIONS, StrategyTable
+
+
+def softmax(logits):
+    # Every (node, card) row of the logits becomes a probability distribution over the actions, so mutation and
+    # crossover can work freely on the logits and never leave the simplex. Actions the rules don't allow are
+    # masked out first, as in StrategyTable.uniform
+    logits = np.where(LEGAL_ACTIONS[:, None, :], logits, -np.inf)
+    exponents = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exponents / exponents.sum(axis=-1, keepdims=True)
+
+
+def exact_fitness(population, opponents):
+    # Exact value per game of every individual against every opponent, averaged over both seats.
+    # expected_value plays the whole population at once through its leading dimension
+    fitness = np.zeros(len(population))
+    for opponent in opponents:
+        fitness += (expected_value(population, opponent) - expected_value(opponent, population)) / 2
+    return fitness / len(opponents)
+
+
+def simulated_fitness(population, opponents, games, seed):
+    # Batch simulated value, every individual plays the same deals and draws so their differences are only
+    # down to the strategies
+    fitness = np.zeros(len(population))
+    for opponent in opponents:
+        fitness += compare_strategies(list(population), opponent, games, seed).ev
+    return fitness / len(opponents)
+
+
+def evaluate_fitness(population, opponents, mode="exact", games=20000, seed=0):
+    if mode == "exact":
+        return exact_fitness(population, opponents)
+    return simulated_fitness(population, opponents, games, seed)
+
+
+class EvolutionResult:
+    def __init__(self, logits, fitness, history):
+        order = np.argsort(-fitness)
+        self.probabilities = softmax(logits[order])
+        self.fitness = fitness[order]
+        # Best and mean fitness of every generation
+        self.history = history
+
+    def best(self, count=1):
+        return self.probabilities[:count]
+
+    def save(self, prefix="evolved_ai_data", count=1):
+        paths = []
+        for rank, probabilities in enumerate(self.best(count), start=1):
+            path = f"{prefix}_{rank}.txt"
+            data = BluffingAIData(path, probabilities.shape[-2])
+            data.data = StrategyTable(probabilities).to_data()
+            data.save()
+            paths.append(path)
+        return paths
+
+
+class Evolution:
+    # Evolution strategy over strategy tables: the elite survive unchanged, the rest of every generation are
+    # children of two elite parents, crossed over per (node, card) row and mutated with gaussian noise
+    def __init__(self, opponents, population_size=64, elite=8, sigma=0.5, sigma_decay=0.99, mode="exact",
+                 games=20000, workers=None, seed=None):
+        self.opponents = [np.asarray(opponent, dtype=float) for opponent in opponents]
+        self.deck_size = self.opponents[0].shape[-2]
+        self.population_size = population_size
+        self.elite = min(elite, population_size)
+        self.sigma = sigma
+        self.sigma_decay = sigma_decay
+        self.mode = mode
+        self.games = games
+        self.workers = workers or os.cpu_count()
+        self.rng = np.random.default_rng(seed)
+        self.seed = int(self.rng.integers(1 << 62))
+
+    def initial_population(self):
+        shape = (self.population_size,) + self.opponents[0].shape
+        logits = self.rng.normal(0.0, 1.0, shape)
+        # Start one individual at the uniform strategy and one at each opponent
+        logits[0] = 0.0
+        for k, opponent in enumerate(self.opponents[:self.population_size - 1], start=1):
+            logits[k] = np.log(np.maximum(opponent, 1e-6))
+        return logits
+
+    def evaluate(self, executor, logits, generation):
+        # Splits the generation into one part per worker, simulated fitness uses new draws every generation
+        population = softmax(logits)
+        parts = np.array_split(population, min(self.workers, len(population)))
+        futures = [executor.submit(evaluate_fitness, part, self.opponents, self.mode, self.games,
+                                   self.seed + generation) for part in parts]
+        return np.concatenate([future.result() for future in futures])
+
+    def next_generation(self, logits, fitness, sigma):
+        parents = logits[np.argsort(-fitness)[:self.elite]]
+        children = self.population_size - self.elite
+        first = parents[self.rng.integers(self.elite, size=children)]
+        second = parents[self.rng.integers(self.elite, size=children)]
+        rows = self.rng.random(first.shape[:-1] + (1,)) < 0.5
+        offspring = np.where(rows, first, second) + self.rng.normal(0.0, sigma, first.shape)
+        return np.concatenate([parents, offspring])
+
+    def run(self, generations=100, callback=None):
+        logits = self.initial_population()
+        sigma = self.sigma
+        history = []
+        with ProcessPoolExecutor(self.workers) as executor:
+            fitness = self.evaluate(executor, logits, 0)
+            for generation in range(1, generations + 1):
+                history.append((fitness.max(), fitness.mean()))
+                if callback is not None:
+                    callback(generation, fitness)
+                logits = self.next_generation(logits, fitness, sigma)
+                sigma *= self.sigma_decay
+                fitness = self.evaluate(executor, logits, generation)
+        history.append((fitness.max(), fitness.mean()))
+        return EvolutionResult(logits, fitness, history)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evolve strategies that do best against a population of opponents")
+    parser.add_argument("opponents", nargs="*", help="strategy files or 'random', defaults to every simple/bluffing "
+                                                     "AI file")
+    parser.add_argument("--generations", type=int, default=100)
+    parser.add_argument("--population", type=int, default=64)
+    parser.add_argument("--elite", type=int, default=8)
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--mode", choices=["exact", "simulated"], default="exact")
+    parser.add_argument("--games", type=int, default=20000, help="games per individual and opponent when simulated")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--keep", type=int, default=3, help="number of best individuals to save")
+    parser.add_argument("--prefix", default="evolved_ai_data")
+    args = parser.parse_args()
+
+    paths = args.opponents or sorted(path for path in glob("simple_ai_data_*.txt") + glob("bluffing_ai_data_*.txt")
+                                     if not path.endswith("_best_response.txt"))
+    deck_size = load_player(paths[0]).shape[-2]
+    opponents = [load_player(path, deck_size) for path in paths]
+
+    def report(generation, fitness):
+        if generation % 10 == 0 or generation == 1:
+            print(f"Generation {generation}: best {fitness.max():+.4f}, mean {fitness.mean():+.4f}")
+
+    evolution = Evolution(opponents, args.population, args.elite, args.sigma, mode=args.mode, games=args.games,
+                          workers=args.workers, seed=args.seed)
+    result = evolution.run(args.generations, report)
+
+    for path, fitness, probabilities in zip(result.save(args.prefix, args.keep), result.fitness,
+                                            result.probabilities):
+        exact = exact_fitness(probabilities[None], opponents)[0]
+        print(f"{path}: fitness {fitness:+.4f}, exact EV vs population {exact:+.4f}, "
+              f"exploitability {exploitability(probabilities):.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,40 @@
 from line_profiler_pycharm import profile
 from card import Card
+from bankroll import simulate_bankrolls
+from engines import ENGINE_RUNNERS, select_engine
+from game_statistics import MAX_DECK_SIZE, GameRecord, GameStatistics, PairedSummary
+from batch_engine import cumulative, player_cards, game_openers, play_batch
+from hand_history import HandHistoryWriter
+from memory_report import MemoryReport, predict_memory
+from rng import game_uniforms, new_seed
+from streaming import StreamingSummary
+from game_tree import OPENER, ROOT, STATE_NODE, STATE_SEAT, NEXT_STATE, FOLDER, PLAY_METHODS, STATE_ACTIONS
+from strategy_table import ACTIONS, ACTION_CODES
 import matplotlib.pyplot as plt
-import random
-import time
+import numpy as np
 import logging
 
+from telemetry import Telemetry, print_progress as telemetry_print_progress, log_progress as telemetry_log_progress
+
+
+# Plain list copies of the game_tree tables, indexing them is much cheaper than numpy scalars one game at a time
+state_nodes, state_seats, next_states, folders = (table.tolist() for table in (STATE_NODE, STATE_SEAT, NEXT_STATE,
+                                                                               FOLDER))
 
 logging.basicConfig(filename="log.log", level=logging.INFO, format="%(message)s", filemode="w")
 
 
 class Game:
     def __init__(self, p1, p2, games=1, display_text=False, create_log=False, use_game_separators=True,
-                 same_opener_and_dealer=False):
+                 same_opener_and_dealer=False, deck_size=3, record_statistics=False, use_jit=True,
+                 history_mode="full", stream_chunk_size=1 << 16, hand_history_path=None, seed=None, use_batch=True,
+                 engine="auto", memory_report=False, duplicate_deals=False, keep_record=False):
         self.break_loop = False
         self.games = games
         self.score_p1 = 0
         self.score_p2 = 0
-        self.cards = [Card(1), Card(2), Card(3)]
+        self.cards = []
+        self.set_deck_size(deck_size)
         self.p1 = p1
         self.p2 = p2
         self.players = [self.p1, self.p2]
@@ -25,15 +43,71 @@ class Game:
         self.opener = None
         self.dealer = None
         self.player_folded = False
+        self.final_state = ROOT
+        self.game_actions = []
+        self.observers = []
+
+        self.record_statistics = record_statistics
+        # Keeps the record of every game of a full run in self.record, resimulation needs it. Statistics are counted
+        # as the games are played and don't need it
+        self.keep_record = keep_record
+        self.record = None
+        self.statistics = None
+        # Games the python engine played since they were last added to the record and statistics
+        self.played = []
+
+        # Every game draws its deal and decisions from rng.game_uniforms(run_seed, game), a new run seed is
+        # picked for each run unless seed is set
+        self.seed = seed
+        self.run_seed = None
+        self.batch_start = 0
+        self.batch_uniforms = None
+        self.uniforms = None
+
+        # "auto" lets engines.select_engine pick the fastest engine that can play the run, or name one to use
+        # whenever it can. engine and engine_reason tell which one ran and why
+        self.engine_preference = engine
+        self.use_jit = use_jit
+        self.use_batch = use_batch
+        self.engine = None
+        self.engine_reason = ""
+
+        # Opt in tracemalloc report of each run, kept in self.memory
+        self.memory_report = memory_report
+        self.memory = None
+        # Tk root of the GUI running the game, its widgets are counted in the memory report
+        self.memory_root = None
+
+        # "full" keeps every balance in the players' histories, "stream" only keeps StreamingSummary aggregates
+        self.history_mode = history_mode
+        self.stream_chunk_size = stream_chunk_size
+        self.summary = None
+
+        # Directory the hand level export is written to in stream_chunk_size chunks, None to skip it
+        self.hand_history_path = hand_history_path
+        self.hand_history = None
+        self.record_chunked = False
 
         self.display_text = display_text
         self.use_game_separators = use_game_separators
         self.create_log = create_log
         self.same_opener_and_dealer = same_opener_and_dealer
+        # Plays every deal twice, the second time with the seats and cards swapped, and keeps the paired
+        # difference in self.paired. Seats always alternate in this mode
+        self.duplicate_deals = duplicate_deals
+        self.paired = None
+
+        # Strategy tables the last run was played with, resimulation.resimulate compares them with the current ones
+        self.run_tables = None
+
+    @property
+    def fixed_seats(self):
+        return self.same_opener_and_dealer and not self.duplicate_deals
 
     def reset_new_games(self):
         for p in self.players:
             p.reset()
+        self.observers = [p for p in self.players if p.observes_games]
 
     def set_player(self, p1, p2):
         self.p1, self.p2 = p1, p2
@@ -45,6 +119,18 @@ class Game:
     def set_games(self, games):
         self.games = games
 
+    def set_deck_size(self, deck_size):
+        if deck_size < 2:
+            raise ValueError("A deck needs at least 2 cards")
+        if deck_size > MAX_DECK_SIZE:
+            raise ValueError(f"A deck can have at most {MAX_DECK_SIZE} cards")
+        self.cards = [Card(value) for value in range(1, deck_size + 1)]
+
+    def check_deck_size(self):
+        for p in self.players:
+            if not p.supports_deck_size(len(self.cards)):
+                raise ValueError(f"{p.name} has no strategy for a {len(self.cards)} card deck")
+
     def check_balance(self):
         return all([p.check_balance() for p in self.players])
 
@@ -55,7 +141,7 @@ class Game:
         return self.pool
 
     def choose_opener_and_dealer(self, i):
-        if not self.same_opener_and_dealer:
+        if not self.fixed_seats:
             self.opener = self.p1 if i % 2 == 0 else self.p2
             self.dealer = self.p2 if i % 2 == 0 else self.p1
         else:
@@ -81,7 +167,15 @@ class Game:
 
     @profile
     def choose_cards(self):
-        self.p1.card, self.p2.card = random.sample(self.cards, k=2)
+        # Same mapping from the deal uniform to two cards as batch_engine.player_cards
+        deck_size = len(self.cards)
+        deal = min(int(self.uniforms[0] * (deck_size * (deck_size - 1))), deck_size * (deck_size - 1) - 1)
+        first, second = divmod(deal, deck_size - 1)
+        if second >= first:
+            second += 1
+        if self.duplicate_deals and self.opener is self.p2:
+            first, second = second, first
+        self.p1.card, self.p2.card = self.cards[first], self.cards[second]
 
         if self.display_text:
             print(f"\t{self.p1.text_color}{self.p1.name}{self.p1.default_color} {self.p1.card} - "
@@ -96,6 +190,8 @@ class Game:
         self.opener = None
         self.dealer = None
         self.player_folded = False
+        self.final_state = ROOT
+        self.game_actions = []
 
     @profile
     def initial_setup(self, game):
@@ -113,39 +209,34 @@ class Game:
         else:
             return self.opener
 
-    def player_choice(self, player, play_method, opponent_choice=None):
+    def player_choice(self, player, play_method, node, opponent_choice=None):
+        player.uniform = self.uniforms[len(self.game_actions) + 1]
         player_choice = play_method(opponent_choice)
+        self.game_actions.append((player, node, player_choice))
         if player_choice == "b":
             self.pool += player.bet()
         if self.display_text:
             print(f"\t\t{player.text_color}{player.name}{player.default_color} - {player_choice}")
         if self.create_log:
             logging.info(f"\t\t{player.name} - {player_choice}")
-        if player_choice == "f":
-            self.player_folded = True
-            self.pay_winner(self.get_opposite_player(player),
-                            message_beginning="won",
-                            message_end=f" folded", display_loser_name=True)
         return player_choice
 
     def player_choices(self):
-        opener_choice = self.player_choice(self.opener, self.opener.play_opener)
-        if self.player_folded:
-            return
-
-        dealer_choice = self.player_choice(self.dealer, self.dealer.play_dealer, opener_choice)
-        if self.player_folded:
-            return
-
-        if opener_choice == "c" and dealer_choice == "b":
-            self.player_choice(self.opener, self.opener.play_opener_choice_on_dealer_bet, dealer_choice)
+        # Steps through the game_tree state table until a terminal state, which payout then settles
+        state = ROOT
+        opponent_choice = None
+        while state_nodes[state] >= 0:
+            player = self.opener if state_seats[state] == OPENER else self.dealer
+            opponent_choice = self.player_choice(player, getattr(player, PLAY_METHODS[state]), state_nodes[state],
+                                                 opponent_choice)
+            state = next_states[state][ACTION_CODES[opponent_choice]]
+        self.final_state = state
+        self.player_folded = folders[state] >= 0
 
     def pay_winner(self, winner, message_beginning="", message_end="", display_loser_name=False):
         winner.win(self.pool)
         loser = self.get_opposite_player(winner)
 
-        self.record_balance_changes()
-
         if self.display_text:
             if display_loser_name:
                 print(f"{winner.text_color}{winner.name}{winner.default_color} {message_beginning} "
@@ -158,14 +249,15 @@ class Game:
                          f"{self.pool}{', ' + loser.name if display_loser_name else ''}{message_end}")
 
     def payout(self):
-        if self.player_folded:
-            return
-
-        winner = self.dealer
-        if self.opener.card.value > self.dealer.card.value:
-            winner = self.opener
+        folder = folders[self.final_state]
+        if folder >= 0:
+            winner = self.dealer if folder == OPENER else self.opener
+            self.pay_winner(winner, message_beginning="won", message_end=f" folded", display_loser_name=True)
+        else:
+            winner = self.opener if self.opener.card.value > self.dealer.card.value else self.dealer
+            self.pay_winner(winner, message_beginning="got the larger card, won")
 
-        self.pay_winner(winner, message_beginning="got the larger card, won")
+        self.record_balance_changes()
 
     def print_final_outcome(self):
         self.print_info("Final", "")
@@ -182,51 +274,208 @@ class Game:
 
     # @profile
     def play_game(self, game):
+        self.uniforms = self.batch_uniforms[game - self.batch_start].tolist()
+        start_balance = self.p1.get_balance()
         self.initial_setup(game)
 
         self.player_choices()
 
         self.payout()
 
+        for p in self.observers:
+            opponent = self.get_opposite_player(p)
+            p.observe_game(self.game_actions, None if self.player_folded else opponent.card)
+
+        if self.record is not None or self.statistics is not None:
+            self.played.append((self.opener is self.p1, self.opener.card.value, self.dealer.card.value,
+                                self.final_state, self.p1.get_balance() - start_balance))
+
         self.print_final_outcome()
 
-    def play_games(self, print_elapsed_time=False, print_portions=1, print_progress=False,
-                   increase_progress_method=lambda: None, change_time_elapsed=lambda: None):
-        if print_elapsed_time:
-            start = time.time()
+    def play_games(self, print_elapsed_time=False, progress_interval=0.1, print_progress=False,
+                   increase_progress_method=lambda percentage: None, change_time_elapsed=lambda time_elapsed: None,
+                   telemetry=None):
+        if telemetry is None:
+            telemetry = Telemetry(progress_interval)
 
+        run_subscribers = [lambda snapshot: increase_progress_method(snapshot.percentage)]
         if print_progress:
-            print_step = self.games // print_portions
+            run_subscribers.append(telemetry_print_progress)
+        if self.create_log:
+            run_subscribers.append(telemetry_log_progress)
 
+        self.check_deck_size()
         self.reset_new_games()
+        # Picked before the run's memory accounting and clock start, the first auto run on a machine calibrates
+        self.engine, self.engine_reason = select_engine(self)
+
+        memory = MemoryReport() if self.memory_report else None
+        if memory is not None:
+            memory.start()
+
+        self.run_seed = self.seed if self.seed is not None else new_seed()
+        tables = [p.get_strategy_table(len(self.cards)) for p in self.players]
+        self.run_tables = [None if table is None else table.probabilities[:, :len(self.cards)].copy()
+                           for table in tables]
         self.break_loop = False
-        for game in range(self.games):
-            if self.break_loop:
-                break
-            if print_progress:
-                if (game + 1) % print_step == 0:
-                    percentage = (100 // print_portions) * ((game // print_step) + 1)
-                    increase_progress_method(percentage)
-                    if print_progress:
-                        print(f"{percentage}%")
-
-            if not self.check_balance():
-                break
-            self.play_game(game)
+        self.statistics = None
+        self.summary = None
+        self.hand_history = None
+        self.paired = PairedSummary() if self.duplicate_deals else None
+        if self.hand_history_path:
+            self.hand_history = HandHistoryWriter(self.hand_history_path, [p.betting_amount for p in self.players],
+                                                  len(self.cards))
+        if self.history_mode == "stream":
+            self.record = GameRecord(self.stream_chunk_size)
+            self.summary = StreamingSummary(len(self.cards), self.p1.get_balance(),
+                                            self.p1.get_balance() + self.p2.get_balance(), seed=self.run_seed)
+        else:
+            if self.hand_history is not None:
+                self.record = GameRecord(self.stream_chunk_size)
+            else:
+                self.record = GameRecord(self.games) if self.keep_record or self.duplicate_deals else None
+            if self.record_statistics:
+                self.statistics = GameStatistics(None, len(self.cards), games=self.games)
+        self.record_chunked = self.summary is not None or self.hand_history is not None
+        telemetry.start(self, run_subscribers)
+
+        if memory is not None:
+            memory.predicted = predict_memory(self, self.engine)
+        games_played = ENGINE_RUNNERS[self.engine](self, telemetry)
+
+        if self.record_chunked:
+            self.flush_record()
+            if self.summary is not None and self.record_statistics:
+                self.statistics = self.summary.statistics
+            if self.hand_history is not None:
+                self.hand_history.close()
+        elif self.paired is not None:
+            self.paired.add(self.record.arrays()[-1])
+
+        telemetry.finish(games_played)
+        if memory is not None:
+            self.memory = memory.finish(self, self.memory_root)
 
         if print_elapsed_time:
-            end = time.time()
-            time_elapsed = round(end - start, 2)
+            time_elapsed = round(telemetry.latest.elapsed, 2)
+            print(f"Engine: {self.engine}, {self.engine_reason}")
+            if self.paired is not None:
+                print(self.paired)
+            if self.memory is not None:
+                print(self.memory)
             print(f"{time_elapsed}s")
             change_time_elapsed(time_elapsed)
 
+    def play_games_python(self, telemetry):
+        games_played = 0
+        while games_played < self.games:
+            batch_end = min(games_played + telemetry.batch_size, self.games)
+            games_played = self.play_game_batch(games_played, batch_end)
+            if games_played < batch_end:
+                break
+            telemetry.check(games_played)
+        return games_played
+
+    def play_game_batch(self, start, end):
+        # Returns how many games have been played when the batch ends early
+        self.batch_start = start
+        self.batch_uniforms = game_uniforms(self.run_seed, start, end - start, self.duplicate_deals)
+        played = end
+        for game in range(start, end):
+            if self.break_loop or not self.check_balance():
+                played = game
+                break
+            self.play_game(game)
+        self.add_played()
+        return played
+
+    def add_played(self):
+        # The python engine's games go to the record and statistics once per batch rather than one at a time
+        if not self.played:
+            return
+        p1_opener, opener_card, dealer_card, final_state, p1_payoff = np.array(self.played, dtype=np.int64).T
+        self.played = []
+        p1_opener = p1_opener == 1
+        actions = STATE_ACTIONS[final_state]
+        if self.statistics is not None and not self.record_chunked:
+            self.statistics.add_games(p1_opener, opener_card, dealer_card, actions, p1_payoff)
+        if self.record is None:
+            return
+
+        added = 0
+        while added < len(p1_payoff):
+            # A chunked record takes the games that fit and is flushed when full
+            end = min(added + self.record.size - self.record.length, len(p1_payoff))
+            self.record.add_batch(p1_opener[added:end], opener_card[added:end], dealer_card[added:end],
+                                  actions[added:end], p1_payoff[added:end])
+            if self.record_chunked and self.record.length == self.record.size:
+                self.flush_record()
+            added = end
+
+    def simulate_bankrolls(self, sessions=10000, seed=None):
+        # Risk of ruin of the current players in fixed balance mode, each session is a run of self.games games
+        deck_size = len(self.cards)
+        tables = [p.get_strategy_table(deck_size) for p in self.players]
+        if any(table is None for table in tables):
+            raise ValueError("Bankroll simulation needs players with a fixed strategy table")
+        if self.p1.betting_amount != self.p2.betting_amount:
+            raise ValueError("Bankroll simulation needs both players to bet the same amount")
+
+        return simulate_bankrolls(*[table.probabilities[:, :deck_size] for table in tables],
+                                  [p.initial_balance for p in self.players], self.p1.betting_amount, sessions,
+                                  self.games, self.same_opener_and_dealer, seed)
+
+    def regenerate_game(self, game):
+        # Deal and actions of one game of the last run, without replaying the games before it. Decisions can
+        # only be regenerated for players with a fixed strategy table, otherwise actions is None
+        uniforms = game_uniforms(self.run_seed, game, 1, self.duplicate_deals)
+        deck_size = len(self.cards)
+        p1_opener = bool(game_openers(game, 1, self.fixed_seats)[0])
+        p1_card, p2_card = (int(card[0]) for card in player_cards(uniforms[:, 0], deck_size, np.array([p1_opener]),
+                                                                 self.duplicate_deals))
+        result = {"game": game, "uniforms": uniforms[0], "p1_opener": p1_opener, "p1_card": p1_card,
+                  "p2_card": p2_card, "actions": None, "p1_payoff": None}
+
+        tables = [p.get_strategy_table(deck_size) for p in self.players]
+        if all(table is not None for table in tables):
+            cum = cumulative(np.stack([table.probabilities[:, :deck_size] for table in tables]))
+            opener = 0 if p1_opener else 1
+            cards = [p1_card, p2_card]
+            payoff, actions = play_batch(cum, np.array([opener]), np.array([1 - opener]),
+                                         np.array([cards[opener]]), np.array([cards[1 - opener]]), uniforms)
+            p1_units = int(payoff[0] if p1_opener else -payoff[0])
+            loser = self.p2 if p1_units > 0 else self.p1
+            result["actions"] = [ACTIONS[code] for code in actions[0] if code >= 0]
+            result["p1_payoff"] = p1_units * loser.betting_amount
+        return result
+
+    def flush_record(self):
+        if self.paired is not None:
+            self.paired.add(self.record.arrays()[-1])
+        if self.summary is not None:
+            self.summary.add(self.record)
+        elif self.statistics is not None:
+            self.statistics.add(self.record)
+        if self.hand_history is not None:
+            self.hand_history.write(self.record)
+        self.record.clear()
+
+    def balance_histories(self):
+        # Balance curves and the number of games between two points, streamed runs only keep a decimated curve
+        if self.summary is not None:
+            return self.summary.curves(), self.summary.curve.step
+        return [p.balance_history for p in self.players], 1
+
     def display_matplotlib_results(self):
         plt.clf()
-        for p in self.players:
-            plt.plot(p.balance_history, label=p.name)
+        histories, step = self.balance_histories()
+        for p, history in zip(self.players, histories):
+            plt.plot([index * step for index in range(len(history))], history, label=p.name)
         plt.legend()
         plt.show()
 
     def record_balance_changes(self):
+        if self.summary is not None:
+            return
         for p in self.players:
             p.record_balance_change()
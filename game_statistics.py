@@ -0,0 +1,382 @@
+import math
+
+import numpy as np
+
+from game_tree import OPENER, ROOT, STATE_NODE, STATE_SEAT, NEXT_STATE, FOLDER
+from strategy_table import ACTIONS, ACTION_CODES, NODES, OPENER_FIRST, DEALER_ON_CHECK, DEALER_ON_BET, \
+    OPENER_ON_BET
+
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        # Without numba the kernels still run as plain (slow) python, they are only called when numba is installed
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+
+STAGES = 3
+# Card values are stored as uint8
+MAX_DECK_SIZE = np.iinfo(np.uint8).max
+
+
+class GameRecord:
+    # One row per game: cards, seats, action codes per stage (-1 when the stage was not reached) and the payoff
+    def __init__(self, size):
+        self.size = size
+        self.length = 0
+        self.p1_opener = np.zeros(size, dtype=bool)
+        self.opener_card = np.zeros(size, dtype=np.uint8)
+        self.dealer_card = np.zeros(size, dtype=np.uint8)
+        self.actions = np.full((size, STAGES), -1, dtype=np.int8)
+        self.p1_payoff = np.zeros(size, dtype=np.int32)
+
+    def add(self, p1_opener, opener_card, dealer_card, action_codes, p1_payoff):
+        index = self.length
+        self.p1_opener[index] = p1_opener
+        self.opener_card[index] = opener_card
+        self.dealer_card[index] = dealer_card
+        self.actions[index, :len(action_codes)] = action_codes
+        self.p1_payoff[index] = p1_payoff
+        self.length = index + 1
+
+    def add_batch(self, p1_opener, opener_card, dealer_card, actions, p1_payoff):
+        start, end = self.length, self.length + len(p1_payoff)
+        self.p1_opener[start:end] = p1_opener
+        self.opener_card[start:end] = opener_card
+        self.dealer_card[start:end] = dealer_card
+        self.actions[start:end] = actions
+        self.p1_payoff[start:end] = p1_payoff
+        self.length = end
+
+    def clear(self):
+        self.length = 0
+        self.actions.fill(-1)
+
+    def arrays(self):
+        n = self.length
+        return self.p1_opener[:n], self.opener_card[:n], self.dealer_card[:n], self.actions[:n], self.p1_payoff[:n]
+
+
+def stage_nodes(actions):
+    # Strategy node of every stage, the dealer's node depends on the opener's first action
+    nodes = np.empty(actions.shape, dtype=np.int64)
+    nodes[:, 0] = OPENER_FIRST
+    nodes[:, 1] = np.where(actions[:, 0] == ACTION_CODES["c"], DEALER_ON_CHECK, DEALER_ON_BET)
+    nodes[:, 2] = OPENER_ON_BET
+    return nodes
+
+
+def action_counts(p1_opener, opener_card, dealer_card, actions, deck_size):
+    # Counts shaped (player, node, card, action) from a single bincount over flat indexes
+    nodes = stage_nodes(actions)
+    cards = np.stack([opener_card, dealer_card, opener_card], axis=1).astype(np.int64) - 1
+    p1_acting = np.stack([p1_opener, ~p1_opener, p1_opener], axis=1)
+    player = np.where(p1_acting, 0, 1)
+
+    played = actions >= 0
+    flat = ((player * len(NODES) + nodes) * deck_size + cards) * len(ACTIONS) + actions
+    size = 2 * len(NODES) * deck_size * len(ACTIONS)
+    return np.bincount(flat[played], minlength=size).reshape(2, len(NODES), deck_size, len(ACTIONS))
+
+
+def outcome_counts(actions, p1_payoff):
+    # Showdowns, showdowns won by player 1, folds and folds won by player 1
+    wins = p1_payoff > 0
+    folded = (actions == ACTION_CODES["f"]).any(axis=1)
+    return np.array([(~folded).sum(), (wins & ~folded).sum(), folded.sum(), (wins & folded).sum()], dtype=np.int64)
+
+
+# Indexes into GameStatistics.outcomes
+SHOWDOWNS, SHOWDOWN_WINS, FOLDS, FOLD_WINS = range(4)
+
+
+@njit(cache=True)
+def count_games(p1_opener, opener_card, dealer_card, actions, p1_payoff, first, deck_size, action_counts,
+                deal_games, deal_payoff, outcomes, recent_wins, window_wins, win_rates):
+    # Adds the games of a record to the GameStatistics counters, first is the index of its first game among the
+    # counted games. recent_wins holds the wins of the last window games at game % window and window_wins their sum
+    window = len(recent_wins)
+    slot = first % window if window else 0
+    for row in range(len(p1_payoff)):
+        state = ROOT
+        for stage in range(actions.shape[1]):
+            action = actions[row, stage]
+            if action < 0:
+                break
+            opener_acts = STATE_SEAT[state] == OPENER
+            player = 0 if opener_acts == p1_opener[row] else 1
+            card = opener_card[row] if opener_acts else dealer_card[row]
+            action_counts[player, STATE_NODE[state], card - 1, action] += 1
+            state = NEXT_STATE[state, action]
+
+        seat = 0 if p1_opener[row] else 1
+        deal = (int(opener_card[row]) - 1) * deck_size + int(dealer_card[row]) - 1
+        deal_games[seat, deal] += 1
+        deal_payoff[seat, deal] += p1_payoff[row]
+        won = 1 if p1_payoff[row] > 0 else 0
+        outcome = FOLDS if FOLDER[state] >= 0 else SHOWDOWNS
+        outcomes[outcome] += 1
+        outcomes[outcome + 1] += won
+        if window:
+            window_wins[0] += won - recent_wins[slot]
+            recent_wins[slot] = won
+            slot = slot + 1 if slot + 1 < window else 0
+            game = first + row
+            if game >= window - 1:
+                win_rates[game - window + 1] = window_wins[0] / window
+
+
+class GameStatistics:
+    def __init__(self, record, deck_size, window=1000, games=None):
+        # A window of None skips the rolling win rate, which is the only part that grows with the game count.
+        # With the run's game count known up front its values are filled into one preallocated array
+        self.deck_size = deck_size
+        self.window = window
+        self.games = 0
+        self.action_counts = np.zeros((2, len(NODES), deck_size, len(ACTIONS)), dtype=np.int64)
+        # Totals per (p1 seat, deal) where deal = opener card index * deck size + dealer card index
+        self.deal_games = np.zeros((2, deck_size * deck_size), dtype=np.int64)
+        self.deal_payoff = np.zeros((2, deck_size * deck_size), dtype=np.int64)
+        self.outcomes = np.zeros(4, dtype=np.int64)
+        # Wins of the last window games at game % window and their sum, so games can be counted one at a time
+        self.recent_wins = np.zeros(window or 0, dtype=np.int64)
+        self.window_wins = np.zeros(1, dtype=np.int64)
+        capacity = 0 if games is None or window is None else max(games - window + 1, 0)
+        self.win_rates = np.zeros(capacity)
+        self.rolling_win_rate = self.win_rates[:0]
+        if record is not None:
+            self.add(record)
+
+    @property
+    def showdown_games(self):
+        return int(self.outcomes[SHOWDOWNS])
+
+    @property
+    def showdown_wins(self):
+        return int(self.outcomes[SHOWDOWN_WINS])
+
+    @property
+    def fold_games(self):
+        return int(self.outcomes[FOLDS])
+
+    @property
+    def fold_wins(self):
+        return int(self.outcomes[FOLD_WINS])
+
+    def add(self, record):
+        self.add_games(*record.arrays())
+
+    def add_games(self, p1_opener, opener_card, dealer_card, actions, p1_payoff):
+        # Counted one game at a time with numba, the numpy fallback below gives the same totals and curve
+        self.reserve(len(p1_payoff))
+        if NUMBA_AVAILABLE:
+            count_games(p1_opener, opener_card, dealer_card, actions, p1_payoff, self.games, self.deck_size,
+                        *self.counters())
+            self.counted(len(p1_payoff))
+            return
+
+        self.action_counts += action_counts(p1_opener, opener_card, dealer_card, actions, self.deck_size)
+
+        flat = self.deal_index(p1_opener, opener_card, dealer_card)
+        size = 2 * self.deck_size * self.deck_size
+        self.deal_games += np.bincount(flat, minlength=size).reshape(2, -1)
+        self.deal_payoff += np.bincount(flat, weights=p1_payoff, minlength=size).astype(np.int64).reshape(2, -1)
+        self.outcomes += outcome_counts(actions, p1_payoff)
+
+        if self.window is not None:
+            # Win rate of player 1 over the last window games from a running sum, continued from the last
+            # window - 1 games counted before
+            kept = np.arange(max(self.games - self.window + 1, 0), self.games)
+            wins = np.concatenate([self.recent_wins[kept % self.window], p1_payoff > 0])
+            if len(wins) >= self.window:
+                total = np.concatenate([[0], np.cumsum(wins, dtype=np.int64)])
+                start = len(self.rolling_win_rate)
+                self.win_rates[start:start + len(wins) - self.window + 1] = \
+                    (total[self.window:] - total[:-self.window]) / self.window
+            games = np.arange(self.games, self.games + len(p1_payoff))[-self.window:]
+            self.recent_wins[games % self.window] = wins[len(wins) - len(games):]
+            self.window_wins[0] = self.recent_wins.sum()
+        self.counted(len(p1_payoff))
+
+    def counters(self):
+        # The arrays count_game adds a game to, after the action counts
+        return (self.action_counts, self.deal_games, self.deal_payoff, self.outcomes, self.recent_wins,
+                self.window_wins, self.win_rates)
+
+    def reserve(self, games):
+        # Makes room in win_rates for the curve of games more games, without a known game count it grows by doubling
+        if self.window is None:
+            return
+        end = max(self.games + games - self.window + 1, 0)
+        if end > len(self.win_rates):
+            grown = np.zeros(max(end, 2 * len(self.win_rates)))
+            grown[:len(self.rolling_win_rate)] = self.rolling_win_rate
+            self.win_rates = grown
+
+    def counted(self, games):
+        # Called after games more games were written into the counters
+        self.games += games
+        if self.window is not None:
+            self.rolling_win_rate = self.win_rates[:max(self.games - self.window + 1, 0)]
+
+    def deal_index(self, p1_opener, opener_card, dealer_card):
+        # Index into the flattened (p1 seat, deal) totals
+        seat = np.where(p1_opener, 0, 1)
+        deal = (opener_card.astype(np.int64) - 1) * self.deck_size + dealer_card - 1
+        return seat * self.deck_size * self.deck_size + deal
+
+    def patch(self, games, old, new):
+        # Swaps the games at run indexes games (sorted) from old to new, two records of the same deals and seats.
+        # Counts change by the difference of the two, the rolling win rate only around the changed games
+        old_arrays, new_arrays = old.arrays(), new.arrays()
+        self.action_counts += (action_counts(*new_arrays[:4], self.deck_size) -
+                               action_counts(*old_arrays[:4], self.deck_size))
+
+        flat = self.deal_index(*new_arrays[:3])
+        size = 2 * self.deck_size * self.deck_size
+        change = new_arrays[4].astype(np.int64) - old_arrays[4]
+        self.deal_payoff += np.bincount(flat, weights=change, minlength=size).astype(np.int64).reshape(2, -1)
+
+        self.outcomes += (outcome_counts(new_arrays[3], new_arrays[4]) -
+                          outcome_counts(old_arrays[3], old_arrays[4]))
+
+        if self.window is None:
+            return
+        wins = (new_arrays[4] > 0).astype(np.int64) - (old_arrays[4] > 0)
+        # Rate k covers games k .. k + window - 1, so a game changes the rates from game - window + 1 to game
+        steps = np.zeros(len(self.rolling_win_rate) + 1, dtype=np.int64)
+        np.add.at(steps, np.clip(games - self.window + 1, 0, len(steps) - 1), wins)
+        np.add.at(steps, np.clip(games + 1, 0, len(steps) - 1), -wins)
+        self.rolling_win_rate += np.cumsum(steps[:-1]) / self.window
+
+        kept = games >= self.games - self.window
+        self.recent_wins[games[kept] % self.window] = new_arrays[4][kept] > 0
+        self.window_wins[0] += wins[kept].sum()
+
+    def action_frequencies(self):
+        totals = self.action_counts.sum(axis=-1, keepdims=True)
+        return np.divide(self.action_counts, totals, out=np.zeros(self.action_counts.shape), where=totals > 0)
+
+    def deal_ev(self):
+        # Player 1's average payoff per deal, shaped (p1 seat, opener card, dealer card)
+        ev = np.divide(self.deal_payoff, self.deal_games, out=np.full(self.deal_payoff.shape, np.nan),
+                       where=self.deal_games > 0)
+        return ev.reshape(2, self.deck_size, self.deck_size)
+
+    def showdown_win_rate(self):
+        return self.showdown_wins / self.showdown_games if self.showdown_games else 0.0
+
+    def fold_win_rate(self):
+        return self.fold_wins / self.fold_games if self.fold_games else 0.0
+
+    def summary(self, names=("Player 1", "Player 2")):
+        lines = [f"Games: {self.games}",
+                 f"Showdowns: {self.showdown_games}, {names[0]} won {self.showdown_win_rate():.1%}",
+                 f"Folds: {self.fold_games}, {names[0]} won {self.fold_win_rate():.1%}",
+                 ""]
+
+        frequencies = self.action_frequencies()
+        for player, name in enumerate(names):
+            lines.append(f"{name} action frequencies (f / c / b)")
+            for node, (move, opponent) in enumerate(NODES):
+                counts = self.action_counts[player, node]
+                if not counts.any():
+                    continue
+                lines.append(f"\t{move}{' ' + opponent if opponent else ''}")
+                for card in range(self.deck_size):
+                    if counts[card].any():
+                        values = " / ".join(f"{value:.2f}" for value in frequencies[player, node, card])
+                        lines.append(f"\t\t[{card + 1}] {values} ({counts[card].sum()})")
+            lines.append("")
+
+        ev = self.deal_ev()
+        for seat, seat_name in enumerate(("opener", "dealer")):
+            lines.append(f"{names[0]} EV per deal as {seat_name} (opener card - dealer card)")
+            for opener_card in range(self.deck_size):
+                for dealer_card in range(self.deck_size):
+                    if not np.isnan(ev[seat, opener_card, dealer_card]):
+                        lines.append(f"\t[{opener_card + 1}] - [{dealer_card + 1}]: "
+                                     f"{ev[seat, opener_card, dealer_card]:+.3f}")
+        return "\n".join(lines)
+
+    def export(self, path):
+        np.savez_compressed(path, action_counts=self.action_counts, action_frequencies=self.action_frequencies(),
+                            deal_games=self.deal_games.reshape(2, self.deck_size, self.deck_size),
+                            deal_ev=self.deal_ev(),
+                            showdown=np.array([self.showdown_games, self.showdown_wins]),
+                            fold=np.array([self.fold_games, self.fold_wins]),
+                            rolling_win_rate=self.rolling_win_rate, window=self.window or 0)
+
+
+class PairedSummary:
+    # Duplicate deal runs play games 2k and 2k + 1 on the same cards and draws with the seats swapped, player 1's
+    # total over a pair is their result minus player 2's result on identical deals, so card luck cancels
+    def __init__(self, z=1.96):
+        self.z = z
+        self.games = 0
+        self.payoff_sum = 0.0
+        self.payoff_squares = 0.0
+        self.pairs = 0
+        self.pair_sum = 0.0
+        self.pair_squares = 0.0
+        # First game of a pair that was split between two records
+        self.pending = None
+
+    def add(self, p1_payoff):
+        payoff = p1_payoff.astype(float)
+        self.games += len(payoff)
+        self.payoff_sum += payoff.sum()
+        self.payoff_squares += (payoff ** 2).sum()
+
+        if self.pending is not None:
+            payoff = np.concatenate([[self.pending], payoff])
+        paired = len(payoff) // 2 * 2
+        self.pending = payoff[paired] if paired < len(payoff) else None
+        pair = payoff[:paired:2] + payoff[1:paired:2]
+        self.pairs += len(pair)
+        self.pair_sum += pair.sum()
+        self.pair_squares += (pair ** 2).sum()
+
+    def merge(self, other):
+        # Adds the summary of the games that follow this summary's games. A pair can't be split between the two
+        self.games += other.games
+        self.payoff_sum += other.payoff_sum
+        self.payoff_squares += other.payoff_squares
+        self.pairs += other.pairs
+        self.pair_sum += other.pair_sum
+        self.pair_squares += other.pair_squares
+        self.pending = other.pending
+
+    def mean(self):
+        # Paired difference per game
+        return self.pair_sum / (2 * self.pairs) if self.pairs else 0.0
+
+    def pair_variance(self):
+        return max(self.pair_squares / self.pairs - (self.pair_sum / self.pairs) ** 2, 0.0) if self.pairs else 0.0
+
+    def game_variance(self):
+        return max(self.payoff_squares / self.games - (self.payoff_sum / self.games) ** 2, 0.0) if self.games else 0.0
+
+    def interval(self):
+        return self.z * math.sqrt(self.pair_variance() / self.pairs) / 2 if self.pairs else math.inf
+
+    def unpaired_interval(self):
+        return self.z * math.sqrt(self.game_variance() / self.games) if self.games else math.inf
+
+    def variance_reduction(self):
+        # How many times more games unpaired play would need for the same interval, a pair counts as two games
+        paired = self.pair_variance() / 2
+        return self.game_variance() / paired if paired > 0 else math.inf
+
+    def __str__(self):
+        reduction = self.variance_reduction()
+        reduction = "played identically" if math.isinf(reduction) else \
+            f"{reduction:.1f}x fewer games than unpaired play"
+        return (f"Duplicate deals: player 1 {self.mean():+.4f} ± {self.interval():.4f} per game over {self.pairs} "
+                f"pairs ({reduction}, unpaired interval ± {self.unpaired_interval():.4f})")
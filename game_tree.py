@@ -0,0 +1,104 @@
+import numpy as np
+
+from strategy_table import ACTIONS, ACTION_CODES, LEGAL_ACTIONS, OPENER_FIRST, DEALER_ON_CHECK, DEALER_ON_BET, \
+    OPENER_ON_BET
+
+
+OPENER, DEALER = 0, 1
+
+# The betting rules: every decision point by its action path from the start of the game, with the strategy
+# node it is played from, the seat to act and the Playable method asking for the choice. Every other path
+# one action past a decision ends the game, in a fold when that action was "f" and in a showdown otherwise.
+# The state tables still have a next state for every action code, the actions a node allows are LEGAL_ACTIONS
+DECISIONS = {
+    (): (OPENER_FIRST, OPENER, "play_opener"),
+    ("c",): (DEALER_ON_CHECK, DEALER, "play_dealer"),
+    ("b",): (DEALER_ON_BET, DEALER, "play_dealer"),
+    ("c", "b"): (OPENER_ON_BET, OPENER, "play_opener_choice_on_dealer_bet"),
+}
+
+
+def path_seats(path):
+    return [DECISIONS[path[:depth]][1] for depth in range(len(path))]
+
+
+def compile_states():
+    # States are numbered decisions first, then terminals in the order they are reached
+    paths = list(DECISIONS)
+    for path in DECISIONS:
+        for action in ACTIONS:
+            if path + (action,) not in DECISIONS:
+                paths.append(path + (action,))
+    return paths
+
+
+STATE_PATHS = compile_states()
+STATE_INDEX = {path: state for state, path in enumerate(STATE_PATHS)}
+ROOT = STATE_INDEX[()]
+MAX_DEPTH = max(len(path) for path in STATE_PATHS)
+
+# Per state tables, -1 where the entry does not apply (terminal states have no node, seat or next state)
+STATE_NODE = np.full(len(STATE_PATHS), -1, dtype=np.int64)
+STATE_SEAT = np.full(len(STATE_PATHS), -1, dtype=np.int64)
+NEXT_STATE = np.full((len(STATE_PATHS), len(ACTIONS)), -1, dtype=np.int64)
+# Seat that folded, -1 on a showdown or a decision, and the units each seat has put in (ante included)
+FOLDER = np.full(len(STATE_PATHS), -1, dtype=np.int64)
+PAID = np.ones((len(STATE_PATHS), 2), dtype=np.int64)
+# Action codes of the path to every state, -1 past its end
+STATE_ACTIONS = np.full((len(STATE_PATHS), MAX_DEPTH), -1, dtype=np.int8)
+PLAY_METHODS = [None] * len(STATE_PATHS)
+
+for state, path in enumerate(STATE_PATHS):
+    seats = path_seats(path)
+    STATE_ACTIONS[state, :len(path)] = [ACTION_CODES[action] for action in path]
+    for seat, action in zip(seats, path):
+        PAID[state, seat] += action == "b"
+
+    if path in DECISIONS:
+        STATE_NODE[state], STATE_SEAT[state], PLAY_METHODS[state] = DECISIONS[path]
+        for action in ACTIONS:
+            NEXT_STATE[state, ACTION_CODES[action]] = STATE_INDEX[path + (action,)]
+    elif path[-1] == "f":
+        FOLDER[state] = seats[-1]
+
+IS_TERMINAL = STATE_NODE < 0
+
+
+def opener_payoff(state, opener_card, dealer_card):
+    # Opener's payoff in betting units at a terminal state, works on scalars and arrays alike
+    opener_wins = (FOLDER[state] == DEALER) | ((FOLDER[state] < 0) & (opener_card > dealer_card))
+    return np.where(opener_wins, PAID[state, DEALER], -PAID[state, OPENER])
+
+
+def final_states(actions):
+    # Terminal state of every game from its (game, stage) action codes, -1 marking stages not reached
+    state = np.full(actions.shape[:-1], ROOT, dtype=np.int64)
+    for stage in range(actions.shape[-1]):
+        played = actions[..., stage] >= 0
+        state = np.where(played, NEXT_STATE[state, np.maximum(actions[..., stage], 0)], state)
+    return state
+
+
+def stage_states(actions):
+    # State every stage was played from, shaped like actions. Stages that weren't reached get the terminal state
+    states = np.empty(actions.shape, dtype=np.int64)
+    state = np.full(actions.shape[:-1], ROOT, dtype=np.int64)
+    for stage in range(actions.shape[-1]):
+        states[..., stage] = state
+        played = actions[..., stage] >= 0
+        state = np.where(played, NEXT_STATE[state, np.maximum(actions[..., stage], 0)], state)
+    return states
+
+
+def nested_tree(path=()):
+    # The same rules as nested tuples for the recursive analysis code:
+    # ("decision", strategy node, seat to act, {legal action: child})
+    # ("terminal", seat that folded or None on showdown, units paid by opener, units paid by dealer)
+    state = STATE_INDEX[path]
+    if IS_TERMINAL[state]:
+        folder = int(FOLDER[state])
+        return "terminal", None if folder < 0 else folder, int(PAID[state, OPENER]), int(PAID[state, DEALER])
+    node = int(STATE_NODE[state])
+    return ("decision", node, int(STATE_SEAT[state]),
+            {action: nested_tree(path + (action,)) for action in ACTIONS
+             if LEGAL_ACTIONS[node, ACTION_CODES[action]]})
@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from game_tree import OPENER, DEALER, PAID, final_states, opener_payoff
+
+
+CHUNK_PREFIX = "chunk_"
+FINISHED_FILE = "finished.json"
+
+
+def chunk_path(directory, index):
+    return os.path.join(directory, f"{CHUNK_PREFIX}{index:06d}.npz")
+
+
+def hand_columns(first_index, record, betting_amounts):
+    # Columns of one GameRecord chunk. The pool assumes every bet was covered, which only fails in fixed
+    # balance mode when a player can't pay their last bet
+    p1_opener, opener_card, dealer_card, actions, p1_payoff = record.arrays()
+    state = final_states(actions)
+    opener_amount = np.where(p1_opener, betting_amounts[0], betting_amounts[1])
+    dealer_amount = np.where(p1_opener, betting_amounts[1], betting_amounts[0])
+    pool = opener_amount * PAID[state, OPENER] + dealer_amount * PAID[state, DEALER]
+
+    # Player 1 or 2
+    opener_wins = opener_payoff(state, opener_card, dealer_card) > 0
+    winner = np.where(opener_wins == p1_opener, 1, 2)
+
+    return {
+        "game_index": np.arange(first_index, first_index + record.length, dtype=np.int64),
+        "p1_opener": p1_opener.copy(),
+        "opener_card": opener_card.copy(),
+        "dealer_card": dealer_card.copy(),
+        "actions": actions.copy(),
+        "pool": pool.astype(np.int32),
+        "winner": winner.astype(np.uint8),
+        "p1_payoff": p1_payoff.copy(),
+    }
+
+
+class HandHistoryWriter:
+    # Writes every flushed GameRecord as its own compressed .npz chunk, so memory stays at one chunk.
+    # Chunks are written to a temporary name and renamed, a reader never sees a half written file
+    def __init__(self, directory, betting_amounts, deck_size=3):
+        self.directory = directory
+        self.betting_amounts = betting_amounts
+        self.deck_size = deck_size
+        self.games = 0
+        self.chunks = 0
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith(CHUNK_PREFIX) or name == FINISHED_FILE:
+                os.remove(os.path.join(directory, name))
+
+    def write(self, record):
+        if record.length == 0:
+            return
+        path = chunk_path(self.directory, self.chunks)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as file:
+            np.savez_compressed(file, **hand_columns(self.games, record, self.betting_amounts))
+        os.replace(temporary, path)
+
+        self.games += record.length
+        self.chunks += 1
+
+    def close(self):
+        temporary = os.path.join(self.directory, FINISHED_FILE + ".tmp")
+        with open(temporary, "w") as file:
+            json.dump({"games": self.games, "chunks": self.chunks, "deck_size": self.deck_size}, file)
+        os.replace(temporary, os.path.join(self.directory, FINISHED_FILE))
+
+
+def read_chunk(path):
+    with np.load(path) as chunk:
+        return {name: chunk[name] for name in chunk.files}
+
+
+def follow_hand_history(directory, poll_interval=0.5, timeout=None):
+    # Yields the chunks in order as they appear, also while the run is still writing them.
+    # Stops once the run has finished and every chunk was read, or after timeout seconds without a new chunk
+    index = 0
+    waited = 0.0
+    while True:
+        path = chunk_path(directory, index)
+        if os.path.exists(path):
+            yield read_chunk(path)
+            index += 1
+            waited = 0.0
+            continue
+
+        finished = os.path.join(directory, FINISHED_FILE)
+        if os.path.exists(finished):
+            with open(finished) as file:
+                if index >= json.load(file)["chunks"]:
+                    return
+
+        if timeout is not None and waited >= timeout:
+            return
+        time.sleep(poll_interval)
+        waited += poll_interval
+
+
+def read_hand_history(directory):
+    # Everything written so far as one set of columns
+    chunks = []
+    index = 0
+    while os.path.exists(chunk_path(directory, index)):
+        chunks.append(read_chunk(chunk_path(directory, index)))
+        index += 1
+    if not chunks:
+        return {}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Follow a hand history export and print a running summary")
+    parser.add_argument("directory")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    args = parser.parse_args()
+
+    games = 0
+    p1_wins = 0
+    p1_payoff = 0
+    for chunk in follow_hand_history(args.directory, args.poll_interval):
+        games += len(chunk["game_index"])
+        p1_wins += int((chunk["winner"] == 1).sum())
+        p1_payoff += int(chunk["p1_payoff"].sum())
+        print(f"{games} games, player 1 won {p1_wins / games:.2%}, mean payoff {p1_payoff / games:+.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import numpy as np
+
+from batch_engine import cumulative, store_balances
+from game_statistics import NUMBA_AVAILABLE, SHOWDOWNS, FOLDS, GameRecord, GameStatistics, njit
+from rng import philox4x32, seed_key, MASK, SHIFT, UNIFORM_SCALE
+from game_tree import OPENER, DEALER, ROOT, STATE_NODE, STATE_SEAT, NEXT_STATE, FOLDER
+from strategy_table import ACTION_CODES
+
+
+FOLD, CHECK, BET = ACTION_CODES["f"], ACTION_CODES["c"], ACTION_CODES["b"]
+
+
+philox_kernel = njit(cache=True)(philox4x32)
+
+
+@njit(cache=True)
+def sample_action(cum, player, node, card, u):
+    if u < cum[player, node, card - 1, 0]:
+        return FOLD
+    if u < cum[player, node, card - 1, 1]:
+        return CHECK
+    return BET
+
+
+@njit(cache=True)
+def place_bet(balances, player, betting_amounts, relative):
+    # Same rule as Playable.bet, a fixed balance that can't cover the bet pays nothing
+    amount = betting_amounts[player]
+    if relative[player] or balances[player] - amount >= 0:
+        balances[player] -= amount
+        return amount
+    return 0
+
+
+@njit(cache=True)
+def play_games_kernel(cum, deck_size, start, end, same_opener_and_dealer, duplicate, betting_amounts, relative,
+                      balances, key0, key1, offset, histories, recording, record_p1_opener, record_opener_card,
+                      record_dealer_card, record_actions, record_payoff, counting, first, action_counts, deal_games,
+                      deal_payoff, outcomes, recent_wins, window_wins, win_rates):
+    # Plays games start .. end - 1 with the full state machine of Game.play_game, player 0 is Game.p1.
+    # Histories and records are written at game - offset. Returns the index of the first game not played.
+    # duplicate plays the draws of counter k in games 2k and 2k + 1, with the opener holding the first card.
+    # counting adds every game to the GameStatistics counters as it is played, first games were counted before start
+    deals = deck_size * (deck_size - 1)
+    zero = np.uint64(0)
+    window = len(recent_wins)
+    slot = first % window if window else 0
+    for game in range(start, end):
+        counter = np.uint64(game // 2 if duplicate else game)
+        words = philox_kernel(counter & MASK, counter >> SHIFT, zero, zero, key0, key1)
+
+        for player in range(2):
+            if not relative[player] and balances[player] - betting_amounts[player] < 0:
+                return game
+
+        opener = 0 if same_opener_and_dealer or game % 2 == 0 else 1
+        dealer = 1 - opener
+        p1_start = balances[0]
+        row = game - offset
+
+        pool = place_bet(balances, 0, betting_amounts, relative) + place_bet(balances, 1, betting_amounts, relative)
+
+        deal = min(int(words[0] * UNIFORM_SCALE * deals), deals - 1)
+        first_card = deal // (deck_size - 1) + 1
+        second_card = deal % (deck_size - 1) + 1
+        if second_card >= first_card:
+            second_card += 1
+        opener_card = first_card if opener == 0 or duplicate else second_card
+        dealer_card = second_card if opener == 0 or duplicate else first_card
+
+        # Steps through the game_tree state table, the stage is also the index of the game's uniform word
+        state = ROOT
+        stage = 0
+        while STATE_NODE[state] >= 0:
+            if STATE_SEAT[state] == OPENER:
+                player, card = opener, opener_card
+            else:
+                player, card = dealer, dealer_card
+            action = sample_action(cum, player, STATE_NODE[state], card, words[stage + 1] * UNIFORM_SCALE)
+            if action == BET:
+                pool += place_bet(balances, player, betting_amounts, relative)
+            if recording:
+                record_actions[row, stage] = action
+            if counting:
+                action_counts[player, STATE_NODE[state], card - 1, action] += 1
+            state = NEXT_STATE[state, action]
+            stage += 1
+
+        if FOLDER[state] == OPENER:
+            winner = dealer
+        elif FOLDER[state] == DEALER or opener_card > dealer_card:
+            winner = opener
+        else:
+            winner = dealer
+
+        balances[winner] += pool
+        histories[0, row] = balances[0]
+        histories[1, row] = balances[1]
+
+        if recording:
+            record_p1_opener[row] = opener == 0
+            record_opener_card[row] = opener_card
+            record_dealer_card[row] = dealer_card
+            record_payoff[row] = balances[0] - p1_start
+        if counting:
+            # Same counts as game_statistics.count_games, written out here since a call per game costs more
+            # than the counting
+            p1_payoff = balances[0] - p1_start
+            seat = 0 if opener == 0 else 1
+            deal = (opener_card - 1) * deck_size + dealer_card - 1
+            deal_games[seat, deal] += 1
+            deal_payoff[seat, deal] += p1_payoff
+            won = 1 if p1_payoff > 0 else 0
+            outcome = FOLDS if FOLDER[state] >= 0 else SHOWDOWNS
+            outcomes[outcome] += 1
+            outcomes[outcome + 1] += won
+            if window:
+                window_wins[0] += won - recent_wins[slot]
+                recent_wins[slot] = won
+                slot = slot + 1 if slot + 1 < window else 0
+                counted = first + game - start
+                if counted >= window - 1:
+                    win_rates[counted - window + 1] = window_wins[0] / window
+    return end
+
+
+def can_play(game):
+    tables = [p.get_strategy_table(len(game.cards)) for p in game.players]
+    return (NUMBA_AVAILABLE and all(table is not None for table in tables)
+            and not game.display_text and not game.create_log and not any(p.observes_games for p in game.players))
+
+
+def play_games_jit(game, telemetry, chunk_size=1 << 18):
+    deck_size = len(game.cards)
+    cum = cumulative(np.stack([p.get_strategy_table(deck_size).probabilities[:, :deck_size]
+                               for p in game.players]))
+    betting_amounts = np.array([p.betting_amount for p in game.players], dtype=np.int64)
+    relative = np.array([p.use_relative_balance for p in game.players])
+    balances = np.array([p.get_balance() for p in game.players], dtype=np.int64)
+
+    # Streamed and exported runs reuse one record chunk, full histories are then copied out of each chunk
+    chunked = game.record_chunked
+    streaming = game.summary is not None
+    if chunked:
+        chunk_size = game.record.size
+    histories = np.zeros((2, chunk_size if chunked else game.games), dtype=np.int64)
+    full_histories = np.zeros((2, game.games), dtype=np.int64) if chunked and not streaming else histories
+
+    record = game.record
+    recording = record is not None
+    if not recording:
+        record = GameRecord(0)
+    # Statistics of a full run are counted in the kernel, chunked runs count each chunk when it is flushed
+    statistics = game.statistics
+    counting = statistics is not None and not chunked
+    if not counting:
+        statistics = GameStatistics(None, deck_size, window=None)
+
+    key0, key1 = seed_key(game.run_seed)
+
+    games_played = 0
+    while games_played < game.games and not game.break_loop:
+        end = min(games_played + chunk_size, game.games)
+        offset = games_played if chunked else 0
+        statistics.reserve(end - games_played)
+        played = play_games_kernel(cum, deck_size, games_played, end, game.fixed_seats, game.duplicate_deals,
+                                   betting_amounts, relative, balances, key0, key1, offset, histories, recording,
+                                   record.p1_opener, record.opener_card, record.dealer_card, record.actions,
+                                   record.p1_payoff, counting, statistics.games, *statistics.counters())
+        statistics.counted(played - games_played)
+        if chunked:
+            if not streaming:
+                full_histories[:, games_played:played] = histories[:, :played - games_played]
+            record.length = played - games_played
+            game.flush_record()
+        games_played = played
+        store_balances(game, balances, None if streaming else full_histories, games_played)
+        if played < end:
+            break
+        telemetry.check(games_played)
+
+    if recording and not chunked:
+        record.length = games_played
+    return games_played
+
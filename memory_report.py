@@ -0,0 +1,142 @@
+import sys
+import tracemalloc
+from os.path import basename
+
+import numpy as np
+
+from game_statistics import STAGES
+
+
+# Bytes per game of one GameRecord row: seat flag, two cards, an action code per stage and the payoff
+RECORD_BYTES_PER_GAME = 1 + 1 + 1 + STAGES + 4
+# A python list slot plus the int object it points to, balances leave the small int cache almost at once
+LIST_BYTES_PER_INT = 8 + 28
+# Allocations grouped by the package or project file they were made in
+TRACED_PACKAGES = ["matplotlib", "tkinter", "numpy", "numba", "logging", "colorama"]
+
+
+def format_bytes(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+
+def array_bytes(*objects):
+    # An array that is a view of another one of the same object, like the filled part of a preallocated array,
+    # isn't counted twice
+    total = 0
+    for obj in objects:
+        if obj is not None:
+            arrays = [value for value in vars(obj).values() if isinstance(value, np.ndarray)]
+            total += sum(array.nbytes for array in arrays if not any(array.base is other for other in arrays))
+    return total
+
+
+def history_bytes(history):
+    if isinstance(history, np.ndarray):
+        return history.nbytes
+    return sys.getsizeof(history) + (LIST_BYTES_PER_INT - 8) * len(history)
+
+
+def predict_memory(game, engine=None):
+    # Expected size of everything that grows with the run, by component, before the run starts
+    if engine is None:
+        from engines import select_engine
+        engine = select_engine(game)[0]
+
+    streaming = game.history_mode == "stream"
+    chunked = streaming or bool(game.hand_history_path)
+    predicted = dict()
+
+    if streaming:
+        # Decimated curve, the other player's curve is derived when drawn
+        predicted["balance histories"] = 2 * 2048 * 8
+    elif engine == "python":
+        predicted["balance histories"] = 2 * game.games * LIST_BYTES_PER_INT
+    else:
+        # Array engines keep int64 histories, a chunked run also keeps one chunk of them
+        predicted["balance histories"] = 2 * game.games * 8 * (2 if chunked and engine == "jit" else 1)
+
+    recorded = game.keep_record or game.duplicate_deals
+    record_games = game.stream_chunk_size if chunked else (game.games if recorded else 0)
+    predicted["game record"] = record_games * RECORD_BYTES_PER_GAME
+    if game.record_statistics and not streaming:
+        # The rolling win rate is the only statistic that grows with the game count
+        predicted["statistics"] = game.games * 8
+    if streaming:
+        predicted["streaming summary"] = 1000 * (8 + 1 + 1 + 1 + STAGES + 4) + 2048 * 8
+    return predicted
+
+
+class MemoryReport:
+    # Opt in tracemalloc instrumentation of one play_games call. Tracing slows the interpreted engine down
+    # noticeably, array engines are barely affected
+    def __init__(self):
+        self.predicted = dict()
+        self.engine = None
+        self.baseline = 0
+        self.peak = 0
+        self.steady = 0
+        self.components = dict()
+        self.traced = dict()
+        self.was_tracing = False
+
+    def start(self):
+        # Python 3.8 has no tracemalloc.reset_peak, the peak only starts over with a fresh start. Tracing that
+        # was already on is restarted too and stays on afterwards, without what it traced before the run
+        self.was_tracing = tracemalloc.is_tracing()
+        if self.was_tracing:
+            tracemalloc.stop()
+        tracemalloc.start()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+
+    def finish(self, game, root=None):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = peak - self.baseline
+        self.steady = current - self.baseline
+        self.engine = game.engine
+
+        groups = dict()
+        for stat in tracemalloc.take_snapshot().statistics("filename"):
+            filename = stat.traceback[0].filename
+            group = next((package for package in TRACED_PACKAGES if package in filename), basename(filename))
+            groups[group] = groups.get(group, 0) + stat.size
+        self.traced = dict(sorted(groups.items(), key=lambda item: -item[1])[:10])
+
+        self.components = {
+            "balance histories": sum(history_bytes(p.balance_history) for p in game.players),
+            "game record": array_bytes(game.record),
+            "statistics": array_bytes(game.statistics) if game.summary is None else 0,
+            "streaming summary": 0 if game.summary is None else
+            array_bytes(game.summary.reservoir, game.summary.curve, game.summary.statistics),
+        }
+        if game.create_log:
+            # Records and stream buffers still held by the logging module when the run ends
+            self.components["log buffers"] = groups.get("logging", 0)
+        if root is not None:
+            self.components["tk widgets"] = count_widgets(root)
+
+        if not self.was_tracing:
+            tracemalloc.stop()
+        return self
+
+    def __str__(self):
+        lines = [f"Memory ({self.engine} engine): peak {format_bytes(self.peak)}, "
+                 f"steady {format_bytes(self.steady)} above the start of the run"]
+        for name, size in self.components.items():
+            if name == "tk widgets":
+                lines.append(f"\t{name}: {size}")
+                continue
+            predicted = self.predicted.get(name)
+            expected = f" (predicted {format_bytes(predicted)})" if predicted is not None else ""
+            lines.append(f"\t{name}: {format_bytes(size)}{expected}")
+        lines.append("Live allocations by source: " + ", ".join(f"{name} {format_bytes(size)}"
+                                                              for name, size in self.traced.items()))
+        return "\n".join(lines)
+
+
+def count_widgets(widget):
+    # Walks the children dicts tkinter keeps on the python side, the report is made on the GUI's worker thread
+    # and winfo_children would call into Tcl from it
+    return sum(1 + count_widgets(child) for child in widget.children.values())
@@ -1,3 +1,4 @@
+import bisect
 import random
 
 import numpy as np
@@ -5,13 +6,19 @@ import numpy as np
 from betting import OpenerBetting, DealerBetting
 from colorama import Fore, Back, Style
 
-from data_structures import SimpleAIData, BluffingAIData
+from analysis import best_response, load_strategy
+from data_structures import SimpleAIData, BluffingAIData, strategy_default_data
+from strategy_table import StrategyTable, ACTIONS, ACTION_CODES, LEGAL_ACTIONS, NODES, OPENER_FIRST, DEALER_ON_CHECK, \
+    DEALER_ON_BET, OPENER_ON_CHECK, OPENER_ON_BET
 
 
 class Playable:
     options_normal = ["b", "c", "f"]
     options_on_bet = ["b", "f"]
     default_color = Style.RESET_ALL
+    observes_games = False
+    # Players that implement the *_batch methods can be played many games at a time by batch_engine
+    batch_capable = False
 
     def __init__(self, name="No Name", initial_balance=10000, relative_balance=0, betting_amount=1,
                  use_relative_balance=True, text_color=Style.RESET_ALL):
@@ -28,6 +35,9 @@ class Playable:
         self.relative_balance = relative_balance
         self.use_relative_balance = use_relative_balance
 
+        # Uniform the game drew for the current decision, None when playing outside a Game
+        self.uniform = None
+
     def set_text_color(self, new_color):
         self.text_color = new_color
 
@@ -75,6 +85,40 @@ class Playable:
         else:
             self.balance_history.append(self.balance)
 
+    def supports_deck_size(self, deck_size):
+        return True
+
+    def observe_game(self, actions, opponent_card):
+        pass
+
+    def get_strategy_table(self, deck_size):
+        # Players whose choices only depend on a fixed table return it, so faster engines can play them
+        return None
+
+    def draw(self):
+        return random.random() if self.uniform is None else self.uniform
+
+    def choose_from(self, cum_probabilities):
+        # Inverse CDF with the same comparisons as batch_engine.sample_actions, so one uniform gives the same
+        # action in every engine
+        return ACTIONS[bisect.bisect_right(cum_probabilities, self.draw())]
+
+    def choose_batch(self, cumulative, nodes, cards, uniforms):
+        # Array version of choose_from, cumulative is shaped (node, card, action)
+        rows = cumulative[nodes, cards - 1]
+        return ((uniforms >= rows[..., 0]).astype(np.int8) + (uniforms >= rows[..., 1])).astype(np.int8)
+
+    def play_opener_batch(self, cards, opponent_actions, uniforms):
+        # Batch methods take arrays of card values, opponent action codes (-1 before any action) and the
+        # uniform of the decision, and return action codes
+        pass
+
+    def play_dealer_batch(self, cards, opponent_actions, uniforms):
+        pass
+
+    def play_opener_choice_on_dealer_bet_batch(self, cards, opponent_actions, uniforms):
+        pass
+
     def play(self):
         pass
 
@@ -131,83 +175,207 @@ class Player(Playable):
 
 
 class RandomAI(Playable):
+    # Every card plays the same row, so a one card table covers any deck
+    strategy = StrategyTable.uniform(1)
+    batch_capable = True
+
+    def get_strategy_table(self, deck_size):
+        return StrategyTable.uniform(deck_size)
+
+    def choose_action(self, node):
+        return self.choose_from(self.strategy.cum_probabilities[node][0])
+
     def play_opener(self, opponent_choice=None):
-        return random.choice(self.options_normal)
+        return self.choose_action(OPENER_FIRST)
 
     def play_dealer(self, opponent_choice):
         if opponent_choice == "c":
-            return random.choice(self.options_normal)
+            return self.choose_action(DEALER_ON_CHECK)
         elif opponent_choice == "b":
-            return random.choice(self.options_on_bet)
+            return self.choose_action(DEALER_ON_BET)
 
     def play_opener_choice_on_dealer_bet(self, opponent_choice):
         if opponent_choice == "c":
-            return random.choice(self.options_normal)
+            return self.choose_action(OPENER_ON_CHECK)
         elif opponent_choice == "b":
-            return random.choice(self.options_on_bet)
+            return self.choose_action(OPENER_ON_BET)
+
+    # Card 1 is the table's only row
+    def play_opener_batch(self, cards, opponent_actions, uniforms):
+        return self.choose_batch(self.strategy.cumulative, OPENER_FIRST, 1, uniforms)
+
+    def play_dealer_batch(self, cards, opponent_actions, uniforms):
+        nodes = np.where(opponent_actions == ACTION_CODES["c"], DEALER_ON_CHECK, DEALER_ON_BET)
+        return self.choose_batch(self.strategy.cumulative, nodes, 1, uniforms)
+
+    def play_opener_choice_on_dealer_bet_batch(self, cards, opponent_actions, uniforms):
+        nodes = np.where(opponent_actions == ACTION_CODES["c"], OPENER_ON_CHECK, OPENER_ON_BET)
+        return self.choose_batch(self.strategy.cumulative, nodes, 1, uniforms)
 
 
 class SimpleAI(Playable):
+    data_class = SimpleAIData
+    batch_capable = True
+
     def __init__(self, name="No Name", initial_balance=10000, relative_balance=0, betting_amount=1,
                  use_relative_balance=True, text_color=Style.RESET_ALL, data_path="simple_ai_data.txt"):
         super().__init__(name, initial_balance, relative_balance, betting_amount, use_relative_balance, text_color)
 
-        self.structured_data = SimpleAIData(data_path)
+        self.structured_data = self.data_class(data_path)
+        self.compile_strategy()
 
-    def opener_first_short(self, move, card):
-        return random.choices(list(self.structured_data.data[move][card].keys()),
-                              weights=self.structured_data.data[move][card].values(), k=1)[0]
+    def compile_strategy(self):
+        self.strategy = StrategyTable.from_data(self.structured_data.data)
 
-    def dealer_short(self, move, card, opponent_move):
-        return random.choices(list(self.structured_data.data[move][card][opponent_move].keys()),
-                              weights=self.structured_data.data[move][card][opponent_move].values(), k=1)[0]
+    def supports_deck_size(self, deck_size):
+        return deck_size <= self.strategy.deck_size
+
+    def get_strategy_table(self, deck_size):
+        return self.strategy
+
+    def reset(self):
+        super().reset()
+        self.compile_strategy()
+
+    def choose_action(self, node):
+        return self.choose_from(self.strategy.cum_probabilities[node][self.card.value - 1])
 
     def play_opener(self, opponent_choice=None):
-        if self.card.value == 1:
-            return self.opener_first_short("opener_first_move", "one")
-        elif self.card.value == 2:
-            return self.opener_first_short("opener_first_move", "two")
-        elif self.card.value == 3:
-            return self.opener_first_short("opener_first_move", "three")
+        return self.choose_action(OPENER_FIRST)
 
     def play_dealer(self, opponent_choice):
-        if self.card.value == 1:
-            if opponent_choice == "c":
-                return self.dealer_short("dealer_first_move", "one", "opponent_c")
-            elif opponent_choice == "b":
-                return self.dealer_short("dealer_first_move", "one", "opponent_b")
-        elif self.card.value == 2:
-            if opponent_choice == "c":
-                return self.dealer_short("dealer_first_move", "two", "opponent_c")
-            elif opponent_choice == "b":
-                return self.dealer_short("dealer_first_move", "two", "opponent_b")
-        elif self.card.value == 3:
-            if opponent_choice == "c":
-                return self.dealer_short("dealer_first_move", "three", "opponent_c")
-            elif opponent_choice == "b":
-                return self.dealer_short("dealer_first_move", "three", "opponent_b")
+        if opponent_choice == "c":
+            return self.choose_action(DEALER_ON_CHECK)
+        elif opponent_choice == "b":
+            return self.choose_action(DEALER_ON_BET)
 
     def play_opener_choice_on_dealer_bet(self, opponent_choice):
-        if self.card.value == 1:
-            if opponent_choice == "c":
-                return self.dealer_short("opener_second_move", "one", "opponent_c")
-            elif opponent_choice == "b":
-                return self.dealer_short("opener_second_move", "one", "opponent_b")
-        elif self.card.value == 2:
-            if opponent_choice == "c":
-                return self.dealer_short("opener_second_move", "two", "opponent_c")
-            elif opponent_choice == "b":
-                return self.dealer_short("opener_second_move", "two", "opponent_b")
-        elif self.card.value == 3:
-            if opponent_choice == "c":
-                return self.dealer_short("opener_second_move", "three", "opponent_c")
-            elif opponent_choice == "b":
-                return self.dealer_short("opener_second_move", "three", "opponent_b")
+        if opponent_choice == "c":
+            return self.choose_action(OPENER_ON_CHECK)
+        elif opponent_choice == "b":
+            return self.choose_action(OPENER_ON_BET)
+
+    def play_opener_batch(self, cards, opponent_actions, uniforms):
+        return self.choose_batch(self.strategy.cumulative, OPENER_FIRST, cards, uniforms)
+
+    def play_dealer_batch(self, cards, opponent_actions, uniforms):
+        nodes = np.where(opponent_actions == ACTION_CODES["c"], DEALER_ON_CHECK, DEALER_ON_BET)
+        return self.choose_batch(self.strategy.cumulative, nodes, cards, uniforms)
+
+    def play_opener_choice_on_dealer_bet_batch(self, cards, opponent_actions, uniforms):
+        nodes = np.where(opponent_actions == ACTION_CODES["c"], OPENER_ON_CHECK, OPENER_ON_BET)
+        return self.choose_batch(self.strategy.cumulative, nodes, cards, uniforms)
 
 
 class BluffingAI(SimpleAI):
+    data_class = BluffingAIData
+
     def __init__(self, name="No Name", initial_balance=10000, relative_balance=0, betting_amount=1,
                  use_relative_balance=True, text_color=Style.RESET_ALL, data_path="bluffing_ai_data.txt"):
+        super().__init__(name, initial_balance, relative_balance, betting_amount, use_relative_balance, text_color,
+                         data_path)
+
+
+class AdaptiveAI(Playable):
+    observes_games = True
+
+    def __init__(self, name="No Name", initial_balance=10000, relative_balance=0, betting_amount=1,
+                 use_relative_balance=True, text_color=Style.RESET_ALL, deck_size=3, update_every=1000,
+                 learning_rate=0.5, prior=1.0):
         super().__init__(name, initial_balance, relative_balance, betting_amount, use_relative_balance, text_color)
+        self.deck_size = deck_size
+        self.update_every = update_every
+        self.learning_rate = learning_rate
+        self.prior = prior
+        self.reset_model()
+
+    def reset_model(self):
+        # Flat (node, card, action) counters, plain ints keep the per game update to a few list increments.
+        # Showdown counts are keyed by the opponent's card, counts of folded games by this player's own card
+        size = len(NODES) * self.deck_size * len(ACTIONS)
+        self.showdown_counts = [0] * size
+        self.folded_counts = [0] * size
+        self.games_until_update = self.update_every
+        self.opponent_model = StrategyTable.uniform(self.deck_size).probabilities
+        self.strategy = StrategyTable(StrategyTable.from_data(strategy_default_data(self.deck_size)).probabilities)
+
+    def reset(self):
+        super().reset()
+        self.reset_model()
+
+    def supports_deck_size(self, deck_size):
+        return deck_size == self.deck_size
 
-        self.structured_data = BluffingAIData(data_path)
+    def set_deck_size(self, deck_size):
+        # The model is per card, a new deck size starts it over
+        if deck_size != self.deck_size:
+            self.deck_size = deck_size
+            self.reset_model()
+
+    def choose_action(self, node):
+        return self.choose_from(self.strategy.cum_probabilities[node][self.card.value - 1])
+
+    def play_opener(self, opponent_choice=None):
+        return self.choose_action(OPENER_FIRST)
+
+    def play_dealer(self, opponent_choice):
+        if opponent_choice == "c":
+            return self.choose_action(DEALER_ON_CHECK)
+        elif opponent_choice == "b":
+            return self.choose_action(DEALER_ON_BET)
+
+    def play_opener_choice_on_dealer_bet(self, opponent_choice):
+        if opponent_choice == "c":
+            return self.choose_action(OPENER_ON_CHECK)
+        elif opponent_choice == "b":
+            return self.choose_action(OPENER_ON_BET)
+
+    def observe_game(self, actions, opponent_card):
+        if opponent_card is None:
+            counts, card = self.folded_counts, self.card.value - 1
+        else:
+            counts, card = self.showdown_counts, opponent_card.value - 1
+
+        for player, node, action in actions:
+            if player is not self:
+                counts[(node * self.deck_size + card) * len(ACTIONS) + ACTION_CODES[action]] += 1
+
+        self.games_until_update -= 1
+        if self.games_until_update <= 0:
+            self.games_until_update = self.update_every
+            self.update_strategy()
+
+    def update_strategy(self):
+        self.opponent_model = self.estimate_opponent()
+        _, response = best_response(self.opponent_model)
+        probabilities = (1 - self.learning_rate) * self.strategy.probabilities + self.learning_rate * response
+        self.strategy = StrategyTable(probabilities)
+
+    def estimate_opponent(self):
+        shape = (len(NODES), self.deck_size, len(ACTIONS))
+        showdown = np.array(self.showdown_counts, dtype=float).reshape(shape)
+        folded = np.array(self.folded_counts, dtype=float).reshape(shape)
+
+        # In folded games the opponent's card stays hidden, so those actions are spread over the cards the
+        # opponent could have held, weighted by how likely the current model makes that action with each card
+        reach = np.ones((len(NODES), self.deck_size))
+        reach[OPENER_ON_BET] = self.opponent_model[OPENER_FIRST, :, ACTION_CODES["c"]]
+        likelihood = self.opponent_model * reach[:, :, None]
+        not_own_card = 1.0 - np.eye(self.deck_size)
+
+        # weights[node, own card, opponent card, action]
+        weights = likelihood[:, None, :, :] * not_own_card[None, :, :, None]
+        totals = weights.sum(axis=2, keepdims=True)
+        weights = np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+        allocated = (weights * folded[:, :, None, :]).sum(axis=1)
+
+        # The prior only goes to the actions the rules allow, so a bet is never modelled as checked
+        counts = (showdown + allocated + self.prior) * LEGAL_ACTIONS[:, None, :]
+        return counts / counts.sum(axis=-1, keepdims=True)
+
+
+def load_player(path, deck_size=3):
+    # Probabilities of a strategy file, or of the uniform strategy for "random"
+    if path == "random":
+        return StrategyTable.uniform(deck_size).probabilities
+    return load_strategy(path).probabilities
@@ -0,0 +1,176 @@
+import argparse
+import time
+
+import numpy as np
+
+from batch_engine import cumulative, play_batch
+from game_statistics import GameRecord, PairedSummary
+from game_tree import OPENER, STATE_NODE, STATE_SEAT, stage_states
+from playable import SimpleAI, BluffingAI
+from rng import uniforms_at
+from strategy_table import ACTIONS, NODES, StrategyTable
+
+
+class ResimulationResult:
+    def __init__(self, changed_rows, games, replayed, changed_games, elapsed):
+        self.changed_rows = changed_rows
+        self.games = games
+        self.replayed = replayed
+        self.changed_games = changed_games
+        self.elapsed = elapsed
+
+    def __str__(self):
+        share = self.replayed / self.games if self.games else 0.0
+        return (f"{self.changed_rows} strategy rows changed, re-simulated {self.replayed} of {self.games} games "
+                f"({share:.1%}) in {self.elapsed:.3f}s, {self.changed_games} of them played out differently")
+
+
+def can_resimulate(game):
+    # The whole record has to be in memory next to the tables it was played with, and balances have to be
+    # relative so a changed game can't stop or skip a later one
+    return (game.record is not None and not game.record_chunked and game.run_tables is not None
+            and all(table is not None for table in game.run_tables)
+            and all(p.use_relative_balance for p in game.players))
+
+
+def visited_rows(p1_opener, opener_card, dealer_card, actions, changed):
+    # True for the games that asked any changed (player, node, card) row for a decision
+    states = stage_states(actions)
+    opener_acts = STATE_SEAT[states] == OPENER
+    player = np.where(opener_acts == p1_opener[:, None], 0, 1)
+    cards = np.where(opener_acts, opener_card[:, None], dealer_card[:, None]).astype(np.int64)
+    return (changed[player, np.maximum(STATE_NODE[states], 0), cards - 1] & (actions >= 0)).any(axis=1)
+
+
+def path_codes(p1_opener, opener_card, dealer_card, actions, deck_size):
+    # One small integer per game for its seats, deal and action path, which decide every row the game asked
+    code = np.zeros(len(actions), dtype=np.int32)
+    for stage in reversed(range(actions.shape[1])):
+        code = code * (len(ACTIONS) + 1) + (actions[:, stage] + 1)
+    return ((code * 2 + p1_opener) * deck_size + opener_card - 1) * deck_size + dealer_card - 1
+
+
+def visiting_games(record, changed, deck_size):
+    # Indexes of the games that reached a changed row. Rather than stepping every game through the tree, every
+    # possible path code is checked once and the games are looked up by their code
+    stages = record.actions.shape[1]
+    codes = np.arange((len(ACTIONS) + 1) ** stages * 2 * deck_size * deck_size)
+    dealer_card = codes % deck_size + 1
+    opener_card = codes // deck_size % deck_size + 1
+    p1_opener = codes // (deck_size * deck_size) % 2 == 1
+    path = codes // (2 * deck_size * deck_size)
+    actions = np.stack([path // (len(ACTIONS) + 1) ** stage % (len(ACTIONS) + 1) - 1 for stage in range(stages)],
+                       axis=1)
+    visits = visited_rows(p1_opener, opener_card, dealer_card, actions, changed)
+    return np.flatnonzero(visits[path_codes(*record.arrays()[:4], deck_size)])
+
+
+def current_tables(game):
+    deck_size = len(game.cards)
+    for p in game.players:
+        # Picks up edits made to the strategy data since the run
+        if isinstance(p, SimpleAI):
+            p.compile_strategy()
+    return [p.get_strategy_table(deck_size).probabilities[:, :deck_size] for p in game.players]
+
+
+def resimulate(game, tables=None):
+    # Brings the last run of game up to date with new strategy tables, by default the players' current ones.
+    # Every game replays from its own counter based draws, so only the games that reached a changed row can
+    # play out differently; they are replayed and the record, statistics and balance histories patched
+    start = time.perf_counter()
+    if not can_resimulate(game):
+        raise ValueError("Only runs that kept their full record, with fixed strategy tables and relative balances, "
+                         "can be re-simulated")
+    tables = [np.asarray(table, dtype=float) for table in (tables or current_tables(game))]
+    changed = np.stack([(new != old).any(axis=-1) for new, old in zip(tables, game.run_tables)])
+
+    record = game.record
+    games = visiting_games(record, changed, len(game.cards)) if changed.any() else np.zeros(0, dtype=np.int64)
+    p1_opener, opener_card, dealer_card = (array[games] for array in record.arrays()[:3])
+    old = GameRecord(len(games))
+    old.add_batch(p1_opener, opener_card, dealer_card, record.actions[games], record.p1_payoff[games])
+
+    uniforms = uniforms_at(game.run_seed, games, game.duplicate_deals)
+    opener = np.where(p1_opener, 0, 1)
+    payoff, actions = play_batch(cumulative(np.stack(tables)), opener, 1 - opener, opener_card, dealer_card,
+                                 uniforms)
+    betting_amounts = [p.betting_amount for p in game.players]
+    p1_units = np.where(p1_opener, payoff, -payoff)
+    p1_payoff = p1_units * np.where(p1_units > 0, betting_amounts[1], betting_amounts[0])
+    new = GameRecord(len(games))
+    new.add_batch(p1_opener, opener_card, dealer_card, actions, p1_payoff)
+
+    record.actions[games] = actions
+    record.p1_payoff[games] = p1_payoff
+    if game.statistics is not None:
+        game.statistics.patch(games, old, new)
+    if game.paired is not None:
+        game.paired = PairedSummary()
+        game.paired.add(record.arrays()[-1])
+
+    # Every balance from the first changed game on moves by the running sum of the payoff changes
+    change = p1_payoff.astype(np.int64) - old.p1_payoff
+    if len(games):
+        first = games[0]
+        shift = np.zeros(record.length - first, dtype=np.int64)
+        np.add.at(shift, games - first, change)
+        shift = np.cumsum(shift)
+        for p, sign in zip(game.players, (1, -1)):
+            history = p.balance_history
+            if isinstance(history, np.ndarray):
+                history[first:] += sign * shift[:len(history) - first]
+            else:
+                p.balance_history = history[:first] + (np.asarray(history[first:]) +
+                                                       sign * shift[:len(history) - first]).tolist()
+            p.relative_balance += sign * int(change.sum())
+
+    game.run_tables = [table.copy() for table in tables]
+    changed_games = int((actions != old.actions).any(axis=1).sum()) if len(games) else 0
+    return ResimulationResult(int(changed.sum()), record.length, len(games), changed_games,
+                              time.perf_counter() - start)
+
+
+def main():
+    from game import Game
+
+    parser = argparse.ArgumentParser(description="Change one strategy row of a finished run and re-simulate only "
+                                                 "the games that reached it, next to a full rerun")
+    parser.add_argument("p1", help="strategy file of player 1")
+    parser.add_argument("p2", help="strategy file of player 2")
+    parser.add_argument("--games", type=int, default=10000000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--player", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--node", type=int, default=2, help=f"node index, one of {list(enumerate(NODES))}")
+    parser.add_argument("--card", type=int, default=2)
+    parser.add_argument("--row", type=float, nargs=len(ACTIONS), default=[0.2, 0.5, 0.3],
+                        help="new probabilities of " + " / ".join(ACTIONS) + ", summing to 1")
+    args = parser.parse_args()
+
+    game = Game(BluffingAI("Player 1", data_path=args.p1), BluffingAI("Player 2", data_path=args.p2), args.games,
+                record_statistics=True, seed=args.seed, keep_record=True)
+    start = time.perf_counter()
+    game.play_games()
+    print(f"Full run: {time.perf_counter() - start:.3f}s on the {game.engine} engine")
+
+    tables = [table.copy() for table in game.run_tables]
+    tables[args.player - 1][args.node, args.card - 1] = args.row
+    result = resimulate(game, tables)
+    print(result)
+
+    # The same run played from scratch with the edited table has to match the patched one
+    check = Game(BluffingAI("Player 1", data_path=args.p1), BluffingAI("Player 2", data_path=args.p2), args.games,
+                 record_statistics=True, seed=args.seed, keep_record=True)
+    check.players[args.player - 1].structured_data.data = StrategyTable(tables[args.player - 1]).to_data()
+    start = time.perf_counter()
+    check.play_games()
+    print(f"Full rerun: {time.perf_counter() - start:.3f}s")
+    same = (np.array_equal(check.record.actions, game.record.actions) and
+            np.array_equal(check.p1.balance_history, game.p1.balance_history) and
+            np.array_equal(check.statistics.action_counts, game.statistics.action_counts) and
+            np.allclose(check.statistics.rolling_win_rate, game.statistics.rolling_win_rate))
+    print(f"Patched run matches the rerun: {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import random
+
+import numpy as np
+
+
+# Philox4x32-10 (Salmon et al., Random123). One block of four 32 bit words per game: the deal and the three
+# decision stages, with the game index as the counter and the run seed as the key. Any game can be
+# regenerated on its own and any split of a run into shards draws exactly the same numbers
+MASK = np.uint64(0xFFFFFFFF)
+SHIFT = np.uint64(32)
+M0, M1 = np.uint64(0xD2511F53), np.uint64(0xCD9E8D57)
+W0, W1 = np.uint64(0x9E3779B9), np.uint64(0xBB67AE85)
+ROUNDS = 10
+UNIFORM_SCALE = 1.0 / 4294967296.0
+
+
+def philox4x32(c0, c1, c2, c3, k0, k1):
+    # Works on uint64 scalars and arrays holding 32 bit values, and compiles unchanged with numba
+    for _ in range(ROUNDS):
+        p0 = M0 * c0
+        p1 = M1 * c2
+        c0, c1, c2, c3 = (p1 >> SHIFT) ^ c1 ^ k0, p1 & MASK, (p0 >> SHIFT) ^ c3 ^ k1, p0 & MASK
+        k0 = (k0 + W0) & MASK
+        k1 = (k1 + W1) & MASK
+    return c0, c1, c2, c3
+
+
+def new_seed():
+    return random.getrandbits(64)
+
+
+def seed_key(seed):
+    return np.uint64(seed & 0xFFFFFFFF), np.uint64((seed >> 32) & 0xFFFFFFFF)
+
+
+def game_uniforms(seed, first_game, games, duplicate=False):
+    # Uniforms of games first_game .. first_game + games - 1, shaped (games, 4). With duplicate the two games of
+    # every pair 2k, 2k + 1 share the draws of counter k
+    return uniforms_at(seed, np.arange(first_game, first_game + games), duplicate)
+
+
+def uniforms_at(seed, games, duplicate=False):
+    # Uniforms of any set of game indexes, shaped (len(games), 4)
+    k0, k1 = seed_key(seed)
+    index = np.asarray(games).astype(np.uint64)
+    if duplicate:
+        index >>= np.uint64(1)
+    zeros = np.zeros(len(index), dtype=np.uint64)
+    words = philox4x32(index & MASK, index >> SHIFT, zeros, zeros, k0, k1)
+    return np.stack(words, axis=-1) * UNIFORM_SCALE
+
+
+def game_uniform(seed, game):
+    return game_uniforms(seed, game, 1)[0]
@@ -0,0 +1,176 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from queue import Empty
+
+import numpy as np
+
+from game import Game
+from playable import RandomAI, SimpleAI, BluffingAI
+
+
+# Players a queued job can be set up with, by the names the GUI uses
+PLAYER_TYPES = {
+    "Random AI": lambda name, path: RandomAI(name),
+    "Simple AI": lambda name, path: SimpleAI(name, data_path=path),
+    "Bluffing AI": lambda name, path: BluffingAI(name, data_path=path),
+}
+SEAT_MODES = ["alternate", "fixed", "duplicate"]
+
+# A job already runs in a pool process, so it plays on one core instead of starting its own pool
+JOB_ENGINE = "jit"
+
+
+class MatchupJob:
+    def __init__(self, p1_type, p1_path, p2_type, p2_path, games, seat_mode="alternate", deck_size=3, seed=None):
+        self.p1_type = p1_type
+        self.p1_path = p1_path
+        self.p2_type = p2_type
+        self.p2_path = p2_path
+        self.games = games
+        self.seat_mode = seat_mode
+        self.deck_size = deck_size
+        self.seed = seed
+
+    def players(self):
+        return (PLAYER_TYPES[self.p1_type](f"{self.p1_type} 1", self.p1_path),
+                PLAYER_TYPES[self.p2_type](f"{self.p2_type} 2", self.p2_path))
+
+    def player_name(self, player_type, path):
+        return player_type if player_type == "Random AI" else f"{player_type} ({os.path.basename(path)})"
+
+    def __str__(self):
+        return (f"{self.player_name(self.p1_type, self.p1_path)} vs {self.player_name(self.p2_type, self.p2_path)}, "
+                f"{self.games} games, {self.seat_mode} seats")
+
+
+class JobResult:
+    # Everything a results tab shows, small enough to send back from the worker whatever the game count
+    def __init__(self, names, statistics, curves, step, balances, engine, seed, elapsed, paired):
+        self.names = names
+        self.statistics = statistics
+        self.curves = curves
+        self.step = step
+        self.balances = balances
+        self.engine = engine
+        self.seed = seed
+        self.elapsed = elapsed
+        self.paired = paired
+
+    def summary(self):
+        lines = [f"Seed {self.seed}, {self.engine} engine, {self.elapsed:.2f}s",
+                 f"Balances: {self.names[0]} {self.balances[0]}, {self.names[1]} {self.balances[1]}"]
+        if self.paired is not None:
+            lines.append(str(self.paired))
+        return "\n".join(lines + ["", self.statistics.summary(self.names)])
+
+
+def run_job(job_id, job, progress):
+    # Jobs play in stream mode, so a worker's memory doesn't grow with the game count and only the streamed
+    # statistics and decimated curves go back
+    p1, p2 = job.players()
+    game = Game(p1, p2, job.games, same_opener_and_dealer=job.seat_mode == "fixed",
+                duplicate_deals=job.seat_mode == "duplicate", deck_size=job.deck_size, record_statistics=True,
+                history_mode="stream", seed=job.seed, engine=JOB_ENGINE)
+    start = time.perf_counter()
+    game.play_games(increase_progress_method=lambda percentage: progress.put((job_id, percentage)))
+    elapsed = time.perf_counter() - start
+
+    curves, step = game.balance_histories()
+    return JobResult([p.name for p in game.players], game.statistics, [np.asarray(curve).tolist() for curve in curves],
+                     step, [p.get_balance() for p in game.players], game.engine, game.run_seed, elapsed, game.paired)
+
+
+class RunQueue:
+    # Matchups waiting for, running on and done with a process pool of up to workers processes. Workers report
+    # progress through a manager queue, poll collects it together with finished jobs
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.jobs = []
+        self.futures = dict()
+        self.progress = dict()
+        self.results = dict()
+        self.errors = dict()
+        self.executor = None
+        self.manager = None
+        self.progress_queue = None
+
+    def add(self, job):
+        self.jobs.append(job)
+        self.progress[len(self.jobs) - 1] = 0
+        return len(self.jobs) - 1
+
+    def start(self, workers=None):
+        # Submits every job not submitted yet, a new worker count only applies once the pool is idle
+        workers = workers or self.workers
+        if self.executor is not None and workers != self.workers and not self.running():
+            self.executor.shutdown()
+            self.executor = None
+        self.workers = workers
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers)
+        if self.manager is None:
+            self.manager = Manager()
+            self.progress_queue = self.manager.Queue()
+
+        for job_id, job in enumerate(self.jobs):
+            if job_id not in self.futures and job_id not in self.errors:
+                self.futures[job_id] = self.executor.submit(run_job, job_id, job, self.progress_queue)
+
+    def running(self):
+        return any(not future.done() for future in self.futures.values())
+
+    def poll(self):
+        # Returns the ids of jobs whose progress or status changed
+        changed = set()
+        if self.progress_queue is not None:
+            while True:
+                try:
+                    job_id, percentage = self.progress_queue.get_nowait()
+                except Empty:
+                    break
+                self.progress[job_id] = percentage
+                changed.add(job_id)
+
+        for job_id, future in self.futures.items():
+            if not future.done() or job_id in self.results or job_id in self.errors:
+                continue
+            if future.cancelled():
+                self.errors[job_id] = "cancelled"
+            elif future.exception() is not None:
+                error = future.exception()
+                self.errors[job_id] = f"{type(error).__name__}: {error}"
+            else:
+                self.results[job_id] = future.result()
+                self.progress[job_id] = 100
+            changed.add(job_id)
+        return changed
+
+    def status(self, job_id):
+        if job_id in self.results:
+            return "done"
+        if job_id in self.errors:
+            return self.errors[job_id]
+        if job_id not in self.futures:
+            return "queued"
+        return "running" if self.futures[job_id].running() else "waiting"
+
+    def cancel(self, job_id):
+        # Only jobs that haven't started can be cancelled, a job not submitted yet never will be
+        if job_id in self.results or job_id in self.errors:
+            return False
+        future = self.futures.get(job_id)
+        if future is None:
+            self.errors[job_id] = "cancelled"
+            return True
+        return future.cancel()
+
+    def shutdown(self):
+        # Executor.shutdown only cancels queued jobs itself from Python 3.9 on, running jobs finish first
+        for future in self.futures.values():
+            future.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        if self.manager is not None:
+            self.manager.shutdown()
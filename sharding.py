@@ -0,0 +1,147 @@
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from batch_engine import cumulative, player_cards, play_batch, game_openers, store_balances
+from game_statistics import GameRecord, GameStatistics
+from playable import load_player
+from rng import game_uniforms, new_seed
+
+
+def play_shard(cum, deck_size, seed, start, end, same_opener_and_dealer=False, betting_amounts=(1, 1),
+               duplicate=False):
+    # Games start .. end - 1 of the run with relative balances, the uniforms only depend on seed and game index
+    uniforms = game_uniforms(seed, start, end - start, duplicate)
+    p1_opener = game_openers(start, end - start, same_opener_and_dealer)
+    p1_cards, p2_cards = player_cards(uniforms[:, 0], deck_size, p1_opener, duplicate)
+
+    opener = np.where(p1_opener, 0, 1)
+    opener_cards = np.where(p1_opener, p1_cards, p2_cards)
+    dealer_cards = np.where(p1_opener, p2_cards, p1_cards)
+    opener_payoff, actions = play_batch(cum, opener, 1 - opener, opener_cards, dealer_cards, uniforms)
+
+    p1_units = np.where(p1_opener, opener_payoff, -opener_payoff)
+    p1_payoff = p1_units * np.where(p1_units > 0, betting_amounts[1], betting_amounts[0])
+    return p1_opener, opener_cards, dealer_cards, actions, p1_payoff
+
+
+def in_order(submit, bounds, workers=None):
+    # Submits the shards as submit(start, end) with only a few per worker in flight, so finished shards can't pile
+    # up in memory ahead of the merge, and yields (start, end, future) in order. Closing it cancels the rest
+    window = 2 * (workers or os.cpu_count())
+    in_flight = deque()
+    shards = iter(bounds)
+    try:
+        while True:
+            for start, end in islice(shards, window - len(in_flight)):
+                in_flight.append((start, end, submit(start, end)))
+            if not in_flight:
+                return
+            yield in_flight.popleft()
+    finally:
+        for _, _, future in in_flight:
+            future.cancel()
+
+
+def play_sharded(p1, p2, games, seed=None, workers=None, shard_size=1 << 18, same_opener_and_dealer=False,
+                 betting_amounts=(1, 1)):
+    # Splits a run into shards played on a process pool. Because every game has its own counter based draws,
+    # the record is the same as a serial Game run with the same seed, whatever the shard size or worker count
+    seed = new_seed() if seed is None else seed
+    deck_size = np.asarray(p1).shape[-2]
+    cum = cumulative(np.stack([np.asarray(p1), np.asarray(p2)]))
+    bounds = [(start, min(start + shard_size, games)) for start in range(0, games, shard_size)]
+
+    record = GameRecord(games)
+    with ProcessPoolExecutor(workers) as executor:
+        def submit(start, end):
+            return executor.submit(play_shard, cum, deck_size, seed, start, end, same_opener_and_dealer,
+                                   betting_amounts)
+
+        for _, _, future in in_order(submit, bounds, workers):
+            record.add_batch(*future.result())
+    return seed, record
+
+
+def can_play(game):
+    # Same conditions as jit_engine.can_play, plus relative balances since shards can't see earlier balances
+    tables = [p.get_strategy_table(len(game.cards)) for p in game.players]
+    return (all(table is not None for table in tables) and all(p.use_relative_balance for p in game.players)
+            and not game.display_text and not game.create_log and not any(p.observes_games for p in game.players))
+
+
+def play_games_parallel(game, telemetry, shard_size=1 << 18, workers=None):
+    # Game engine on a process pool, shards are collected in order so records and histories fill like a serial run
+    deck_size = len(game.cards)
+    cum = cumulative(np.stack([p.get_strategy_table(deck_size).probabilities[:, :deck_size]
+                               for p in game.players]))
+    betting_amounts = [p.betting_amount for p in game.players]
+    balances = np.array([p.get_balance() for p in game.players], dtype=np.int64)
+
+    chunked = game.record_chunked
+    if chunked:
+        shard_size = game.record.size
+    histories = None if game.summary is not None else np.zeros((2, game.games), dtype=np.int64)
+    record = game.record
+    bounds = [(start, min(start + shard_size, game.games)) for start in range(0, game.games, shard_size)]
+
+    games_played = 0
+    with ProcessPoolExecutor(workers) as executor:
+        def submit(start, end):
+            return executor.submit(play_shard, cum, deck_size, game.run_seed, start, end, game.fixed_seats,
+                                   betting_amounts, game.duplicate_deals)
+
+        shards = in_order(submit, bounds, workers)
+        for start, end, future in shards:
+            if game.break_loop:
+                future.cancel()
+                shards.close()
+                break
+            p1_opener, opener_cards, dealer_cards, actions, p1_payoff = future.result()
+
+            if histories is not None:
+                p1_balances = balances[0] + np.cumsum(p1_payoff)
+                histories[0, start:end] = p1_balances
+                histories[1, start:end] = balances[0] + balances[1] - p1_balances
+            balances += [p1_payoff.sum(), -p1_payoff.sum()]
+
+            if record is not None:
+                record.add_batch(p1_opener, opener_cards, dealer_cards, actions, p1_payoff)
+                if chunked:
+                    game.flush_record()
+            if game.statistics is not None and not chunked:
+                game.statistics.add_games(p1_opener, opener_cards, dealer_cards, actions, p1_payoff)
+
+            games_played = end
+            store_balances(game, balances, histories, games_played)
+            telemetry.check(games_played)
+
+    return games_played
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a seeded run of two strategies across processes")
+    parser.add_argument("p1", help="strategy file of player 1 or 'random'")
+    parser.add_argument("p2", help="strategy file of player 2 or 'random'")
+    parser.add_argument("--games", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--shard-size", type=int, default=1 << 18)
+    parser.add_argument("--same-opener-and-dealer", action="store_true")
+    args = parser.parse_args()
+
+    p1 = load_player(args.p1)
+    p2 = load_player(args.p2, p1.shape[-2])
+    seed, record = play_sharded(p1, p2, args.games, args.seed, args.workers, args.shard_size,
+                                args.same_opener_and_dealer)
+    statistics = GameStatistics(record, p1.shape[-2], window=None)
+    print(f"Seed: {seed}")
+    print(statistics.summary(["Player 1", "Player 2"]))
+
+
+if __name__ == "__main__":
+    main()
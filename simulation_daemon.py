@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from itertools import islice
+
+import numpy as np
+
+from analysis import expected_value, exploitability
+from batch_engine import cumulative
+from game_statistics import PairedSummary
+from playable import load_player
+from rng import new_seed
+from sharding import play_shard
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Worker side strategies by (path, deck size), reloaded when the file changes on disk
+strategies = dict()
+
+
+def strategy_mtime(path):
+    return 0.0 if path == "random" else os.path.getmtime(path)
+
+
+def worker_strategy(path, deck_size=3):
+    mtime = strategy_mtime(path)
+    cached = strategies.get((path, deck_size))
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, load_player(path, deck_size)[:, :deck_size])
+        strategies[(path, deck_size)] = cached
+    return cached[1]
+
+
+def preload(paths, deck_size=3):
+    # Runs in every worker as it starts, so the first job doesn't pay for imports and strategy loading
+    for path in paths:
+        if path == "random" or os.path.exists(path):
+            worker_strategy(path, deck_size)
+    return os.getpid()
+
+
+def simulate_shard(p1, p2, deck_size, seed, start, end, same_opener_and_dealer=False, duplicate=False):
+    # Only the shard's running sums go back to the daemon, not a payoff per game
+    cum = cumulative(np.stack([worker_strategy(p1, deck_size), worker_strategy(p2, deck_size)]))
+    p1_payoff = play_shard(cum, deck_size, seed, start, end, same_opener_and_dealer and not duplicate,
+                           duplicate=duplicate)[-1]
+    summary = PairedSummary()
+    summary.add(p1_payoff)
+    return summary
+
+
+def evaluate_matchup(p1, p2, deck_size=3):
+    # Exact values in units per game, per seat and averaged over both seats
+    first, second = worker_strategy(p1, deck_size), worker_strategy(p2, deck_size)
+    as_opener = expected_value(first, second)
+    as_dealer = -expected_value(second, first)
+    return {"p1_ev": (as_opener + as_dealer) / 2, "p1_ev_as_opener": as_opener, "p1_ev_as_dealer": as_dealer,
+            "p1_exploitability": exploitability(first), "p2_exploitability": exploitability(second)}
+
+
+class ResultCache:
+    # Least recently used results by job, keyed on everything but the job id and the strategy files' mtimes
+    def __init__(self, size=256):
+        self.size = size
+        self.results = OrderedDict()
+
+    @staticmethod
+    def key(job):
+        fields = {name: value for name, value in job.items() if name != "id"}
+        mtimes = [strategy_mtime(job[name]) for name in ("p1", "p2") if name in job]
+        return json.dumps(fields, sort_keys=True) + json.dumps(mtimes)
+
+    def get(self, job):
+        key = self.key(job)
+        if key not in self.results:
+            return None
+        self.results.move_to_end(key)
+        return self.results[key]
+
+    def put(self, job, result):
+        self.results[self.key(job)] = result
+        self.results.move_to_end(self.key(job))
+        while len(self.results) > self.size:
+            self.results.popitem(last=False)
+
+
+class SimulationDaemon:
+    # Jobs arrive as one JSON object per line and every event goes back as one JSON line tagged with the job id:
+    #   {"id": 1, "type": "simulate", "p1": "simple_ai_data_1.txt", "p2": "random", "games": 1000000, "seed": 7,
+    #    "same_opener_and_dealer": false, "duplicate": false, "deck_size": 3}
+    #   {"id": 2, "type": "evaluate", "p1": "simple_ai_data_1.txt", "p2": "bluffing_ai_data_2.txt"}
+    # Events are "accepted", "progress" (simulations only, one per finished shard), "result" and "error".
+    # Several jobs can run at once on one connection, their shards share the pool
+    def __init__(self, workers=None, preload_paths=(), cache_size=256, shard_size=1 << 16):
+        self.workers = workers or os.cpu_count()
+        self.preload_paths = list(preload_paths)
+        self.executor = ProcessPoolExecutor(self.workers, initializer=preload, initargs=(self.preload_paths,))
+        self.pending = set()
+        self.cache = ResultCache(cache_size)
+        self.shard_size = shard_size
+        self.jobs_run = 0
+
+    def submit(self, function, *args):
+        # Runs function on the pool. The futures are kept until they are done, so shutdown can cancel the ones
+        # that haven't started
+        future = self.executor.submit(function, *args)
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+        return asyncio.wrap_future(future)
+
+    async def warm_up(self):
+        # The pool only starts processes as work arrives, one task per worker starts all of them up front
+        await asyncio.gather(*(self.submit(preload, self.preload_paths) for _ in range(self.workers)))
+
+    async def run_job(self, job, send):
+        job_id = job.get("id")
+        cached = self.cache.get(job)
+        if cached is not None:
+            await send({"id": job_id, "event": "result", "cached": True, **cached})
+            return
+
+        await send({"id": job_id, "event": "accepted"})
+        start = time.perf_counter()
+        if job.get("type") == "simulate":
+            result = await self.simulate(job, send)
+        elif job.get("type") == "evaluate":
+            result = await self.submit(evaluate_matchup, job["p1"], job["p2"], job.get("deck_size", 3))
+        else:
+            raise ValueError(f"Unknown job type {job.get('type')!r}")
+        result["elapsed"] = time.perf_counter() - start
+        self.jobs_run += 1
+
+        # An unseeded simulation is a new sample every time, it isn't cached
+        if job.get("type") != "simulate" or job.get("seed") is not None:
+            self.cache.put(job, result)
+        await send({"id": job_id, "event": "result", "cached": False, **result})
+
+    async def simulate(self, job, send):
+        games = int(job["games"])
+        seed = job.get("seed")
+        seed = new_seed() if seed is None else int(seed)
+        deck_size = job.get("deck_size", 3)
+        duplicate = bool(job.get("duplicate", False))
+        same_opener_and_dealer = bool(job.get("same_opener_and_dealer", False))
+
+        # Even shard sizes keep both games of a duplicate pair in one shard. A job keeps at most two shards per
+        # worker in flight and merges them in order, so its memory doesn't grow with the game count
+        shard_size = self.shard_size + self.shard_size % 2
+        starts = iter(range(0, games, shard_size))
+        in_flight = deque()
+
+        summary = PairedSummary()
+        while True:
+            for start in islice(starts, 2 * self.workers - len(in_flight)):
+                in_flight.append(self.submit(simulate_shard, job["p1"], job["p2"], deck_size, seed, start,
+                                             min(start + shard_size, games), same_opener_and_dealer, duplicate))
+            if not in_flight:
+                break
+            summary.merge(await in_flight.popleft())
+            await send({"id": job.get("id"), "event": "progress", "games": summary.games, "total": games})
+
+        result = {"seed": seed, "games": summary.games,
+                  "p1_mean": summary.payoff_sum / summary.games if summary.games else 0.0,
+                  "interval": summary.unpaired_interval()}
+        if duplicate:
+            result.update(paired_mean=summary.mean(), paired_interval=summary.interval(),
+                          variance_reduction=summary.variance_reduction())
+        return result
+
+    async def handle(self, reader, writer):
+        lock = asyncio.Lock()
+
+        async def send(event):
+            async with lock:
+                writer.write((json.dumps(event, default=float) + "\n").encode())
+                await writer.drain()
+
+        async def run(job):
+            try:
+                await self.run_job(job, send)
+            except Exception as error:
+                await send({"id": job.get("id"), "event": "error", "error": f"{type(error).__name__}: {error}"})
+
+        tasks = []
+        while line := await reader.readline():
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as error:
+                await send({"id": None, "event": "error", "error": f"Invalid JSON: {error}"})
+                continue
+            tasks.append(asyncio.create_task(run(job)))
+        await asyncio.gather(*tasks)
+        writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        await self.warm_up()
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def shutdown(self, wait=True):
+        # Executor.shutdown only cancels queued work itself from Python 3.9 on
+        for future in list(self.pending):
+            future.cancel()
+        self.executor.shutdown(wait=wait)
+
+
+async def submit(jobs, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    # Sends the jobs on one connection and yields every event until each job has its result or error
+    if unix_path is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    for job in jobs:
+        writer.write((json.dumps(job) + "\n").encode())
+    await writer.drain()
+
+    pending = len(jobs)
+    while pending:
+        line = await reader.readline()
+        if not line:
+            break
+        event = json.loads(line)
+        if event["event"] in ("result", "error"):
+            pending -= 1
+        yield event
+    writer.close()
+    await writer.wait_closed()
+
+
+def request(jobs, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    # Blocking client, returns every event
+    async def collect():
+        return [event async for event in submit(jobs, host, port, unix_path)]
+    return asyncio.run(collect())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local simulation service with a warm worker pool")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="start the service")
+    serve_parser.add_argument("--workers", type=int, default=None)
+    serve_parser.add_argument("--cache-size", type=int, default=256)
+    serve_parser.add_argument("--shard-size", type=int, default=1 << 16)
+    serve_parser.add_argument("--preload", nargs="*", default=None,
+                              help="strategy files loaded by every worker, defaults to every simple/bluffing AI file")
+
+    submit_parser = subparsers.add_parser("submit", help="send jobs and print their events")
+    submit_parser.add_argument("jobs", nargs="+", help="one JSON object per job")
+
+    for subparser in (serve_parser, submit_parser):
+        subparser.add_argument("--host", default=DEFAULT_HOST)
+        subparser.add_argument("--port", type=int, default=DEFAULT_PORT)
+        subparser.add_argument("--unix", default=None, help="Unix socket path, used instead of host and port")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        paths = args.preload if args.preload is not None else \
+            sorted(glob("simple_ai_data_*.txt") + glob("bluffing_ai_data_*.txt")) + ["random"]
+        daemon = SimulationDaemon(args.workers, paths, args.cache_size, args.shard_size)
+        where = args.unix or f"{args.host}:{args.port}"
+        print(f"Serving on {where} with {daemon.workers} workers")
+        try:
+            asyncio.run(daemon.serve(args.host, args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.shutdown()
+    else:
+        jobs = [json.loads(job) for job in args.jobs]
+        for k, job in enumerate(jobs):
+            job.setdefault("id", k)
+        for event in request(jobs, args.host, args.port, args.unix):
+            print(json.dumps(event))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import numpy as np
+
+
+ACTIONS = ["f", "c", "b"]
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+NODES = [
+    ("opener_first_move", None),
+    ("dealer_first_move", "opponent_c"),
+    ("dealer_first_move", "opponent_b"),
+    ("opener_second_move", "opponent_c"),
+    ("opener_second_move", "opponent_b"),
+]
+OPENER_FIRST, DEALER_ON_CHECK, DEALER_ON_BET, OPENER_ON_CHECK, OPENER_ON_BET = range(len(NODES))
+
+# Actions the rules allow at every node as a (node, action) mask, a bet can only be called or folded to
+LEGAL_ACTIONS = np.ones((len(NODES), len(ACTIONS)), dtype=bool)
+LEGAL_ACTIONS[[DEALER_ON_BET, OPENER_ON_BET], ACTION_CODES["c"]] = False
+
+card_words = ["one", "two", "three"]
+
+
+def card_key(value):
+    # The original 3 card files use words as keys, larger decks fall back to the plain number
+    if value <= len(card_words):
+        return card_words[value - 1]
+    return str(value)
+
+
+def node_keys(node, value):
+    move, opponent = NODES[node]
+    if opponent is None:
+        return [move, card_key(value)]
+    return [move, card_key(value), opponent]
+
+
+def data_deck_size(data):
+    return len(data["opener_first_move"])
+
+
+class StrategyTable:
+    # Weights are stored as a (node, card, action) array, card index is card value - 1
+    def __init__(self, weights):
+        self.weights = np.asarray(weights, dtype=float)
+        self.deck_size = self.weights.shape[1]
+
+        totals = self.weights.sum(axis=-1, keepdims=True)
+        self.probabilities = np.divide(self.weights, totals, out=np.zeros_like(self.weights), where=totals > 0)
+        # Same values as batch_engine.cumulative, a row without weights always bets
+        self.cumulative = np.cumsum(self.probabilities, axis=-1)
+        self.cumulative[..., -1] = 1.0
+        self.cum_probabilities = self.cumulative.tolist()
+
+    @classmethod
+    def from_data(cls, data):
+        deck_size = data_deck_size(data)
+        weights = np.zeros((len(NODES), deck_size, len(ACTIONS)))
+        for node in range(len(NODES)):
+            for value in range(1, deck_size + 1):
+                element = data
+                for key in node_keys(node, value):
+                    element = element[key]
+                weights[node, value - 1] = [element[action] for action in ACTIONS]
+        return cls(weights)
+
+    @classmethod
+    def uniform(cls, deck_size):
+        # Same choices as RandomAI, a bet can only be called or folded to
+        weights = np.ones((len(NODES), deck_size, len(ACTIONS))) * LEGAL_ACTIONS[:, None, :]
+        return cls(weights)
+
+    def to_data(self):
+        data = dict()
+        for node in range(len(NODES)):
+            for value in range(1, self.deck_size + 1):
+                element = data
+                for key in node_keys(node, value):
+                    element = element.setdefault(key, dict())
+                for code, action in enumerate(ACTIONS):
+                    element[action] = float(self.weights[node, value - 1, code])
+        return data
@@ -0,0 +1,129 @@
+import numpy as np
+
+from game_statistics import GameStatistics, STAGES
+
+
+class DecimatedCurve:
+    # Keeps every step-th point, doubling the step and dropping every other point whenever capacity is reached
+    def __init__(self, capacity=2048):
+        self.capacity = capacity
+        self.step = 1
+        self.values = np.zeros(0, dtype=np.int64)
+
+    def add(self, first_index, values):
+        offset = (-first_index) % self.step
+        self.values = np.concatenate([self.values, values[offset::self.step]])
+        while len(self.values) > self.capacity:
+            self.values = self.values[::2]
+            self.step *= 2
+
+    def indexes(self):
+        return np.arange(len(self.values)) * self.step
+
+
+class HandReservoir:
+    # Uniform sample of size hands out of everything seen so far (reservoir sampling, algorithm R). A seeded
+    # reservoir picks the same hands of the same run whatever the chunk sizes
+    def __init__(self, size=1000, seed=None):
+        self.size = size
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+        self.game_index = np.zeros(size, dtype=np.int64)
+        self.p1_opener = np.zeros(size, dtype=bool)
+        self.opener_card = np.zeros(size, dtype=np.uint8)
+        self.dealer_card = np.zeros(size, dtype=np.uint8)
+        self.actions = np.full((size, STAGES), -1, dtype=np.int8)
+        self.p1_payoff = np.zeros(size, dtype=np.int32)
+
+    def __len__(self):
+        return min(self.seen, self.size)
+
+    def store(self, slot, first_index, row, record):
+        self.game_index[slot] = first_index + row
+        self.p1_opener[slot] = record.p1_opener[row]
+        self.opener_card[slot] = record.opener_card[row]
+        self.dealer_card[slot] = record.dealer_card[row]
+        self.actions[slot] = record.actions[row]
+        self.p1_payoff[slot] = record.p1_payoff[row]
+
+    def add(self, first_index, record):
+        rows = record.length
+        fill = max(0, min(self.size - self.seen, rows))
+        for row in range(fill):
+            self.store(self.seen + row, first_index, row, record)
+
+        # Hand i (counting from 0) replaces a random slot with probability size / (i + 1)
+        seen = self.seen + np.arange(fill, rows)
+        slots = (self.rng.random(len(seen)) * (seen + 1)).astype(np.int64)
+        for row, slot in zip(np.flatnonzero(slots < self.size) + fill, slots[slots < self.size]):
+            self.store(slot, first_index, row, record)
+        self.seen += rows
+
+    def hands(self):
+        n = len(self)
+        order = np.argsort(self.game_index[:n])
+        return {
+            "game_index": self.game_index[:n][order],
+            "p1_opener": self.p1_opener[:n][order],
+            "opener_card": self.opener_card[:n][order],
+            "dealer_card": self.dealer_card[:n][order],
+            "actions": self.actions[:n][order],
+            "p1_payoff": self.p1_payoff[:n][order],
+        }
+
+
+class StreamingSummary:
+    # O(1) memory aggregates of player 1's results, fed one GameRecord chunk at a time
+    def __init__(self, deck_size, p1_start_balance, total_balance, reservoir_size=1000, curve_capacity=2048,
+                 seed=None):
+        self.games = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.total_balance = total_balance
+        self.balance = p1_start_balance
+        self.peak = p1_start_balance
+        self.min_balance = p1_start_balance
+        self.max_balance = p1_start_balance
+        self.max_drawdown = 0
+        self.statistics = GameStatistics(None, deck_size, window=None)
+        self.reservoir = HandReservoir(reservoir_size, seed)
+        self.curve = DecimatedCurve(curve_capacity)
+
+    def add(self, record):
+        payoff = record.arrays()[-1].astype(np.int64)
+        count = len(payoff)
+        if count == 0:
+            return
+
+        # Welford / Chan merge of the chunk's mean and squared deviations
+        chunk_mean = payoff.mean()
+        chunk_m2 = ((payoff - chunk_mean) ** 2).sum()
+        total = self.games + count
+        delta = chunk_mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += chunk_m2 + delta ** 2 * self.games * count / total
+
+        balances = self.balance + np.cumsum(payoff)
+        peaks = np.maximum(np.maximum.accumulate(balances), self.peak)
+        self.max_drawdown = max(self.max_drawdown, int((peaks - balances).max()))
+        self.peak = int(peaks[-1])
+        self.min_balance = min(self.min_balance, int(balances.min()))
+        self.max_balance = max(self.max_balance, int(balances.max()))
+        self.balance = int(balances[-1])
+
+        self.statistics.add(record)
+        self.reservoir.add(self.games, record)
+        self.curve.add(self.games, balances)
+        self.games = total
+
+    def variance(self):
+        return self.m2 / (self.games - 1) if self.games > 1 else 0.0
+
+    def curves(self):
+        # Decimated balance curves of both players, the pool always goes to one of them so they sum to a constant
+        return [self.curve.values, self.total_balance - self.curve.values]
+
+    def __str__(self):
+        return (f"Games: {self.games}, final balance {self.balance}, mean {self.mean:+.4f} "
+                f"(sd {self.variance() ** 0.5:.4f}), min {self.min_balance}, max {self.max_balance}, "
+                f"max drawdown {self.max_drawdown}")
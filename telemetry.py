@@ -0,0 +1,80 @@
+import logging
+import time
+
+
+class TelemetrySnapshot:
+    def __init__(self, games_played, games, elapsed, balances, start_balances, finished=False):
+        self.games_played = games_played
+        self.games = games
+        self.elapsed = elapsed
+        self.balances = balances
+        self.finished = finished
+
+        self.games_per_second = games_played / elapsed if elapsed > 0 else 0.0
+        remaining = games - games_played
+        self.eta = remaining / self.games_per_second if self.games_per_second > 0 else None
+        # Average balance change per game of each player, the first one is the EV estimate of player 1
+        self.ev = [(balance - start) / games_played if games_played else 0.0
+                   for balance, start in zip(balances, start_balances)]
+
+    @property
+    def percentage(self):
+        return 100 * self.games_played // self.games if self.games else 100
+
+    def __str__(self):
+        eta = f"{self.eta:.1f}s" if self.eta is not None else "-"
+        return (f"{self.percentage}% - {self.games_played}/{self.games} games, {self.games_per_second:.0f} games/s, "
+                f"ETA {eta}, EV {self.ev[0]:+.4f}, balances {self.balances[0]} / {self.balances[1]}")
+
+
+class Telemetry:
+    def __init__(self, interval=0.1, batch_size=256):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.subscribers = []
+        self.run_subscribers = []
+        self.latest = None
+
+        self.game = None
+        self.start_time = 0.0
+        self.next_report = 0.0
+        self.start_balances = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def start(self, game, run_subscribers=()):
+        self.game = game
+        self.run_subscribers = list(run_subscribers)
+        self.start_time = time.perf_counter()
+        self.next_report = self.start_time + self.interval
+        self.start_balances = [p.get_balance() for p in game.players]
+        self.latest = None
+
+    def check(self, games_played):
+        # Called once per batch of games, only reports when the interval has passed
+        now = time.perf_counter()
+        if now >= self.next_report:
+            self.next_report = now + self.interval
+            self.publish(games_played, now)
+
+    def finish(self, games_played):
+        self.publish(games_played, time.perf_counter(), finished=True)
+        self.run_subscribers = []
+
+    def publish(self, games_played, now, finished=False):
+        self.latest = TelemetrySnapshot(games_played, self.game.games, now - self.start_time,
+                                        [p.get_balance() for p in self.game.players], self.start_balances, finished)
+        for callback in self.subscribers + self.run_subscribers:
+            callback(self.latest)
+
+
+def print_progress(snapshot):
+    print(snapshot)
+
+
+def log_progress(snapshot):
+    logging.info(f"Progress: {snapshot}")
@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    # Strategy and settings files are looked up relative to the working directory
+    monkeypatch.chdir(ROOT)
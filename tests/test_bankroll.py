@@ -0,0 +1,13 @@
+import numpy as np
+
+from bankroll import simulate_bankrolls
+from playable import load_player
+
+
+def test_uncovered_bets_keep_balances_from_going_negative():
+    # With balances this low most sessions reach games where a bet can't be covered, it then pays nothing
+    p1, p2 = load_player("bluffing_ai_data_1.txt"), load_player("bluffing_ai_data_2.txt")
+    result = simulate_bankrolls(p1, p2, [5, 5], sessions=500, games=3000, seed=4)
+    assert result.final_balances.min() >= 0
+    assert np.all(result.final_balances.sum(axis=1) == 10)
+    assert result.ruin_probability() > 0.5
@@ -0,0 +1,22 @@
+import numpy as np
+
+from engines import select_engine
+from game import Game
+from playable import AdaptiveAI, SimpleAI
+
+
+def test_first_run_with_adaptive_ai_learns():
+    # The observers have to be known when the engine is picked, also on the first run of a fresh Game
+    adaptive = AdaptiveAI("Adaptive", update_every=100)
+    game = Game(adaptive, SimpleAI("Simple", data_path="simple_ai_data_1.txt"), 2000, seed=1)
+    initial = adaptive.strategy.probabilities.copy()
+    game.play_games()
+    assert game.engine == "python"
+    assert not np.array_equal(adaptive.strategy.probabilities, initial)
+
+
+def test_select_engine_sees_observers_without_a_run():
+    game = Game(SimpleAI("Simple", data_path="simple_ai_data_1.txt"),
+                SimpleAI("Simple 2", data_path="simple_ai_data_2.txt"), 1000, seed=1)
+    game.set_player(AdaptiveAI("Adaptive"), game.p2)
+    assert select_engine(game) == ("python", "a player learns from every game")
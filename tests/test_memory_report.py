@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from game import Game
+from memory_report import predict_memory
+from playable import SimpleAI, BluffingAI
+
+
+def make_game(**options):
+    return Game(SimpleAI("Simple", data_path="simple_ai_data_1.txt"),
+                BluffingAI("Bluffing", data_path="bluffing_ai_data_2.txt"), 2000, seed=3, memory_report=True,
+                **options)
+
+
+def widget(*children):
+    return SimpleNamespace(children={str(index): child for index, child in enumerate(children)})
+
+
+def test_report_counts_the_widgets_of_the_root():
+    game = make_game()
+    game.memory_root = widget(widget(), widget(widget(), widget()))
+    game.play_games()
+    assert game.memory.components["tk widgets"] == 4
+
+
+def test_report_has_log_buffers_of_logged_runs():
+    game = make_game(create_log=True)
+    game.play_games()
+    assert "log buffers" in game.memory.components
+    assert "tk widgets" not in game.memory.components
+
+
+def test_prediction_leaves_the_game_alone():
+    game = make_game()
+    before = dict(vars(game))
+    predict_memory(game)
+    assert vars(game).keys() == before.keys()
+    assert all(vars(game)[name] is value for name, value in before.items())
@@ -0,0 +1,33 @@
+import time
+
+from run_queue import MatchupJob, RunQueue
+
+
+def matchup(games=2000):
+    return MatchupJob("Simple AI", "simple_ai_data_1.txt", "Bluffing AI", "bluffing_ai_data_2.txt", games, seed=1)
+
+
+def test_cancel_jobs_that_have_not_started():
+    queue = RunQueue(workers=1)
+    try:
+        before_start = queue.add(matchup())
+        assert queue.cancel(before_start)
+
+        # One worker takes the first job and queues the next one, the last one waits in the executor
+        job_ids = [queue.add(matchup()) for _ in range(3)]
+        queue.start()
+        assert queue.cancel(job_ids[-1])
+
+        deadline = time.time() + 120
+        while queue.running() and time.time() < deadline:
+            queue.poll()
+            time.sleep(0.05)
+        queue.poll()
+
+        assert before_start not in queue.futures
+        assert queue.status(before_start) == "cancelled"
+        assert queue.status(job_ids[-1]) == "cancelled"
+        assert all(queue.status(job_id) == "done" for job_id in job_ids[:-1])
+        assert not queue.cancel(job_ids[0])
+    finally:
+        queue.shutdown()
@@ -0,0 +1,35 @@
+from concurrent.futures import Future
+
+import numpy as np
+
+from game import Game
+from playable import SimpleAI, BluffingAI, load_player
+from sharding import in_order, play_sharded
+
+
+def test_in_order_bounds_the_shards_in_flight():
+    submitted = []
+
+    def submit(start, end):
+        submitted.append(start)
+        future = Future()
+        future.set_result(start)
+        return future
+
+    consumed = 0
+    for start, end, future in in_order(submit, [(k, k + 1) for k in range(20)], workers=2):
+        assert len(submitted) - consumed <= 4
+        assert future.result() == start
+        consumed += 1
+    assert consumed == 20
+
+
+def test_play_sharded_matches_a_serial_run():
+    game = Game(SimpleAI("Simple", data_path="simple_ai_data_1.txt"),
+                BluffingAI("Bluffing", data_path="bluffing_ai_data_2.txt"), 20000, seed=5, engine="batch",
+                keep_record=True)
+    game.play_games()
+    _, record = play_sharded(load_player("simple_ai_data_1.txt"), load_player("bluffing_ai_data_2.txt"), 20000,
+                             seed=5, workers=2, shard_size=3000)
+    for sharded, serial in zip(record.arrays(), game.record.arrays()):
+        assert np.array_equal(sharded, serial)
@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+import pytest
+
+import game_statistics
+from game import Game
+from game_statistics import GameStatistics
+from jit_engine import NUMBA_AVAILABLE
+from playable import SimpleAI, BluffingAI
+
+
+def make_game(games, engine, **options):
+    return Game(SimpleAI("Simple", data_path="simple_ai_data_1.txt"),
+                BluffingAI("Bluffing", data_path="bluffing_ai_data_2.txt"), games, seed=3, engine=engine, **options)
+
+
+def engines():
+    return ["python", "batch"] + (["jit"] if NUMBA_AVAILABLE else [])
+
+
+@pytest.mark.parametrize("engine", engines())
+def test_counted_statistics_match_the_record(engine, monkeypatch):
+    # Statistics counted while the games are played equal the numpy counts over the whole record
+    game = make_game(20000, engine, record_statistics=True, keep_record=True)
+    game.play_games()
+    assert game.engine == engine
+
+    monkeypatch.setattr(game_statistics, "NUMBA_AVAILABLE", False)
+    expected = GameStatistics(game.record, len(game.cards))
+    for name in ("action_counts", "deal_games", "deal_payoff", "outcomes", "recent_wins", "window_wins",
+                 "rolling_win_rate"):
+        assert np.array_equal(getattr(game.statistics, name), getattr(expected, name)), name
+    assert game.statistics.games == 20000
+
+
+def test_statistics_added_in_parts_match_one_add(monkeypatch):
+    game = make_game(5000, "batch", keep_record=True)
+    game.play_games()
+    arrays = game.record.arrays()
+
+    whole = GameStatistics(game.record, 3)
+    for numba in {False, NUMBA_AVAILABLE}:
+        monkeypatch.setattr(game_statistics, "NUMBA_AVAILABLE", numba)
+        parts = GameStatistics(None, 3)
+        for start, end in [(0, 400), (400, 999), (999, 1001), (1001, 5000)]:
+            parts.add_games(*(array[start:end] for array in arrays))
+        assert np.array_equal(parts.rolling_win_rate, whole.rolling_win_rate)
+        assert np.array_equal(parts.action_counts, whole.action_counts)
+        assert np.array_equal(parts.recent_wins, whole.recent_wins)
+
+
+def best_time(games, engine, record_statistics, repeats=5):
+    times = []
+    for _ in range(repeats):
+        game = make_game(games, engine, record_statistics=record_statistics)
+        start = time.perf_counter()
+        game.play_games()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@pytest.mark.parametrize("engine, games", [("batch", 200000)] + ([("jit", 1000000)] if NUMBA_AVAILABLE else []))
+def test_statistics_overhead(engine, games):
+    # Statistics are counted in the kernel or per chunk. Post-processing the whole record took 1.2x (batch) to 3x (jit)
+    # the plain run, the bound leaves room for noisy machines
+    best_time(games, engine, True, repeats=1)
+    plain, counted = best_time(games, engine, False), best_time(games, engine, True)
+    assert counted < 1.4 * plain
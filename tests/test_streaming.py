@@ -0,0 +1,22 @@
+import numpy as np
+
+from game import Game
+from playable import SimpleAI, BluffingAI
+
+
+def sampled_hands(chunk_size, engine="batch"):
+    game = Game(SimpleAI("Simple", data_path="simple_ai_data_1.txt"),
+                BluffingAI("Bluffing", data_path="bluffing_ai_data_2.txt"), 50000, seed=7, engine=engine,
+                history_mode="stream", stream_chunk_size=chunk_size)
+    game.play_games()
+    return game.summary.reservoir.hands()["game_index"]
+
+
+def test_reservoir_follows_the_run_seed():
+    # The sampled hands only depend on the run seed, not on the chunking or numpy's global generator
+    np.random.seed(1)
+    first = sampled_hands(1 << 12)
+    np.random.seed(2)
+    assert np.array_equal(first, sampled_hands(1 << 12))
+    assert np.array_equal(first, sampled_hands(5000))
+    assert np.array_equal(first, sampled_hands(1 << 12, engine="python"))
@@ -1,10 +1,16 @@
+import threading
 import time
 from tkinter import *
 from tkinter import ttk
 
 from data_structures import SimpleAIData, GameSettings
 from game import Game
-from playable import RandomAI, Player, SimpleAI, BluffingAI
+from analysis import IncrementalEvaluator
+from strategy_table import StrategyTable, NODES, node_keys
+from telemetry import Telemetry
+from playable import RandomAI, Player, SimpleAI, BluffingAI, AdaptiveAI
+from run_queue import PLAYER_TYPES, SEAT_MODES, MatchupJob, RunQueue
+from resimulation import resimulate
 from colorama import Fore, Back, Style
 
 
@@ -30,6 +36,64 @@ class Widget:
         self.rel_pos = rel_pos
 
 
+class LiveChart(Canvas):
+    colors = ["red", "blue"]
+
+    def __init__(self, master, width=700, height=280, max_points=400, margin=10):
+        super().__init__(master, width=width, height=height, bg="white")
+        self.width = width
+        self.height = height
+        self.max_points = max_points
+        self.margin = margin
+
+        self.zero_line = self.create_line(0, 0, 0, 0, fill="gray", dash=(2, 4))
+        self.lines = [self.create_line(0, 0, 0, 0, fill=color, width=2) for color in self.colors]
+        self.top_label = self.create_text(self.margin, self.margin, anchor=NW, text="")
+        self.bottom_label = self.create_text(self.margin, self.height - self.margin, anchor=SW, text="")
+
+    def downsample(self, history):
+        # Never more than max_points samples, so drawing costs the same however many games were played
+        length = len(history)
+        step = max(1, -(-length // self.max_points))
+        indexes = list(range(0, length, step))
+        if length and indexes[-1] != length - 1:
+            indexes.append(length - 1)
+        return indexes, [history[i] for i in indexes]
+
+    def clear(self):
+        for line in self.lines + [self.zero_line]:
+            self.coords(line, 0, 0, 0, 0)
+        self.itemconfigure(self.top_label, text="")
+        self.itemconfigure(self.bottom_label, text="")
+
+    def draw(self, histories, total, step=1):
+        samples = [self.downsample(history) for history in histories]
+        values = [value for _, sampled in samples for value in sampled]
+        if not values:
+            self.clear()
+            return
+
+        low, high = min(values + [0]), max(values + [0])
+        y_range = max(high - low, 1)
+        x_scale = step * (self.width - 2 * self.margin) / max(total - 1, 1)
+        y_scale = (self.height - 2 * self.margin) / y_range
+
+        def y_position(value):
+            return self.height - self.margin - (value - low) * y_scale
+
+        for line, (indexes, sampled) in zip(self.lines, samples):
+            points = []
+            for index, value in zip(indexes, sampled):
+                points += [self.margin + index * x_scale, y_position(value)]
+            if len(points) < 4:
+                points = points * 2 if points else [0, 0, 0, 0]
+            self.coords(line, *points)
+
+        self.coords(self.zero_line, self.margin, y_position(0), self.width - self.margin, y_position(0))
+        self.itemconfigure(self.top_label, text=str(high))
+        self.itemconfigure(self.bottom_label, text=str(low))
+
+
 class VariableStorage:
     def __init__(self, names, variable):
         self.variable = variable
@@ -39,7 +103,7 @@ class VariableStorage:
 class TkinterGUI:
     player_settings_options = ["player_1_settings_frame", "player_2_settings_frame"]
 
-    def __init__(self, size=Size(800, 600)):
+    def __init__(self, size=Size(800, 900)):
         self.root = Tk()
         self.root.title("Game Theory: One Card Poker")
         self.og_size = size
@@ -50,6 +114,7 @@ class TkinterGUI:
         self.root.option_add("*font", "arial 14")
 
         self.root.bind_all("<Button-1>", lambda event: event.widget.focus_set())
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
         self.pad = Size(5, 5)
         self.margin = Size(5, 10)
@@ -57,39 +122,66 @@ class TkinterGUI:
         self.game = Game(RandomAI("Random AI 1", text_color=Fore.RED), RandomAI("Random AI 2", text_color=Fore.BLUE))
         # self.game = Game(Player("P1"), Player("P2"))
         self.game.set_display_text(True)
-
-        self.main_frame = MainFrame(self, self.root, self.size, self.pad, self.margin, self.game)
-        self.game_settings_frame = GameSettingsFrame(self, self.root, self.size, self.pad, self.margin)
-        self.player_1_settings_frame = PlayerSettingsFrame(self, self.root, self.size, self.pad, self.margin,
-                                                           self.game.p1)
-        self.player_2_settings_frame = PlayerSettingsFrame(self, self.root, self.size, self.pad, self.margin,
-                                                           self.game.p2)
-
-        self.frames = {
-            "main": self.main_frame,
-            "game_settings": self.game_settings_frame,
-            "player_1_settings_frame": self.player_1_settings_frame,
-            "player_2_settings_frame": self.player_2_settings_frame,
+        # Re-simulate replays games from the record of the last run
+        self.game.keep_record = True
+
+        # Frames are built the first time they are needed and kept afterwards
+        self.frames = dict()
+        self.frame_factories = {
+            "main": lambda: MainFrame(self, self.root, self.size, self.pad, self.margin, self.game),
+            "game_settings": lambda: GameSettingsFrame(self, self.root, self.size, self.pad, self.margin),
+            "run_queue": lambda: RunQueueFrame(self, self.root, self.size, self.pad, self.margin),
+            "player_1_settings_frame": lambda: PlayerSettingsFrame(self, self.root, self.size, self.pad, self.margin,
+                                                                   PlayerSettingsFrame.p1_options, self.game.p1),
+            "player_2_settings_frame": lambda: PlayerSettingsFrame(self, self.root, self.size, self.pad, self.margin,
+                                                                   PlayerSettingsFrame.p2_options, self.game.p2),
         }
 
+    def get_frame(self, name):
+        if name not in self.frames:
+            self.frames[name] = self.frame_factories[name]()
+        return self.frames[name]
+
+    @property
+    def main_frame(self):
+        return self.get_frame("main")
+
+    @property
+    def game_settings_frame(self):
+        return self.get_frame("game_settings")
+
+    @property
+    def player_1_settings_frame(self):
+        return self.get_frame("player_1_settings_frame")
+
+    @property
+    def player_2_settings_frame(self):
+        return self.get_frame("player_2_settings_frame")
+
     def start(self, load_main_frame=True):
         if load_main_frame:
             self.main_frame.load()
 
         self.root.mainloop()
 
+    def close(self):
+        # Queued run queue jobs are cancelled and its pool shut down with the window
+        if "run_queue" in self.frames:
+            self.frames["run_queue"].queue.shutdown()
+        self.root.destroy()
+
     def unload_frames(self):
         for frame in self.frames.values():
             frame.frame.pack_forget()
 
     def load_frame_by_name(self, name):
-        if name in self.frames:
+        if name in self.frame_factories:
             self.root.geometry(str(self.og_size))
             if name in self.player_settings_options:
                 self.root.geometry(str(self.player_settings_size))
 
             self.unload_frames()
-            self.frames[name].load()
+            self.get_frame(name).load()
 
 
 class FrameBase:
@@ -137,8 +229,10 @@ class FrameBase:
 
 
 class MainFrame(FrameBase):
-    player_options = ["Random AI", "Simple AI", "Bluffing AI", "Human"]
+    player_options = ["Random AI", "Simple AI", "Bluffing AI", "Adaptive AI", "Human"]
     players_with_data = ["Simple AI", "Bluffing AI"]
+    frame_rate = 20
+    hand_history_path = "hand_history"
 
     def __init__(self, parent, root, size, pad, margin, game):
         super().__init__(parent, root, size, pad, margin)
@@ -146,6 +240,11 @@ class MainFrame(FrameBase):
         self.games = IntVar(self.frame, value=100000)
         self.game = game
 
+        self.simulation = None
+        self.telemetry = Telemetry()
+        self.time_elapsed_text = ""
+        self.show_matplotlib_results = False
+
         self.add_widgets()
 
     def settings(self, frame_name, player):
@@ -153,6 +252,9 @@ class MainFrame(FrameBase):
             self.parent.load_frame_by_name(frame_name)
 
     def run(self):
+        if self.simulation is not None and self.simulation.is_alive():
+            return
+
         self.game.set_games(self.games.get())
         self.time_elapsed.set("")
 
@@ -163,15 +265,60 @@ class MainFrame(FrameBase):
         self.game.create_log = variables["create_log"].get()
         self.game.use_game_separators = variables["use_game_separator"].get()
         self.game.same_opener_and_dealer = variables["same_opener_and_dealer"].get()
+        self.game.record_statistics = variables["record_statistics"].get()
+        self.game.history_mode = "stream" if variables["stream_history"].get() else "full"
+        self.game.hand_history_path = self.hand_history_path if variables["export_hand_history"].get() else None
+        self.game.memory_report = variables["memory_report"].get()
+        self.game.memory_root = self.root
+        self.game.duplicate_deals = variables["duplicate_deals"].get()
         self.game.set_player(p1, p2)
 
-        self.game.play_games(variables["print_elapsed_time"].get(),
-                             variables["print_portions"].get(),
-                             variables["print_progress"].get(),
-                             lambda percentage: self.update_progress_bar(percentage),
-                             lambda time_elapsed: self.change_time_elapsed(time_elapsed))
-
-        if variables["display_matplotlib_results"].get():
+        try:
+            self.game.set_deck_size(variables["deck_size"].get())
+            # The adaptive AI learns a table for whatever deck is played, the strategy file players keep the deck
+            # size of their files and check_deck_size reports when it is too small
+            for p in self.game.players:
+                if isinstance(p, AdaptiveAI):
+                    p.set_deck_size(len(self.game.cards))
+            self.game.check_deck_size()
+        except ValueError as error:
+            self.time_elapsed.set(str(error))
+            return
+
+        self.time_elapsed_text = ""
+        self.show_matplotlib_results = variables["display_matplotlib_results"].get()
+        self.live_chart.widget.clear()
+
+        # The games run on a worker thread, the Tk thread only redraws from refresh at a fixed frame rate
+        self.simulation = threading.Thread(target=self.simulate,
+                                           args=(variables["print_elapsed_time"].get(),
+                                                 variables["progress_interval"].get(),
+                                                 variables["print_progress"].get()),
+                                           daemon=True)
+        self.simulation.start()
+        self.refresh()
+
+    def simulate(self, print_elapsed_time, progress_interval, print_progress):
+        self.telemetry.interval = progress_interval
+        self.game.play_games(print_elapsed_time, progress_interval, print_progress,
+                             change_time_elapsed=lambda time_elapsed: self.change_time_elapsed(time_elapsed),
+                             telemetry=self.telemetry)
+
+    def refresh(self):
+        snapshot = self.telemetry.latest
+        if snapshot is not None:
+            self.progress_bar.widget["value"] = snapshot.percentage
+            if not snapshot.finished and snapshot.eta is not None:
+                self.time_elapsed.set(f"{snapshot.games_per_second:.0f} games/s, ETA {snapshot.eta:.0f}s")
+        histories, step = self.game.balance_histories()
+        self.live_chart.widget.draw(histories, self.game.games, step)
+
+        if self.simulation.is_alive():
+            self.root.after(1000 // self.frame_rate, self.refresh)
+            return
+
+        self.time_elapsed.set(self.time_elapsed_text)
+        if self.show_matplotlib_results:
             self.game.display_matplotlib_results()
 
     def load(self):
@@ -187,90 +334,141 @@ class MainFrame(FrameBase):
         self.add_fourth_row()
         self.add_fifth_row()
         self.add_sixth_row()
+        self.add_seventh_row()
 
     def add_first_row(self):
         self.games_label_text = "Amount of games simulated:"
         self.games_label = Widget(Label(self.frame, text=self.games_label_text),
-                                  Size(0, 0), rel_pos=RelPos(0.1, 0.15))
+                                  Size(0, 0), rel_pos=RelPos(0.1, 0.1))
         self.widgets.append(self.games_label)
 
         self.games_entry = Widget(Entry(self.frame, width=20, textvariable=self.games),
-                                  Size(0, 1), rel_pos=RelPos(0.42, 0.15))
+                                  Size(0, 1), rel_pos=RelPos(0.42, 0.1))
         self.widgets.append(self.games_entry)
 
         self.settings_game_button = Widget(Button(self.frame, text="Game Settings",
                                                   command=lambda: self.parent.load_frame_by_name("game_settings")),
-                                           pos=Size(1, 1), rel_pos=RelPos(0.72, 0.15))
+                                           pos=Size(1, 1), rel_pos=RelPos(0.72, 0.1))
         self.widgets.append(self.settings_game_button)
 
     def add_second_row(self):
         self.player_1 = StringVar(self.frame, value="Random AI")
         self.player_1.trace("w", self.options_menu_activated_1)
         self.player_1_option_menu = Widget(OptionMenu(self.frame, self.player_1, *self.player_options),
-                                           pos=Size(1, 0), rel_pos=RelPos(0.13, 0.3))
+                                           pos=Size(1, 0), rel_pos=RelPos(0.13, 0.2))
         self.widgets.append(self.player_1_option_menu)
 
         self.settings_player_1_button = Widget(Button(self.frame, text="Settings",
                                                       command=lambda: self.settings("player_1_settings_frame",
                                                                                     self.parent.player_1_settings_frame.player), state=DISABLED),
-                                               pos=Size(1, 1), rel_pos=RelPos(0.31, 0.3))
+                                               pos=Size(1, 1), rel_pos=RelPos(0.31, 0.2))
         self.widgets.append(self.settings_player_1_button)
 
         self.vs_label = Widget(Label(self.frame, text="VS"),
-                               Size(1, 1), rel_pos=RelPos(0.49, 0.3))
+                               Size(1, 1), rel_pos=RelPos(0.49, 0.2))
         self.widgets.append(self.vs_label)
 
         self.player_2 = StringVar(self.frame, value="Random AI")
         self.player_2.trace("w", self.options_menu_activated_2)
         self.player_2_option_menu = Widget(OptionMenu(self.frame, self.player_2, *self.player_options),
-                                           pos=Size(1, 2), rel_pos=RelPos(0.59, 0.3))
+                                           pos=Size(1, 2), rel_pos=RelPos(0.59, 0.2))
         self.widgets.append(self.player_2_option_menu)
 
         self.settings_player_2_button = Widget(Button(self.frame, text="Settings",
                                                       command=lambda: self.settings("player_2_settings_frame",
                                                                                     self.parent.player_2_settings_frame.player), state=DISABLED),
-                                               pos=Size(1, 1), rel_pos=RelPos(0.77, 0.3))
+                                               pos=Size(1, 1), rel_pos=RelPos(0.77, 0.2))
         self.widgets.append(self.settings_player_2_button)
 
     def add_third_row(self):
         self.run = Widget(Button(self.frame, text="Run", bg="green", command=self.run, width=14, height=3),
-                          pos=Size(2, 1), rel_pos=RelPos(0.42, 0.5))
+                          pos=Size(2, 1), rel_pos=RelPos(0.42, 0.33))
         self.widgets.append(self.run)
 
+        self.resimulate_button = Widget(Button(self.frame, text="Re-simulate", command=self.resimulate),
+                                        pos=Size(2, 2), rel_pos=RelPos(0.72, 0.33))
+        self.widgets.append(self.resimulate_button)
+
     def add_fourth_row(self):
         self.run = Widget(Button(self.frame, text="Stop", command=self.stop, width=6, height=1),
-                          pos=Size(2, 1), rel_pos=RelPos(0.475, 0.62))
+                          pos=Size(2, 1), rel_pos=RelPos(0.475, 0.41))
         self.widgets.append(self.run)
 
+        self.statistics_button = Widget(Button(self.frame, text="Statistics", command=self.show_statistics),
+                                        pos=Size(2, 2), rel_pos=RelPos(0.72, 0.41))
+        self.widgets.append(self.statistics_button)
+
+        self.run_queue_button = Widget(Button(self.frame, text="Run Queue",
+                                              command=lambda: self.parent.load_frame_by_name("run_queue")),
+                                       pos=Size(2, 0), rel_pos=RelPos(0.13, 0.41))
+        self.widgets.append(self.run_queue_button)
+
     def add_fifth_row(self):
         self.progress_bar = Widget(ttk.Progressbar(self.frame, orient=HORIZONTAL, length=400, mode="determinate"),
-                                   pos=Size(3, 1), rel_pos=RelPos(0.27, 0.8))
+                                   pos=Size(3, 1), rel_pos=RelPos(0.27, 0.53))
         self.widgets.append(self.progress_bar)
 
     def add_sixth_row(self):
         self.time_elapsed = StringVar(self.frame, value="")
         self.time_elapsed_label = Widget(Label(self.frame, textvariable=self.time_elapsed),
-                                   pos=Size(3, 1), rel_pos=RelPos(0.49, 0.75))
+                                   pos=Size(3, 1), rel_pos=RelPos(0.49, 0.5))
         self.widgets.append(self.time_elapsed_label)
 
-    def update_progress_bar(self, percentage):
-        self.root.update()
-        self.progress_bar.widget["value"] = percentage
+    def add_seventh_row(self):
+        self.live_chart = Widget(LiveChart(self.frame),
+                                 pos=Size(4, 1), rel_pos=RelPos(0.06, 0.78))
+        self.widgets.append(self.live_chart)
 
     def stop(self):
         self.game.break_loop = True
 
+    def resimulate(self):
+        # Replays only the games of the last run that reached a strategy entry edited since
+        if self.simulation is None or self.simulation.is_alive():
+            return
+        try:
+            result = resimulate(self.game)
+        except ValueError as error:
+            self.time_elapsed.set(str(error))
+            return
+        self.time_elapsed.set(f"Re-simulated {result.replayed} of {result.games} games in {result.elapsed:.2f}s")
+        histories, step = self.game.balance_histories()
+        self.live_chart.widget.draw(histories, self.game.games, step)
+
+    def show_statistics(self):
+        if self.game.statistics is None or (self.simulation is not None and self.simulation.is_alive()):
+            return
+
+        window = Toplevel(self.root)
+        window.title("Statistics")
+        text = Text(window, width=70, height=40)
+        text.insert(END, self.game.statistics.summary([p.name for p in self.game.players]))
+        text.configure(state=DISABLED)
+        text.pack(fill="both", expand=1)
+
+        export_label = Label(window, text="")
+        Button(window, text="Export",
+               command=lambda: self.export_statistics(export_label)).pack(side=LEFT, padx=self.margin.x)
+        export_label.pack(side=LEFT)
+
+    def export_statistics(self, label, path="statistics.npz"):
+        self.game.statistics.export(path)
+        label["text"] = f"Saved to {path}"
+
     def change_time_elapsed(self, time_elapsed):
-        self.time_elapsed.set(f"{time_elapsed}s")
+        self.time_elapsed_text = f"{time_elapsed}s ({self.game.engine})"
+        if self.game.paired is not None:
+            paired = self.game.paired
+            self.time_elapsed_text += f", paired {paired.mean():+.4f} ± {paired.interval():.4f}"
 
     def options_menu_activated_1(self, *args):
-        self.parent.player_1_settings_frame.change_player(self.player_1.get(), "p1")
+        self.parent.player_1_settings_frame.change_player(self.player_1.get())
         self.settings_player_1_button.widget["state"] = DISABLED
         if self.player_1.get() in self.players_with_data:
             self.settings_player_1_button.widget["state"] = NORMAL
 
     def options_menu_activated_2(self, *args):
-        self.parent.player_2_settings_frame.change_player(self.player_2.get(), "p2")
+        self.parent.player_2_settings_frame.change_player(self.player_2.get())
         self.settings_player_2_button.widget["state"] = DISABLED
         if self.player_2.get() in self.players_with_data:
             self.settings_player_2_button.widget["state"] = NORMAL
@@ -292,49 +490,149 @@ class NonMainFrame(FrameBase):
         self.parent.load_frame_by_name("main")
 
 
+class DataLayout:
+    def __init__(self, frame, widgets, variables, saved_label, evaluation_label):
+        self.frame = frame
+        self.widgets = widgets
+        self.variables = variables
+        self.saved_label = saved_label
+        self.evaluation_label = evaluation_label
+        self.structured_data = None
+
+
+def leaf_paths(data, path=()):
+    for name, element in data.items():
+        if isinstance(element, dict):
+            yield from leaf_paths(element, path + (name,))
+        else:
+            yield path + (name,)
+
+
 class PlayerSettingsFrame(NonMainFrame):
+    # Players are only created when they are first picked, then kept so their data survives switching back
     p1_options = {
-        "Random AI": RandomAI("Random AI 1", text_color=Fore.RED),
-        "Simple AI": SimpleAI("Simple AI 1", data_path="simple_ai_data_1.txt", text_color=Fore.RED),
-        "Bluffing AI": BluffingAI("Bluffing AI 1", data_path="bluffing_ai_data_1.txt", text_color=Fore.RED),
-        "Human": Player("Player 1", text_color=Fore.RED),
+        "Random AI": lambda: RandomAI("Random AI 1", text_color=Fore.RED),
+        "Simple AI": lambda: SimpleAI("Simple AI 1", data_path="simple_ai_data_1.txt", text_color=Fore.RED),
+        "Bluffing AI": lambda: BluffingAI("Bluffing AI 1", data_path="bluffing_ai_data_1.txt", text_color=Fore.RED),
+        "Adaptive AI": lambda: AdaptiveAI("Adaptive AI 1", text_color=Fore.RED),
+        "Human": lambda: Player("Player 1", text_color=Fore.RED),
     }
     p2_options = {
-        "Random AI": RandomAI("Random AI 2", text_color=Fore.BLUE),
-        "Simple AI": SimpleAI("Simple AI 2", data_path="simple_ai_data_2.txt", text_color=Fore.BLUE),
-        "Bluffing AI": BluffingAI("Bluffing AI 2", data_path="bluffing_ai_data_2.txt", text_color=Fore.BLUE),
-        "Human": Player("Player 2", text_color=Fore.BLUE),
+        "Random AI": lambda: RandomAI("Random AI 2", text_color=Fore.BLUE),
+        "Simple AI": lambda: SimpleAI("Simple AI 2", data_path="simple_ai_data_2.txt", text_color=Fore.BLUE),
+        "Bluffing AI": lambda: BluffingAI("Bluffing AI 2", data_path="bluffing_ai_data_2.txt", text_color=Fore.BLUE),
+        "Adaptive AI": lambda: AdaptiveAI("Adaptive AI 2", text_color=Fore.BLUE),
+        "Human": lambda: Player("Player 2", text_color=Fore.BLUE),
     }
 
-    def __init__(self, parent, root, size, pad, margin, player):
+    evaluation_delay = 150
+
+    def __init__(self, parent, root, size, pad, margin, options, player, player_type="Random AI"):
         super().__init__(parent, root, size, pad, margin)
+        self.options = options
+        self.players = {player_type: player}
         self.player = player
         self.structured_data = None
-        self.construct_data()
-
+        self.evaluator = None
+        self.evaluation_job = None
+        self.pending_edits = {}
         self.variables = []
 
-        if self.structured_data is not None:
-            self.create_layout_from_data()
-
-        self.create_save_widgets()
-
-        self.load_widgets_grid()
+        # One layout per data shape, switching between players with the same shape only rebinds the values
+        self.layouts = dict()
+        self.construct_data()
 
     def return_to_main(self):
         self.save_data(change_label=False)
         self.saved_label.widget["text"] = ""
         self.parent.load_frame_by_name("main")
 
+    def load(self):
+        if self.structured_data is not None:
+            self.bind_layout()
+        super().load()
+        if self.structured_data is not None:
+            self.evaluator = None
+            self.evaluate()
+
+    def bind_layout(self):
+        structure = tuple(leaf_paths(self.structured_data.data))
+        if structure not in self.layouts:
+            self.frame = Frame(self.root, width=self.size.x, height=self.size.y)
+            self.widgets = []
+            self.create_layout_from_data()
+            self.layouts[structure] = DataLayout(self.frame, self.widgets, self.variables, self.saved_label,
+                                                 self.evaluation_label)
+
+        layout = self.layouts[structure]
+        self.frame, self.widgets, self.variables = layout.frame, layout.widgets, layout.variables
+        self.saved_label, self.evaluation_label = layout.saved_label, layout.evaluation_label
+        if layout.structured_data is not self.structured_data:
+            for storage in self.variables:
+                storage.variable.set(self.structured_data.get_dict_element_by_keys_looping(storage.names))
+            layout.structured_data = self.structured_data
+
     def create_data_widget(self, setting_data, names, x=0, y=0):
-        self.variables.append(VariableStorage(names, DoubleVar(value=setting_data)))
+        storage = VariableStorage(names, DoubleVar(value=setting_data))
+        storage.variable.trace_add("write", lambda *args: self.schedule_evaluation(storage))
+        self.variables.append(storage)
         field = Widget(Entry(self.frame, width=4, textvariable=self.variables[-1].variable),
                        Size(x, y), rel_pos=RelPos())
         self.widgets.append(field)
 
+    def create_evaluation_widgets(self):
+        self.evaluation_label = Widget(Label(self.frame, text="", justify=LEFT),
+                                       pos=Size(13, 11), rel_pos=RelPos())
+        self.widgets.append(self.evaluation_label)
+
+    def opponent(self):
+        frames = [self.parent.player_1_settings_frame, self.parent.player_2_settings_frame]
+        return frames[1].player if self is frames[0] else frames[0].player
+
+    def build_evaluator(self):
+        weights = StrategyTable.from_data(self.structured_data.data).weights
+        table = self.opponent().get_strategy_table(weights.shape[1])
+        opponent = table.probabilities if table is not None and table.deck_size >= weights.shape[1] else None
+        self.evaluator = IncrementalEvaluator(weights, opponent)
+        self.node_of_keys = {tuple(node_keys(node, value)): (node, value)
+                             for node in range(len(NODES)) for value in range(1, weights.shape[1] + 1)}
+        self.pending_edits = {id(storage): storage for storage in self.variables}
+
+    def schedule_evaluation(self, storage):
+        # Edits are collected and evaluated together once typing pauses for evaluation_delay ms
+        self.pending_edits[id(storage)] = storage
+        if self.evaluation_job is not None:
+            self.root.after_cancel(self.evaluation_job)
+        self.evaluation_job = self.root.after(self.evaluation_delay, self.evaluate)
+
+    def evaluate(self):
+        self.evaluation_job = None
+        if self.evaluator is None:
+            self.build_evaluator()
+
+        for storage in self.pending_edits.values():
+            try:
+                weight = storage.variable.get()
+            except TclError:
+                continue
+            node, card = self.node_of_keys[tuple(storage.names[:-1])]
+            self.evaluator.update(node, card, storage.names[-1], weight)
+        self.pending_edits = {}
+
+        text = f"Exploitability: {self.evaluator.exploitability():.4f}"
+        expected_values = self.evaluator.expected_values()
+        if expected_values is None:
+            text = f"EV: no fixed strategy to compare with\n{text}"
+        else:
+            opener, dealer = expected_values
+            text = f"EV as opener: {opener:+.4f}\nEV as dealer: {dealer:+.4f}\n{text}"
+        self.evaluation_label.widget["text"] = text
+
     def create_layout_from_data(self, show_values_in_labels=False):
         self.create_main_frame_button()
         self.create_save_widgets()
+        self.create_evaluation_widgets()
+        self.evaluator = None
 
         self.variables = []
 
@@ -418,20 +716,18 @@ class PlayerSettingsFrame(NonMainFrame):
             self.root.after(500)
             self.saved_label.widget["fg"] = "black"
 
-    def change_player(self, player, player_list):
-        self.player = self.p1_options[player] if player_list == "p1" else self.p2_options[player]
-        # print(self.player)
+    def change_player(self, player_type):
+        if player_type not in self.players:
+            self.players[player_type] = self.options[player_type]()
+        self.player = self.players[player_type]
         self.construct_data()
 
     def construct_data(self):
-        if isinstance(self.player, Player) or isinstance(self.player, RandomAI):
-            self.structured_data = None
-        elif isinstance(self.player, SimpleAI) or isinstance(self.player, BluffingAI):
+        # The layout itself is only bound when the frame is shown
+        if isinstance(self.player, SimpleAI) or isinstance(self.player, BluffingAI):
             self.structured_data = self.player.structured_data
-            # self.clear_frame()
-            self.frame = Frame(self.root, width=self.size.x, height=self.size.y)
-            self.create_layout_from_data()
-        # print(self.structured_data)
+        else:
+            self.structured_data = None
 
     def create_save_widgets(self):
         self.save_button = Widget(Button(self.frame, text="Save",
@@ -508,5 +804,145 @@ class GameSettingsFrame(NonMainFrame):
             self.saved_label.widget["fg"] = "black"
 
 
+class JobRow:
+    def __init__(self, label, progress_bar, status, results_button, cancel_button):
+        self.label = label
+        self.progress_bar = progress_bar
+        self.status = status
+        self.results_button = results_button
+        self.cancel_button = cancel_button
 
 
+class RunQueueFrame(NonMainFrame):
+    # Matchups queued here run side by side on a process pool while the GUI stays responsive.
+    # Each job gets a progress bar, its results tab is built from the arrays the worker sent back
+    default_paths = {
+        "Random AI": ("", ""),
+        "Simple AI": ("simple_ai_data_1.txt", "simple_ai_data_2.txt"),
+        "Bluffing AI": ("bluffing_ai_data_1.txt", "bluffing_ai_data_2.txt"),
+    }
+    poll_interval = 100
+
+    def __init__(self, parent, root, size, pad, margin):
+        super().__init__(parent, root, size, pad, margin)
+        self.queue = RunQueue()
+        self.rows = dict()
+        self.tabs = dict()
+        self.polling = False
+
+        self.player_types = [StringVar(self.frame, value="Simple AI"), StringVar(self.frame, value="Bluffing AI")]
+        self.paths = [StringVar(self.frame, value=self.default_paths["Simple AI"][0]),
+                      StringVar(self.frame, value=self.default_paths["Bluffing AI"][1])]
+        for seat, player_type in enumerate(self.player_types):
+            player_type.trace_add("write", lambda *args, seat=seat: self.player_type_changed(seat))
+        self.games = IntVar(self.frame, value=1000000)
+        self.seat_mode = StringVar(self.frame, value=SEAT_MODES[0])
+        self.workers = IntVar(self.frame, value=2)
+
+        self.add_widgets()
+        self.jobs_frame = Frame(self.frame)
+        self.results = ttk.Notebook(self.frame, width=self.size.x - 40, height=380)
+
+    def load(self):
+        super().load()
+        self.jobs_frame.grid(row=6, column=0, columnspan=4, sticky=W, padx=self.margin.x)
+        self.results.grid(row=7, column=0, columnspan=4, padx=self.margin.x)
+
+    def add_widgets(self):
+        for seat in range(2):
+            self.widgets.append(Widget(Label(self.frame, text=f"Player {seat + 1}"), Size(0, seat + 1), RelPos()))
+            self.widgets.append(Widget(OptionMenu(self.frame, self.player_types[seat], *PLAYER_TYPES),
+                                       Size(1, seat + 1), RelPos()))
+            self.widgets.append(Widget(Entry(self.frame, width=24, textvariable=self.paths[seat]),
+                                       Size(2, seat + 1), RelPos()))
+
+        self.widgets.append(Widget(Label(self.frame, text="Games"), Size(0, 3), RelPos()))
+        self.widgets.append(Widget(Entry(self.frame, width=12, textvariable=self.games), Size(1, 3), RelPos()))
+        self.widgets.append(Widget(OptionMenu(self.frame, self.seat_mode, *SEAT_MODES), Size(2, 3), RelPos()))
+        self.widgets.append(Widget(Button(self.frame, text="Add", command=self.add_job), Size(3, 3), RelPos()))
+
+        self.widgets.append(Widget(Label(self.frame, text="Workers"), Size(0, 4), RelPos()))
+        self.widgets.append(Widget(Entry(self.frame, width=12, textvariable=self.workers), Size(1, 4), RelPos()))
+        self.widgets.append(Widget(Button(self.frame, text="Start", bg="green", command=self.start),
+                                   Size(2, 4), RelPos()))
+        self.message = StringVar(self.frame, value="")
+        self.widgets.append(Widget(Label(self.frame, textvariable=self.message), Size(3, 4), RelPos()))
+
+    def player_type_changed(self, seat):
+        self.paths[seat].set(self.default_paths[self.player_types[seat].get()][seat])
+
+    def add_job(self):
+        try:
+            games = self.games.get()
+        except TclError:
+            self.message.set("Games must be a number")
+            return
+        job = MatchupJob(self.player_types[0].get(), self.paths[0].get(), self.player_types[1].get(),
+                         self.paths[1].get(), games, self.seat_mode.get(),
+                         self.parent.game_settings_frame.variables["deck_size"].get())
+        job_id = self.queue.add(job)
+
+        label = Label(self.jobs_frame, text=f"{job_id + 1}. {job}", anchor=W, width=46)
+        progress_bar = ttk.Progressbar(self.jobs_frame, orient=HORIZONTAL, length=140, mode="determinate")
+        status = Label(self.jobs_frame, text="queued", width=10)
+        results_button = Button(self.jobs_frame, text="Results", state=DISABLED,
+                                command=lambda: self.show_results(job_id))
+        cancel_button = Button(self.jobs_frame, text="Cancel", command=lambda: self.cancel_job(job_id))
+        for column, widget in enumerate((label, progress_bar, status, results_button, cancel_button)):
+            widget.grid(row=job_id, column=column, padx=self.pad.x, pady=1)
+        self.rows[job_id] = JobRow(label, progress_bar, status, results_button, cancel_button)
+        self.message.set("")
+
+    def start(self):
+        try:
+            workers = max(1, self.workers.get())
+        except TclError:
+            self.message.set("Workers must be a number")
+            return
+        self.queue.start(workers)
+        self.message.set(f"Running on {self.queue.workers} workers")
+        if not self.polling:
+            self.polling = True
+            self.poll()
+
+    def poll(self):
+        for job_id in self.queue.poll():
+            row = self.rows[job_id]
+            row.progress_bar["value"] = self.queue.progress[job_id]
+            row.status["text"] = self.queue.status(job_id)
+            if job_id in self.queue.results:
+                row.results_button["state"] = NORMAL
+        for job_id, row in self.rows.items():
+            if job_id not in self.queue.results and job_id not in self.queue.errors:
+                row.status["text"] = self.queue.status(job_id)
+            # A job can only be cancelled until a worker picks it up
+            row.cancel_button["state"] = NORMAL if self.queue.status(job_id) in ("queued", "waiting") else DISABLED
+
+        if self.queue.running():
+            self.root.after(self.poll_interval, self.poll)
+            return
+        self.polling = False
+        self.message.set("All jobs finished")
+
+    def cancel_job(self, job_id):
+        row = self.rows[job_id]
+        if self.queue.cancel(job_id):
+            row.status["text"] = "cancelled"
+            row.cancel_button["state"] = DISABLED
+        else:
+            self.message.set(f"Job {job_id + 1} has already started")
+
+    def show_results(self, job_id):
+        if job_id not in self.tabs:
+            result = self.queue.results[job_id]
+            tab = Frame(self.results)
+            chart = LiveChart(tab, width=self.size.x - 60, height=150)
+            chart.pack()
+            chart.draw(result.curves, self.queue.jobs[job_id].games, result.step)
+            text = Text(tab, width=80, height=12)
+            text.insert(END, result.summary())
+            text.configure(state=DISABLED)
+            text.pack(fill="both", expand=1)
+            self.results.add(tab, text=f"Job {job_id + 1}")
+            self.tabs[job_id] = tab
+        self.results.select(self.tabs[job_id])